@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Throughput, CPU cost and ratio of the raw file compression levels"""
+# ---------------------------------------------------------------------------
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from data_extraction.compression import (iter_lines, COMPRESSION_EXTENSIONS)
+from data_extraction.csv_writer import StreamingCsvWriter
+
+
+def generate_flushes(rows_per_day: int, flush_rows: int, topics: int = 2_000) -> list[list]:
+    """Raw csv columns for a day of messages spread evenly over 24 hours."""
+    random.seed(0)
+    start = datetime(2024, 6, 12)
+    step = timedelta(seconds = 86_400 / rows_per_day)
+    string_values = ["ON", "OFF", "IDLE", "True", "False"]
+    flushes = []
+    for flush_start in range(0, rows_per_day, flush_rows):
+        count = min(flush_rows, rows_per_day - flush_start)
+        indices = [random.randrange(topics) for _ in range(count)]
+        flushes.append([
+            [str(start + step * (flush_start + row)) for row in range(count)],
+            [f"prototype-zero/normal/sensor/module/measurement/field_{index}" for index in indices],
+            [f"sensor/measurement/field_{index}" for index in indices],
+            [
+                repr(round(random.uniform(-1e3, 1e3), 4)) if index % 10 else string_values[index % 5]
+                for index in indices
+            ],
+        ])
+    return flushes
+
+
+def write_day(flushes: list[list], filename: str, compression: str, level: int | None) -> tuple[float, float]:
+    writer = StreamingCsvWriter(compression = compression, compression_level = level)
+    header = ["time", "topic", "id", "value"]
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for columns in flushes:
+        writer.write(filename, header, columns)
+    writer.close()
+    return (time.perf_counter() - wall_start, time.process_time() - cpu_start)
+
+
+def read_day(filename: str) -> float:
+    start = time.perf_counter()
+    for _ in iter_lines(filename):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--rows", type = int, default = 2_000_000, help = "Messages in the synthetic day")
+    parser.add_argument("--flush-rows", type = int, default = 10_000, help = "Messages per buffer flush")
+    args = parser.parse_args()
+
+    flushes = generate_flushes(args.rows, args.flush_rows)
+    cases = [("none", None)] + [("gzip", level) for level in (1, 6, 9)] + [("xz", level) for level in (0, 3, 6)]
+    print(f"{args.rows:,} rows in {len(flushes):,} flushes")
+    print(
+        f"{'compression':>12} {'level':>5} {'MB':>8} {'ratio':>6} {'write MB/s':>11} "
+        f"{'cpu s':>7} {'cpu us/row':>11} {'read s':>7}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        raw_size = None
+        for (compression, level) in cases:
+            filename = os.path.join(directory, f"raw-{compression}-{level}.csv{COMPRESSION_EXTENSIONS[compression]}")
+            (wall_time, cpu_time) = write_day(flushes, filename, compression, level)
+            read_time = read_day(filename)
+            size = os.path.getsize(filename)
+            raw_size = raw_size or size
+            print(
+                f"{compression:>12} {'-' if level is None else level:>5} {size / 1e6:>8.1f} {raw_size / size:>6.1f} "
+                f"{raw_size / 1e6 / wall_time:>11.1f} {cpu_time:>7.2f} {cpu_time / args.rows * 1e6:>11.2f} {read_time:>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
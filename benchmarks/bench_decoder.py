@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Micro-benchmark of PayloadDecoder against the original check_message_value"""
+# ---------------------------------------------------------------------------
+import json
+import logging
+import random
+import time
+
+from data_extraction.decoder import PayloadDecoder
+
+logger = logging.getLogger("data_extraction")
+
+
+class Message():
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+def legacy_check_message_value(message: Message):
+    # check_message_value as it was before PayloadDecoder
+    if message.payload is None:
+        logger.debug(f"Null message ignored. Received None on topic '{message.topic}'")
+        return
+    value = message.payload.decode()
+    if value == "nan":
+        logger.debug(f"Null message ignored. Received 'nan' on topic '{message.topic}'")
+        return
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            logger.debug("Message is not JSON. Attempting to parse as a string")
+    if not isinstance(value, (str, int, float)):
+        logger.error(f"Message is not a valid type. Received '{type(value)}' on topic '{message.topic}'")
+        return
+    return value
+
+
+def generate_messages(count: int, numeric_fraction: float, topics: int = 2_000) -> list[Message]:
+    random.seed(0)
+    string_payloads = [b"ON", b"OFF", b"true", b"false", b"nan", b"IDLE", b'"running"']
+    messages = []
+    for _ in range(count):
+        topic_index = random.randrange(topics)
+        if topic_index < topics * numeric_fraction:
+            payload = repr(random.uniform(-1e3, 1e3)).encode()
+        else:
+            payload = string_payloads[topic_index % len(string_payloads)]
+        messages.append(Message(f"prototype-zero/normal/sensor/module/measurement/field_{topic_index}", payload))
+    return messages
+
+
+def run(messages: list[Message]) -> tuple[float, float]:
+    start = time.perf_counter()
+    for message in messages:
+        legacy_check_message_value(message)
+    legacy_time = time.perf_counter() - start
+
+    decoder = PayloadDecoder()
+    start = time.perf_counter()
+    for message in messages:
+        decoder.decode(message.topic, message.payload)
+    decoder_time = time.perf_counter() - start
+    return (legacy_time, decoder_time)
+
+
+def main():
+    count = 500_000
+    print(f"{'numeric %':>10} {'legacy ns/msg':>14} {'decoder ns/msg':>15} {'speedup':>8}")
+    for numeric_fraction in (1.0, 0.95, 0.8, 0.5):
+        messages = generate_messages(count, numeric_fraction)
+        (legacy_time, decoder_time) = run(messages)
+        print(
+            f"{numeric_fraction * 100:>10.0f} {legacy_time / count * 1e9:>14.0f} "
+            f"{decoder_time / count * 1e9:>15.0f} {legacy_time / decoder_time:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
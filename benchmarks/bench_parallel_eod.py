@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""End of day wall time of a synthetic raw day against the number of worker processes"""
+# ---------------------------------------------------------------------------
+from datetime import datetime, timedelta
+import argparse
+import filecmp
+import os
+import random
+import tempfile
+import time
+
+from data_extraction.eod_process import (EodJob, process_day)
+from data_extraction.id_catalog import IdCatalog
+from data_extraction.type_registry import (TypeRegistry, NUMERIC, STRING)
+
+
+def generate_day(filename: str, rows_per_day: int, topics: int) -> None:
+    random.seed(0)
+    start = datetime(2024, 6, 15)
+    step = timedelta(seconds = 86_400 / rows_per_day)
+    string_values = ["ON", "OFF", "IDLE"]
+    with open(filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for row in range(rows_per_day):
+            index = random.randrange(topics)
+            value = repr(round(random.uniform(-1e3, 1e3), 4)) if index % 10 else string_values[index % 3]
+            file.write(f"{start + step * row},t,sensor/measurement/field_{index},{value}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--rows", type = int, default = 2_000_000, help = "Messages in the synthetic day")
+    parser.add_argument("--topics", type = int, default = 500, help = "Distinct ids in the day")
+    parser.add_argument("--resample", type = int, default = 1, help = "resample_time in seconds")
+    parser.add_argument("--workers", type = int, nargs = "+", default = [2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        raw_filename = os.path.join(directory, "raw.csv")
+        generate_day(raw_filename, args.rows, args.topics)
+        # The catalog written during ingest
+        IdCatalog().update(raw_filename, [f"sensor/measurement/field_{index}" for index in range(args.topics)])
+        # Days without a type registry are processed serially
+        TypeRegistry().update(raw_filename, {
+            f"sensor/measurement/field_{index}": NUMERIC if index % 10 else STRING for index in range(args.topics)
+        })
+        print(f"{args.rows:,} rows, {os.path.getsize(raw_filename) / 1e6:.1f} MB, {os.cpu_count()} cpus")
+        print(f"{'workers':>8} {'seconds':>8} {'speedup':>8} {'identical':>10}")
+
+        serial_filename = os.path.join(directory, "serial.csv")
+        start = time.perf_counter()
+        process_day(EodJob(raw_filename, serial_filename, args.resample))
+        serial_time = time.perf_counter() - start
+        print(f"{'serial':>8} {serial_time:>8.2f} {1.0:>8.2f} {'-':>10}")
+
+        for workers in args.workers:
+            processed_filename = os.path.join(directory, f"parallel-{workers}.csv")
+            start = time.perf_counter()
+            process_day(EodJob(raw_filename, processed_filename, args.resample, workers = workers))
+            wall_time = time.perf_counter() - start
+            identical = filecmp.cmp(serial_filename, processed_filename, shallow = False)
+            print(f"{workers:>8} {wall_time:>8.2f} {serial_time / wall_time:>8.2f} {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Rows per second fed to the end of day resampler by the memory mapped scanner and by the line reader"""
+# ---------------------------------------------------------------------------
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from data_extraction.eod import StreamingResampler
+from data_extraction.eod_process import (feed_resampler, iter_csv_rows)
+from data_extraction.raw_scanner import RawCsvScanner
+
+
+def generate_day(filename: str, rows: int, topics: int, epoch_column: bool) -> None:
+    random.seed(0)
+    start = datetime(2024, 6, 17)
+    step = timedelta(seconds = 86_400 / rows)
+    string_values = ["ON", "OFF", "IDLE"]
+    with open(filename, "w") as file:
+        file.write("time,topic,id,value" + (",time_ns\n" if epoch_column else "\n"))
+        for row in range(rows):
+            index = random.randrange(topics)
+            value = repr(round(random.uniform(-1e3, 1e3), 4)) if index % 10 else string_values[index % 3]
+            row_time = start + step * row
+            epoch = f",{int(row_time.timestamp() * 1e9)}" if epoch_column else ""
+            file.write(f"{row_time},t,sensor/measurement/field_{index},{value}{epoch}\n")
+
+
+def scan_lines(filename: str, chunk_rows: int) -> int:
+    return sum(1 for _ in iter_csv_rows(filename))
+
+
+def scan_blocks(filename: str, chunk_rows: int) -> int:
+    return sum(len(block) for block in RawCsvScanner(filename, block_rows = chunk_rows))
+
+
+def feed_lines(filename: str, chunk_rows: int) -> int:
+    # How end of day fed the resampler before the scanner
+    resampler = StreamingResampler(1)
+    rows = 0
+    (times, ids, values) = ([], [], [])
+    for (row_time, row_id, row_value) in iter_csv_rows(filename):
+        times.append(row_time)
+        ids.append(row_id)
+        values.append(row_value)
+        if len(times) == chunk_rows:
+            resampler.accumulate(times, ids, values)
+            rows += len(times)
+            (times, ids, values) = ([], [], [])
+    resampler.accumulate(times, ids, values)
+    return rows + len(times)
+
+
+def feed_blocks(filename: str, chunk_rows: int) -> int:
+    return sum(feed_resampler(filename, StreamingResampler(1), chunk_rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--rows", type = int, default = 1_000_000, help = "Messages in the synthetic day")
+    parser.add_argument("--topics", type = int, default = 500, help = "Distinct ids in the day")
+    parser.add_argument("--chunk", type = int, default = 100_000, help = "Rows per chunk or block")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        raw_filename = os.path.join(directory, "raw.csv")
+        print(f"{'time column':>12} {'stage':>9} {'reader':>8} {'seconds':>8} {'rows/s':>12} {'speedup':>8}")
+        for epoch_column in (False, True):
+            generate_day(raw_filename, args.rows, args.topics, epoch_column)
+            label = "time_ns" if epoch_column else "time"
+            # Parsing alone, then parsing and feeding the resampler like end of day
+            for (stage, functions) in (("scan", (scan_lines, scan_blocks)), ("resample", (feed_lines, feed_blocks))):
+                timings = {}
+                for (name, function) in zip(("lines", "mmap"), functions):
+                    start = time.perf_counter()
+                    rows = function(raw_filename, args.chunk)
+                    timings[name] = time.perf_counter() - start
+                    assert rows == args.rows
+                    print(f"{label:>12} {stage:>9} {name:>8} {timings[name]:>8.2f} {rows / timings[name]:>12,.0f} {timings['lines'] / timings[name]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
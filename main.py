@@ -1,51 +1,52 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-# ----------------------------------------------------------------------------
-# Created By  : Jason Schultz
-# Created Date: 2023-04-25
-# version ='1.1'
-# ---------------------------------------------------------------------------
-"""Subscribes to published MQTT nodes and periodically writes them to a csv file."""
-# ---------------------------------------------------------------------------
-from data_extraction.client import (DataExtractionClient, DataExtractionConfig)
-from mqtt_node_network.configure import MQTTBrokerConfig
-
-def main():
-    client = DataExtractionClient()
-    client.connect()
-    client.run_forever()
-    # client.end_of_day(2024,5,28)
-
-    # BROKER_CONFIG = MQTTBrokerConfig(
-    #     username ="test_user",
-    #     password = "test_password",
-    #     keepalive = 60,
-    #     hostname = "test_host",
-    #     port = 1883,
-    #     timeout = 1,
-    #     reconnect_attempts = 3
-    # )
-
-    # EXTRACTION_CONFIG = DataExtractionConfig(
-    #     name = "test_name",
-    #     node_id = "test_node_id",
-    #     max_buffer_length = 4000,
-    #     max_buffer_time = 10,
-    #     subscriptions = "machine/#",
-    #     topic_structure = "machine/permission/category/module/measurement/field*",
-    #     id_structure = "category/measurement/field*",
-    #     resample_time = 1,
-    #     nan_limit = 4,
-    #     output_filename = "test",
-    #     output_directory = "test/test_files",
-    #     processed_output_filename = "new_test",
-    #     processed_output_directory = "test/test_files"
-    # )
-    # client = DataExtractionClient(
-    #     BROKER_CONFIG, EXTRACTION_CONFIG
-    # )
-    # client.end_of_day(2024,5,28)
-
-
-if __name__ == "__main__":
-    main()
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By  : Jason Schultz
+# Created Date: 2023-04-25
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Subscribes to published MQTT nodes and periodically writes them to a csv file."""
+# ---------------------------------------------------------------------------
+from data_extraction.client import (DataExtractionClient, DataExtractionConfig)
+from mqtt_node_network.configure import MQTTBrokerConfig
+
+def main():
+    client = DataExtractionClient()
+    client.connect()
+    client.run_forever()
+    # Past days without a processed file are caught up on startup, older ones can be backfilled
+    # client.backfill(date(2024, 5, 28), date(2024, 5, 30))
+
+    # BROKER_CONFIG = MQTTBrokerConfig(
+    #     username ="test_user",
+    #     password = "test_password",
+    #     keepalive = 60,
+    #     hostname = "test_host",
+    #     port = 1883,
+    #     timeout = 1,
+    #     reconnect_attempts = 3
+    # )
+
+    # EXTRACTION_CONFIG = DataExtractionConfig(
+    #     name = "test_name",
+    #     node_id = "test_node_id",
+    #     max_buffer_length = 4000,
+    #     max_buffer_time = 10,
+    #     subscriptions = "machine/#",
+    #     topic_structure = "machine/permission/category/module/measurement/field*",
+    #     id_structure = "category/measurement/field*",
+    #     resample_time = 1,
+    #     nan_limit = 4,
+    #     output_filename = "test",
+    #     output_directory = "test/test_files",
+    #     processed_output_filename = "new_test",
+    #     processed_output_directory = "test/test_files"
+    # )
+    # client = DataExtractionClient(
+    #     BROKER_CONFIG, EXTRACTION_CONFIG
+    # )
+    # client.backfill(date(2024, 5, 28), date(2024, 5, 30))
+
+
+if __name__ == "__main__":
+    main()
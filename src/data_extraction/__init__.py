@@ -1,4 +1,9 @@
-__version__ = "1.1.0"
-
-from data_extraction.client import DataExtractionClient
-from data_extraction.client import DataExtractionConfig
\ No newline at end of file
+__version__ = "1.1.0"
+
+
+def __getattr__(name: str):
+    # The client loads ./config/config.toml when imported, the command line tools run without it
+    if name in ("DataExtractionClient", "DataExtractionConfig"):
+        from data_extraction import client
+        return getattr(client, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
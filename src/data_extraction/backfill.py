@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Processing of raw days that never got a processed file"""
+# ---------------------------------------------------------------------------
+from concurrent.futures import (CancelledError, FIRST_COMPLETED, ProcessPoolExecutor, wait)
+from datetime import (date, datetime)
+from typing import Callable
+import logging
+import os
+import re
+
+from data_extraction.eod_process import (EodJob, lower_priority, process_day, spawn_context)
+from data_extraction.extract import raw_day_filename
+
+logger = logging.getLogger("data_extraction")
+
+# Marks a processed file live aggregation is still building
+LIVE_EXTENSION = ".live"
+RAW_DAY_PATTERN = re.compile(r"^(\d{8})-(.+?)(\.part\d+)?(\.csv(\.gz|\.xz)?|\.parquet)$")
+
+
+def processed_day_filename(directory: str, processed_filename: str, day: date) -> str:
+    return f"{directory}/{day:%Y%m%d}-{processed_filename}.csv"
+
+
+def processed_day(filename: str) -> date | None:
+    """Day of a processed file named by processed_day_filename(), None for other names."""
+    try:
+        return datetime.strptime(os.path.basename(filename)[:8], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def raw_days(directory: str, output_filename: str) -> list[date]:
+    """Days with a raw file in `directory`, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    days = set()
+    for entry in os.listdir(directory):
+        match = RAW_DAY_PATTERN.match(entry)
+        if (match is None) or (match.group(2) != output_filename):
+            continue
+        try:
+            days.add(datetime.strptime(match.group(1), "%Y%m%d").date())
+        except ValueError:
+            continue
+    return sorted(days)
+
+
+def is_processed(processed_filename: str) -> bool:
+    """A processed file is complete once it exists and live aggregation is not still building it."""
+    return os.path.exists(processed_filename) and not os.path.exists(processed_filename + LIVE_EXTENSION)
+
+
+def missing_days(
+        raw_directory: str,
+        output_filename: str,
+        processed_directory: str,
+        processed_filename: str,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> list[date]:
+    """Days from `start` to `end` that have a raw file but no complete processed file."""
+    return [
+        day for day in raw_days(raw_directory, output_filename)
+        if ((start is None) or (day >= start))
+        and ((end is None) or (day <= end))
+        and not is_processed(processed_day_filename(processed_directory, processed_filename, day))
+    ]
+
+
+def backfill_jobs(
+        days: list[date],
+        raw_directory: str,
+        output_filename: str,
+        processed_directory: str,
+        processed_filename: str,
+        resample_seconds: int | float,
+        chunk_rows: int = 100_000,
+        nan_limit: int | None = None,
+        rollup_seconds: tuple[int | float, ...] = (),
+        aggregations: dict[str, list[str]] | None = None,
+    ) -> list[EodJob]:
+    jobs = []
+    for day in days:
+        raw_filename = raw_day_filename(raw_directory, output_filename, day)
+        if raw_filename is None:
+            continue
+        processed_day = processed_day_filename(processed_directory, processed_filename, day)
+        jobs.append(EodJob(
+            raw_filename, processed_day, resample_seconds, chunk_rows = chunk_rows, nan_limit = nan_limit,
+            rollup_seconds = tuple(rollup_seconds), aggregations = aggregations
+        ))
+    return jobs
+
+
+def run_backfill(
+        jobs: list[EodJob],
+        workers: int = 1,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> list[EodJob]:
+    """
+    Processes `jobs` in a pool of low priority processes and returns the jobs that completed, in order.
+
+    Every worker process handles one day at a time, so `workers` days are
+    processed in parallel without competing with live ingest for the CPU.
+    Jobs that have not started are cancelled once `should_stop` returns
+    True, a day already being processed is finished first.
+    """
+    if not jobs:
+        return []
+    completed = set()
+    with ProcessPoolExecutor(max_workers = min(workers, len(jobs)), mp_context = spawn_context(), initializer = lower_priority) as executor:
+        futures = {executor.submit(process_day, job): index for (index, job) in enumerate(jobs)}
+        pending = set(futures)
+        while pending:
+            (finished, pending) = wait(pending, timeout = 1.0, return_when = FIRST_COMPLETED)
+            for future in finished:
+                job = jobs[futures[future]]
+                try:
+                    rows = future.result()
+                except CancelledError:
+                    continue
+                except Exception as error:
+                    logger.error(f"Backfill of {job.raw_filename} failed: {error}")
+                    continue
+                # Live aggregation is still building today's file and removes its marker itself
+                if (processed_day(job.processed_filename) != date.today()) and os.path.exists(job.processed_filename + LIVE_EXTENSION):
+                    os.remove(job.processed_filename + LIVE_EXTENSION)
+                logger.info(f"Backfilled {job.processed_filename} from {rows} rows")
+                completed.add(futures[future])
+            if (should_stop is not None) and should_stop():
+                for future in pending:
+                    future.cancel()
+    return [jobs[index] for index in sorted(completed)]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Sidecar index of the flush blocks written to a raw csv file"""
+# ---------------------------------------------------------------------------
+from dataclasses import (asdict, dataclass)
+import json
+import logging
+import os
+
+import numpy as np
+
+from data_extraction.id_catalog import raw_stem
+from data_extraction.timestamps import epoch_ns_to_local
+
+logger = logging.getLogger("data_extraction")
+
+BLOCK_INDEX_EXTENSION = ".idx"
+# Time bounds of bytes the index does not describe
+UNKNOWN_FIRST_NS = -(2**63)
+UNKNOWN_LAST_NS = 2**63 - 1
+
+
+def block_index_filename(raw_filename: str) -> str:
+    """20240613-raw.csv.gz -> 20240613-raw.idx"""
+    return raw_stem(raw_filename) + BLOCK_INDEX_EXTENSION
+
+
+@dataclass
+class IndexedBlock():
+    """
+    One flush of a raw csv file.
+
+    `start` and `end` are byte offsets in the raw file, a compressed flush is
+    one self contained member. `first_ns` and `last_ns` bound the naive local
+    times of its rows and `ids` holds the catalog positions of the ids in it,
+    None when they are unknown.
+    """
+    start: int
+    end: int
+    first_ns: int
+    last_ns: int
+    ids: list[int] | None = None
+
+    def overlaps(self, start_ns: int, end_ns: int) -> bool:
+        return (self.first_ns < end_ns) and (self.last_ns >= start_ns)
+
+
+def read_block_index(raw_filename: str) -> list[IndexedBlock] | None:
+    """Blocks in the order they were written, None if the raw file has no index."""
+    filename = block_index_filename(raw_filename)
+    if not os.path.exists(filename):
+        return None
+    blocks = []
+    with open(filename, "r", encoding = "utf-8") as file:
+        for line in file:
+            try:
+                blocks.append(IndexedBlock(**json.loads(line)))
+            except (ValueError, TypeError):
+                # A line cut short by a crash, the block it describes is read as an unindexed tail
+                logger.warning(f"Skipping unreadable line of {filename}")
+                break
+    return blocks
+
+
+def epoch_local_bounds(time_ns: np.ndarray) -> tuple[int, int]:
+    """
+    Naive local bounds of epoch nanosecond timestamps as the raw file writes them.
+
+    Only the oldest and newest row are converted. With a daylight saving
+    change inside the block both offsets apply to both ends, so the bounds
+    still hold every local time in between.
+    """
+    epoch_bounds = np.array([time_ns.min(), time_ns.max()], dtype = np.int64)
+    local_bounds = np.asarray(epoch_ns_to_local(epoch_bounds), dtype = "datetime64[ns]").view(np.int64)
+    offsets = local_bounds - epoch_bounds
+    return (int(epoch_bounds[0] + offsets.min()), int(epoch_bounds[1] + offsets.max()))
+
+
+def append_block(raw_filename: str, block: IndexedBlock) -> None:
+    """Adds one flush to the index, a json object per line."""
+    try:
+        with open(block_index_filename(raw_filename), "a", encoding = "utf-8") as file:
+            file.write(json.dumps(asdict(block), separators = (",", ":")) + "\n")
+    except OSError as error:
+        logger.error(f"Failed to update block index of {raw_filename}: {error}")
+
+
+def covering_blocks(blocks: list[IndexedBlock], size: int) -> list[IndexedBlock]:
+    """
+    Indexed blocks in file order, plus blocks of unknown content for any bytes the index misses.
+
+    A flush written while the index was off, or whose index line was lost,
+    is still found that way.
+    """
+    covered = []
+    position = 0
+    for block in sorted(blocks, key = lambda block: block.start):
+        if (block.start < position) or (block.end > size):
+            continue
+        if block.start > position:
+            covered.append(IndexedBlock(position, block.start, UNKNOWN_FIRST_NS, UNKNOWN_LAST_NS))
+        covered.append(block)
+        position = block.end
+    if position < size:
+        covered.append(IndexedBlock(position, size, UNKNOWN_FIRST_NS, UNKNOWN_LAST_NS))
+    return covered
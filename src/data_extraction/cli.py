@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Command line tools working on raw files on disk, without a running client"""
+# ---------------------------------------------------------------------------
+from datetime import (date, timedelta)
+import argparse
+import logging
+import sys
+
+from data_extraction.backfill import (backfill_jobs, missing_days, run_backfill)
+from data_extraction.eod import (bucket_date_format, AGGREGATIONS)
+from data_extraction.extract import (extract, raw_day_filenames)
+
+
+def parse_args(args: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog = "data-extraction-extract",
+        description = "Extracts a time range of raw data to csv without reading the whole day"
+    )
+    parser.add_argument("raw", nargs = "*", help = "Raw files to read, instead of --directory and --name")
+    parser.add_argument("--directory", help = "output_directory the raw files were written to")
+    parser.add_argument("--name", help = "ouput_filename of the raw files, without the date")
+    parser.add_argument("--start", required = True, help = "First local time to extract, e.g. '2024-06-18 09:30'")
+    parser.add_argument("--end", required = True, help = "Local time to stop at, not included")
+    parser.add_argument("--id", dest = "ids", action = "append", help = "Id to extract, repeat for more, all ids by default")
+    parser.add_argument("--resample", type = seconds, help = "Average over this many seconds, one column per id")
+    add_aggregate_argument(parser)
+    parser.add_argument("--output", help = "csv file to write, standard output by default")
+    parsed = parser.parse_args(args)
+    if not parsed.raw and not (parsed.directory and parsed.name):
+        parser.error("give either raw files or both --directory and --name")
+    return parsed
+
+
+def seconds(value: str) -> int | float:
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def aggregation(value: str) -> tuple[str, list[str]]:
+    """'sensor/pressure/*=max,mean' -> ("sensor/pressure/*", ["max", "mean"])"""
+    (pattern, _, functions) = value.rpartition("=")
+    functions = functions.split(",")
+    if not pattern or not set(functions).issubset(AGGREGATIONS):
+        raise argparse.ArgumentTypeError(f"expected PATTERN=AGGREGATE,... with aggregates among {', '.join(AGGREGATIONS)}")
+    return (pattern, functions)
+
+
+def add_aggregate_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--aggregate", type = aggregation, action = "append",
+        help = "Ids matching a glob pattern and their aggregates, e.g. 'sensor/pressure/*=max,mean', repeat for more"
+    )
+
+
+def main(args: list[str] | None = None) -> None:
+    parsed = parse_args(args)
+    raw_filenames = parsed.raw or raw_day_filenames(parsed.directory, parsed.name, parsed.start, parsed.end)
+    resample_seconds = parsed.resample
+    df = extract(
+        raw_filenames, parsed.start, parsed.end, ids = parsed.ids, resample_seconds = resample_seconds,
+        aggregations = dict(parsed.aggregate or []) or None
+    )
+    if resample_seconds is None:
+        df.to_csv(parsed.output or sys.stdout, index = False)
+    else:
+        df.to_csv(parsed.output or sys.stdout, date_format = bucket_date_format(resample_seconds))
+
+
+
+def parse_backfill_args(args: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog = "data-extraction-backfill",
+        description = "Processes the raw days that have no processed file, several days in parallel"
+    )
+    parser.add_argument("--raw-directory", required = True, help = "output_directory of the raw files")
+    parser.add_argument("--raw-name", required = True, help = "ouput_filename of the raw files, without the date")
+    parser.add_argument("--processed-directory", required = True, help = "processed_output_directory")
+    parser.add_argument("--processed-name", required = True, help = "processed_output_filename, without the date")
+    parser.add_argument(
+        "--resample", type = seconds, nargs = "+", required = True,
+        help = "resample_time in seconds, further resolutions are rolled up into their own processed files"
+    )
+    parser.add_argument("--start", type = date.fromisoformat, help = "First day to backfill, e.g. 2024-05-28, the oldest raw file by default")
+    parser.add_argument("--end", type = date.fromisoformat, help = "Last day to backfill, yesterday at the latest")
+    parser.add_argument("--workers", type = int, default = 2, help = "Days processed in parallel")
+    parser.add_argument("--chunk-rows", type = int, default = 100_000, help = "Raw rows read per chunk")
+    parser.add_argument("--nan-limit", type = int, help = "Interpolate gaps of up to this many buckets, none by default")
+    add_aggregate_argument(parser)
+    parser.add_argument("--dry-run", action = "store_true", help = "Only list the days that would be processed")
+    return parser.parse_args(args)
+
+
+def backfill_main(args: list[str] | None = None) -> None:
+    parsed = parse_backfill_args(args)
+    logging.basicConfig(level = logging.INFO, format = "%(asctime)s %(levelname)s %(message)s")
+    # Today is still being written and aggregated live
+    yesterday = date.today() - timedelta(days = 1)
+    end = yesterday if parsed.end is None else min(parsed.end, yesterday)
+    days = missing_days(parsed.raw_directory, parsed.raw_name, parsed.processed_directory, parsed.processed_name, parsed.start, end)
+    for day in days:
+        print(day)
+    if parsed.dry_run or not days:
+        return
+    jobs = backfill_jobs(
+        days, parsed.raw_directory, parsed.raw_name, parsed.processed_directory, parsed.processed_name,
+        parsed.resample[0], chunk_rows = parsed.chunk_rows, nan_limit = parsed.nan_limit, rollup_seconds = tuple(parsed.resample[1:]),
+        aggregations = dict(parsed.aggregate or []) or None
+    )
+    completed = run_backfill(jobs, parsed.workers)
+    if len(completed) != len(jobs):
+        sys.exit(f"{len(jobs) - len(completed)} of {len(jobs)} days failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,495 +1,1369 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-# ----------------------------------------------------------------------------
-# Created By  : Jason Schultz
-# Created Date: 2023-01-23
-# version ='1.1'
-# ---------------------------------------------------------------------------
-"""MQTT client for backing up subscribed topics to csv"""
-# ---------------------------------------------------------------------------
-from mqtt_node_network.node import MQTTNode
-from mqtt_node_network.client import (MQTTClient, MQTTBrokerConfig)
-from mqtt_node_network.initialize import initialize
-from paho.mqtt.client import MQTTMessage
-from buffered.buffer import Buffer
-from prometheus_client import Gauge
-
-import time
-from datetime import datetime
-import pandas as pd
-import os
-from threading import Thread
-import json
-import logging
-from dataclasses import dataclass
-import psutil
-
-logger = logging.getLogger("data_extraction")
-
-config = initialize(
-    config="./config/config.toml", secrets=".env", logger="./config/logger.yaml"
-)
-BROKER_CONFIG = config["mqtt"]["broker"]
-
-
-@dataclass
-class DataExtractionConfig():
-    name: str
-    node_id: str
-    max_buffer_length: int
-    max_buffer_time: float
-    subscriptions: str | list[str]
-    topic_structure: str
-    id_structure: str
-    resample_time: float
-    nan_limit: int
-    output_filename: str
-    output_directory: str
-    processed_output_filename: str
-    processed_output_directory: str
-
-    def __post_init__(self):
-        if not isinstance(self.max_buffer_length, int):
-            raise TypeError("max_buffer_length needs to be an integer.")
-        if not isinstance(self.nan_limit, int):
-            raise TypeError("nan_limit needs to be an integer.")
-        if not isinstance(self.topic_structure, str):
-            raise TypeError("topic_structure needs to be a string.")
-        if not isinstance(self.id_structure, str):
-            raise TypeError("id_structure needs to be a string.")
-        if not isinstance(self.output_directory, str):
-            raise TypeError("output_directory needs to be a string.")
-        if not isinstance(self.output_filename, str):
-            raise TypeError("output_filename needs to be a string.")
-        if not isinstance(self.processed_output_directory, str):
-            raise TypeError("processed_output_directory needs to be a string.")
-        if not isinstance(self.processed_output_filename, str):
-            raise TypeError("processed_output_filename needs to be a string.")
-        if not isinstance(self.resample_time, (int, float)):
-            raise TypeError("resample_time needs to be either an integer or float.")
-        if not isinstance(self.subscriptions, str):
-            if isinstance(self.subscriptions, list):
-                for subscription in self.subscriptions:
-                    if not isinstance(subscription, str):
-                        raise TypeError(f"Subscription: {subscription} is not a string.")
-            else:
-                raise TypeError("subscriptions need to be either a string or list of strings")
-
-
-EXTRACTION_CONFIG = DataExtractionConfig(
-    name = config["data_extraction"]["name"],
-    node_id = config["data_extraction"]["node_id"],
-    max_buffer_length = config["data_extraction"]["max_buffer_length"],
-    max_buffer_time = config["data_extraction"]["max_buffer_time"],
-    subscriptions = config["data_extraction"]["subscriptions"],
-    topic_structure = config["mqtt"]["node_network"]["topic_structure"],
-    id_structure = config["data_extraction"]["id_structure"],
-    resample_time = config["data_extraction"]["resample_time"],
-    nan_limit = config["data_extraction"]["nan_limit"],
-    output_filename = config["data_extraction"]["ouput_filename"],
-    output_directory = config["data_extraction"]["output_directory"],
-    processed_output_filename = config["data_extraction"]["processed_output_filename"],
-    processed_output_directory = config["data_extraction"]["processed_output_directory"]
-)
-
-
-class DataExtractionClient(MQTTClient):
-    client_memory_usage = Gauge(
-        "client_memory_usage",
-        "Program's memory usage in MB",
-    )
-    client_buffer_length = Gauge(
-        "client_buffer_length",
-        "Length of the buffer before dumping",
-    )
-    client_df_performance_time = Gauge(
-        "client_dataframe_performance_time",
-        "Time in seconds to process csv file in Pandas",
-    )
-    
-    def __init__(
-            self,
-            broker_config: MQTTBrokerConfig = None,
-            data_extraction_config: DataExtractionConfig = None,
-        ):
-        broker_config = broker_config or BROKER_CONFIG
-        data_extraction_config = data_extraction_config or EXTRACTION_CONFIG
-        MQTTClient.__init__(
-            self,
-            broker_config = broker_config,
-            name = data_extraction_config.name,
-            node_id = data_extraction_config.node_id,
-            node_type = None,
-            logger = logger,
-            buffer = Buffer(maxlen = 10_000),
-            topic_structure = data_extraction_config.topic_structure,
-        )
-        self.start_time = datetime.now()
-        self.max_buffer = data_extraction_config.max_buffer_length
-        self.resample_time_seconds = data_extraction_config.resample_time
-        self.buffer_time_interval = data_extraction_config.max_buffer_time
-        self.output_filename = data_extraction_config.output_filename
-        self.processed_filename = data_extraction_config.processed_output_filename
-        self.id_structure = data_extraction_config.id_structure
-        self.output_directory = data_extraction_config.output_directory
-        self.processed_directory = data_extraction_config.processed_output_directory
-        self.nan_limit = data_extraction_config.nan_limit
-        self.subscriptions = data_extraction_config.subscriptions
-
-        # Initializing threads
-        self.eod_handle = Thread(target = self.end_of_day_thread)
-        self.buffer_handle = Thread(target = self.manage_buffer_thread)
-        self.performance_handle = Thread(target = self.performance_thread)
-        self.continue_flag: bool = True
-
-        # os.makedirs(self.output_directory, exist_ok=True)
-        # os.makedirs(self.processed_directory, exist_ok=True)
-
-        self.metrics_label_value = ""
-        for (index, subscription) in enumerate(self.subscriptions):
-            if index != 0:
-                self.metrics_label_value += " + "
-            self.metrics_label_value += subscription.split("/")[0]
-
-
-#-------------------Functions for performance monitoring------------------------------------------------------
-    def performance_thread(self) -> None:
-        while self.continue_flag:
-            time.sleep(10)
-            self.performace()
-
-
-    # https://psutil.readthedocs.io/en/latest/
-    # https://stackoverflow.com/questions/276052/how-to-get-current-cpu-and-ram-usage-in-python
-    def performace(self) -> None:
-        svmem = psutil.virtual_memory()
-        if svmem.percent >= 95:
-            logger.critical(f"VM memory at {svmem.percent} %! Shutting down program.")
-            self.continue_flag = False
-        python_process = psutil.Process(os.getpid())
-        memory_usage = python_process.memory_info().rss / (1024*1024)  # MB
-        logger.info(f"Memory usage: {memory_usage:.2f} MB")
-        # self.client_memory_usage.labels(
-        #     subscriptions = self.metrics_label_value
-        # ).set(memory_usage)
-        self.client_memory_usage.set(memory_usage)
-        memory_limit = 2*1024
-        if memory_usage > memory_limit:
-            logger.critical(f"Memory usage of {memory_usage:.2f} MB > {memory_limit} MB. Shutting down program.")
-            self.continue_flag = False
-
-
-#-------------------General operational functions-------------------------------------------------------------
-    def check_message_value(self, message: MQTTMessage):
-        if message.payload is None:
-            logger.debug(
-                f"Null message ignored. Received None on topic '{message.topic}'"
-            )
-            return
-
-        elif isinstance(message.payload, bytes):
-            value = message.payload.decode()
-
-        value = message.payload.decode()
-        if value == "nan":
-            logger.debug(
-                f"Null message ignored. Received 'nan' on topic '{message.topic}'"
-            )
-            return
-        
-        try:
-            value = float(value)
-        except ValueError:
-            pass
-
-        if isinstance(value, str):
-            try:
-                value = json.loads(value)
-            except json.JSONDecodeError:
-                logger.debug("Message is not JSON. Attempting to parse as a string")
-                pass
-
-        if not isinstance(value, (str, int, float)):
-            logger.error(
-                f"Message is not a valid type. Received '{type(value)}' on topic '{message.topic}'"
-            )
-            return
-        
-        return value
-
-
-    def on_message(self, client, userdata, message: MQTTMessage) -> None:
-        MQTTNode.on_message(self, client, userdata, message)
-
-        value = self.check_message_value(message)
-        if value is None:
-            return
-        
-        # Maybe call parse_topic function from parent class
-        message_topic_breakdown = message.topic.split("/")
-        topic_structure_breakdown = self.topic_structure.split("/")
-        id_breakdown = self.id_structure.split("/")
-        topic_template: dict = {}
-
-        try:
-            assert len(message_topic_breakdown) == len(topic_structure_breakdown)
-        except AssertionError:
-            logger.warning("Topic structure and message structure lengths not equal. Check config file.")
-
-        for (topic_subsection, message_subsection) in zip(topic_structure_breakdown, message_topic_breakdown):
-            topic_template.update({topic_subsection: message_subsection})
-
-        field_id = ""
-        for (index, id_subsection) in enumerate(id_breakdown):
-            field_id += topic_template.get(id_subsection)
-            if index != (len(id_breakdown) - 1):
-                field_id += "/"
-
-        data = {
-            "time": datetime.now(),
-            "topic": message.topic,
-            "id": field_id,
-            "value": value
-        }
-        self.buffer.append(data)
-
-
-    def run(self) -> None:
-        self.eod_handle.start()
-        self.buffer_handle.start()
-        self.performance_handle.start()
-        logger.info("Threads started.")
-
-
-    def run_forever(self) -> None:
-        self.run()
-        while self.continue_flag:
-            time.sleep(1)
-        self.stop()
-
-    
-    def stop(self) -> None:
-        logger.info("Process stopping")
-        self.continue_flag = False
-        if self.buffer_handle.is_alive():
-            self.buffer_handle.join()
-        if self.performance_handle.is_alive():
-            self.performance_handle.join()
-        if self.eod_handle.is_alive():
-            self.eod_handle.join()
-
-
-#-------------Functions for creating final csv based off of topics backup csv-------------------------------
-    def end_of_day_thread(self) -> None:
-        while self.continue_flag:
-            if datetime.now().day != self.start_time.day:
-                logger.info("EOD reached")
-                self.end_of_day(
-                    self.start_time.year,
-                    self.start_time.month,
-                    self.start_time.day
-                )
-            time.sleep(15)
-
-
-    # Deprecated
-    def obtain_df(self, year, month, day) -> pd.DataFrame | None:
-        filename = f"{self.output_directory}/{year}{month:02d}{day:02d}-{self.output_filename}.csv"
-        try:
-            df = pd.read_csv(filename, usecols = [0, 2, 3])
-        except FileNotFoundError:
-            logger.info(f"{self.output_filename} file not found. No data to process.")
-            return None
-        except pd.errors.EmptyDataError as error:
-            logger.error(f"Error reading {self.output_filename}: {error}")
-            return None
-        else:
-            return df
-
-
-    def end_of_day(self, year, month, day) -> None:
-        self.start_time = datetime.now()  # Move start date from yesterday to today
-        
-        # df = self.obtain_df(year, month, day)
-        # if df is None:
-        #     return
-        # df = self.process_data_pandas(df)
-        # os.makedirs(self.processed_directory, exist_ok=True)
-        # filename = f"{self.processed_directory}/{year}{month:02d}{day:02d}-{self.processed_filename}.csv"
-        # self.write_to_file(df, filename)
-
-        os.makedirs(self.processed_directory, exist_ok=True)
-        backup_filename = f"{self.output_directory}/{year}{month:02d}{day:02d}-{self.output_filename}.csv"
-        processed_filename = f"{self.processed_directory}/{year}{month:02d}{day:02d}-{self.processed_filename}.csv"
-        self.manage_csv_buffer(backup_filename, processed_filename)
-
-
-    def can_cast_to_float(self, series: pd.Series) -> bool:
-        try:
-            # Try to cast each value to float
-            series.astype(float)
-            return True
-        except ValueError:
-            return False
-
-
-    def split_df_by_float(self, df: pd.DataFrame):
-        float_columns = []
-        string_columns = []
-
-        # Iterate over each column
-        for col in df.columns:
-            if self.can_cast_to_float(df[col]):
-                float_columns.append(col)
-            else:
-                string_columns.append(col)
-
-        # Create DataFrames with selected columns
-        float_df = df[float_columns].astype("float64")
-        string_df = df[string_columns]
-
-        return float_df, string_df
-
-
-    # Deprecated
-    def process_data_pandas(self, df: pd.DataFrame) -> pd.DataFrame:
-        logger.info("Starting to process data")
-        start = time.perf_counter()
-        
-        df["time"] = pd.to_datetime(df["time"])
-        df = df.pivot(index = "time", columns = ["id"], values = "value")
-
-        float_df, string_df = self.split_df_by_float(df)
-        float_df = float_df.interpolate(method = "time", limit = self.nan_limit)
-        float_df = float_df.resample(rule = f"{self.resample_time_seconds}s").mean()
-        string_df = string_df.resample(rule = f"{self.resample_time_seconds}s").last()
-        result = pd.concat([float_df, string_df], axis = 1)
-        result = result.dropna(axis = 0, how = "all")
-
-        stop = time.perf_counter()
-        performance_time = stop - start
-        self.client_df_performance_time.set(performance_time)
-        logger.info(f"Pandas performance time: {performance_time:.2f} s")
-        return result
-
-
-# ---------------- Using generators for memory efficient parsing of csv data--------------------------------
-    def get_unique_ids(self, filename: str) -> list[str]:
-        id_list = []
-        with open(filename, "r") as file:
-            next(file, None)
-            for row in file:
-                row_id = row.split(",")[2]
-                if row_id not in id_list:
-                    id_list.append(row_id)
-        return id_list
-
-
-    def yield_row_from_csv(self, filename: str):  
-        with open(filename, "r") as file:
-            next(file, None)
-            for row in file:
-                row = row.split(",")
-                row_time = row[0]
-                row_id = row[2]
-                try:
-                    row_value = float(row[3])
-                except ValueError:
-                    row_value = row[3].rstrip()
-                yield (row_time, row_id, row_value)
-
-    
-    def manage_csv_buffer(self, backup_filename: str, processed_filename: str) -> None:
-        try:
-            open(backup_filename, "r")
-        except FileNotFoundError:
-            logger.info(f"{backup_filename} file not found. No data to process.")
-            return None
-        
-        id_list = self.get_unique_ids(backup_filename)
-        data = Buffer()
-        generator = self.yield_row_from_csv(backup_filename)
-        logger.info("Starting to process data.")
-        start = time.perf_counter()
-
-        while True:
-            try:
-                (row_time, row_id, row_value) = next(generator)
-            except StopIteration:
-                if data:
-                    df = self.process_data(data.dump())
-                    self.write_to_file(df, processed_filename, append = True, index = True)
-
-                stop = time.perf_counter()
-                performance_time = stop - start
-                self.client_df_performance_time.set(performance_time)
-                logger.info(f"Pandas performance time: {performance_time:.2f} s")
-                break
-
-            row = {"time": row_time}
-            for unique_id in id_list:
-                if unique_id == row_id:
-                    row.update({row_id: row_value})
-                else:
-                    row.update({unique_id: None})
-
-            data.append(row)
-            if (len(data) == self.max_buffer) or (len(data) == data.maxlen):
-                df = self.process_data(data.dump())
-                self.write_to_file(df, processed_filename, append = True, index = True)
-
-
-    def process_data(self, data: list) -> pd.DataFrame:
-        df = pd.DataFrame(data)
-        df["time"] = pd.to_datetime(df["time"])
-        df.set_index("time", inplace = True)
-        rounding_num_decimals = 10
-
-        float_df, string_df = self.split_df_by_float(df)
-        # float_df = float_df.interpolate(method = "time", limit = self.nan_limit)
-        float_df = float_df.resample(rule = f"{self.resample_time_seconds}s").mean()
-        float_df = float_df.round(rounding_num_decimals)
-        string_df = string_df.resample(rule = f"{self.resample_time_seconds}s").last()
-        result = pd.concat([float_df, string_df], axis = 1)
-        result = result.dropna(axis = 0, how = "all")
-        return result
-
-
-#--------------Functions for updating csv with topics when buffer fills up-----------------------------------
-    def manage_buffer_thread(self) -> None:
-        compare_time = datetime.now()
-        while self.continue_flag:
-            buffer_time_exceeded = (datetime.now() - compare_time).total_seconds() > self.buffer_time_interval
-            if (self.buffer.size() > self.max_buffer) or (buffer_time_exceeded and self.buffer.not_empty()):
-                self.client_buffer_length.set(self.buffer.size())
-                self.dump_buffer_to_csv()
-                compare_time = datetime.now()
-            time.sleep(1)
-
-    
-    def dump_buffer_to_csv(self) -> None:
-        try:
-            os.makedirs(self.output_directory, exist_ok=True)
-        except Exception as error:
-            logger.error(f"{error}")
-        filename = f"{self.output_directory}/{self.start_time.year}{self.start_time.month:02d}{self.start_time.day:02d}-{self.output_filename}.csv"
-        df = pd.DataFrame(self.buffer.dump())
-        self.write_to_file(df, filename, append = True)
-
-
-    def write_to_file(
-            self,
-            df: pd.DataFrame,
-            filepath: str,
-            append: bool = False,
-            index: bool = False
-        ) -> None:
-
-        if append:
-            df.to_csv(filepath, mode = 'a', header = not os.path.exists(filepath), index = index)
-        else:
-            df.to_csv(filepath)
-
-
-    def __del__(self):
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By  : Jason Schultz
+# Created Date: 2023-01-23
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""MQTT client for backing up subscribed topics to csv"""
+# ---------------------------------------------------------------------------
+from mqtt_node_network.node import MQTTNode
+from mqtt_node_network.client import (MQTTClient, MQTTBrokerConfig)
+from mqtt_node_network.initialize import initialize
+from data_extraction.topic_mapper import TopicMapper
+from data_extraction.column_buffer import ColumnarBuffer
+from data_extraction.decoder import (PayloadDecoder, NUMERIC)
+from data_extraction.writer import AsyncRawWriter
+from data_extraction.wal import (WriteAheadLog, read_segment, remove_segments)
+from data_extraction.spill import (SpillQueue, SPILL_DROP_POLICIES)
+from data_extraction.raw_parquet import (ParquetRawWriter, batch_to_table, rows_to_table, raw_parquet_files, iter_raw_batches, require_pyarrow, PARQUET_EXTENSION)
+from data_extraction.csv_writer import (StreamingCsvWriter, rows_to_csv_columns, FSYNC_POLICIES)
+from data_extraction.compression import (iter_lines, pandas_compression, COMPRESSIONS, COMPRESSION_EXTENSIONS, COMPRESSION_NONE)
+from data_extraction.eod import (
+    GapInterpolator, LiveAggregator, StreamingResampler, bucket_date_format, bucket_origin_ns, id_aggregations, resample_ns, AGGREGATIONS
+)
+from data_extraction.eod_process import (
+    EodJob, EodProcessRunner, iter_csv_rows, iter_parquet_rows, process_day, widen_processed_file, write_processed_frame
+)
+from data_extraction.id_catalog import IdCatalog
+from data_extraction.type_registry import (TypeRegistry, batch_types, merge_type, value_type)
+from data_extraction.block_index import (IndexedBlock, append_block, epoch_local_bounds)
+from data_extraction.extract import (extract, raw_day_filenames)
+from data_extraction.backfill import (backfill_jobs, missing_days, processed_day_filename, run_backfill, LIVE_EXTENSION)
+from data_extraction.pipeline import (MessageQueue, OVERFLOW_POLICIES, BLOCK)
+from data_extraction.timestamps import (epoch_ns_to_local, parse_time_column, TIME_NS_COLUMN)
+from paho.mqtt.client import MQTTMessage
+from buffered.buffer import Buffer
+from prometheus_client import Gauge
+
+import time
+from datetime import (date, datetime, timedelta)
+import numpy as np
+import pandas as pd
+import os
+from threading import (Thread, Condition, Lock)
+from functools import partial
+from typing import Callable
+import logging
+from dataclasses import dataclass
+import psutil
+
+logger = logging.getLogger("data_extraction")
+
+config = initialize(
+    config="./config/config.toml", secrets=".env", logger="./config/logger.yaml"
+)
+BROKER_CONFIG = config["mqtt"]["broker"]
+
+
+@dataclass
+class DataExtractionConfig():
+    name: str
+    node_id: str
+    max_buffer_length: int
+    max_buffer_time: float
+    subscriptions: str | list[str]
+    topic_structure: str
+    id_structure: str
+    resample_time: float | list[float]
+    nan_limit: int
+    output_filename: str
+    output_directory: str
+    processed_output_filename: str
+    processed_output_directory: str
+    topic_cache_size: int = 10_000
+    buffer_type: str = "list"
+    timestamp_mode: str = "datetime"
+    raw_time_ns_column: bool = False
+    pipeline_mode: bool = False
+    pipeline_queue_size: int = 100_000
+    pipeline_batch_size: int = 1_000
+    pipeline_overflow_policy: str = "drop_oldest"
+    async_writer: bool = False
+    raw_writer: str = "pandas"
+    fsync_policy: str = "never"
+    fsync_interval: float = 10.0
+    raw_format: str = "csv"
+    parquet_row_groups_per_file: int = 360
+    raw_compression: str = "none"
+    compression_level: int | None = None
+    eod_chunk_rows: int = 100_000
+    eod_workers: int = 1
+    eod_process: bool = False
+    eod_memory_limit: int | float = 2*1024
+    eod_retries: int = 2
+    eod_catch_up: bool = True
+    eod_catch_up_days: int = 7
+    eod_backfill_workers: int = 2
+    live_aggregation: bool = False
+    live_aggregation_lag: float = 60.0
+    raw_index: bool = True
+    interpolate_gaps: bool = False
+    aggregations: dict[str, list[str]] | None = None
+    write_ahead_log: bool = False
+    wal_sync_interval: float = 1.0
+    wal_segment_mb: int | float = 16
+    spill_to_disk: bool = False
+    spill_high_water: int = 9_000
+    spill_budget_mb: int | float = 1024
+    spill_drop_policy: str = "drop_newest"
+
+    def __post_init__(self):
+        if not isinstance(self.max_buffer_length, int):
+            raise TypeError("max_buffer_length needs to be an integer.")
+        if not isinstance(self.nan_limit, int):
+            raise TypeError("nan_limit needs to be an integer.")
+        if not isinstance(self.topic_cache_size, int):
+            raise TypeError("topic_cache_size needs to be an integer.")
+        if self.buffer_type not in ("list", "columnar"):
+            raise ValueError("buffer_type needs to be either 'list' or 'columnar'.")
+        if self.timestamp_mode not in ("datetime", "epoch_ns"):
+            raise ValueError("timestamp_mode needs to be either 'datetime' or 'epoch_ns'.")
+        if not isinstance(self.raw_time_ns_column, bool):
+            raise TypeError("raw_time_ns_column needs to be a boolean.")
+        if self.raw_time_ns_column and (self.buffer_type, self.timestamp_mode) == ("list", "datetime"):
+            raise ValueError("raw_time_ns_column needs timestamp_mode 'epoch_ns' or buffer_type 'columnar'.")
+        if not isinstance(self.pipeline_mode, bool):
+            raise TypeError("pipeline_mode needs to be a boolean.")
+        if not isinstance(self.pipeline_queue_size, int):
+            raise TypeError("pipeline_queue_size needs to be an integer.")
+        if not isinstance(self.pipeline_batch_size, int):
+            raise TypeError("pipeline_batch_size needs to be an integer.")
+        if self.pipeline_overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"pipeline_overflow_policy needs to be one of {OVERFLOW_POLICIES}.")
+        if not isinstance(self.async_writer, bool):
+            raise TypeError("async_writer needs to be a boolean.")
+        if self.raw_writer not in ("pandas", "stream"):
+            raise ValueError("raw_writer needs to be either 'pandas' or 'stream'.")
+        if self.fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy needs to be one of {FSYNC_POLICIES}.")
+        if not isinstance(self.fsync_interval, (int, float)):
+            raise TypeError("fsync_interval needs to be either an integer or float.")
+        if self.raw_format not in ("csv", "parquet"):
+            raise ValueError("raw_format needs to be either 'csv' or 'parquet'.")
+        if not isinstance(self.parquet_row_groups_per_file, int):
+            raise TypeError("parquet_row_groups_per_file needs to be an integer.")
+        if self.raw_compression not in COMPRESSIONS:
+            raise ValueError(f"raw_compression needs to be one of {COMPRESSIONS}.")
+        if (self.raw_compression != COMPRESSION_NONE) and (self.raw_format != "csv"):
+            raise ValueError("raw_compression only applies to the 'csv' raw_format, parquet is always compressed.")
+        if self.compression_level is not None:
+            if not isinstance(self.compression_level, int):
+                raise TypeError("compression_level needs to be an integer.")
+            if not 0 <= self.compression_level <= 9:
+                raise ValueError("compression_level needs to be between 0 and 9.")
+        if not isinstance(self.eod_chunk_rows, int) or self.eod_chunk_rows < 1:
+            raise ValueError("eod_chunk_rows needs to be a positive integer.")
+        if not isinstance(self.eod_workers, int) or self.eod_workers < 1:
+            raise ValueError("eod_workers needs to be a positive integer.")
+        if not isinstance(self.eod_process, bool):
+            raise TypeError("eod_process needs to be a boolean.")
+        if not isinstance(self.eod_memory_limit, (int, float)):
+            raise TypeError("eod_memory_limit needs to be either an integer or float.")
+        if self.eod_memory_limit <= 0:
+            raise ValueError("eod_memory_limit needs to be positive.")
+        if not isinstance(self.eod_retries, int) or self.eod_retries < 0:
+            raise ValueError("eod_retries needs to be a non negative integer.")
+        if not isinstance(self.eod_catch_up, bool):
+            raise TypeError("eod_catch_up needs to be a boolean.")
+        if not isinstance(self.eod_catch_up_days, int) or self.eod_catch_up_days < 0:
+            raise ValueError("eod_catch_up_days needs to be a non negative integer.")
+        if not isinstance(self.eod_backfill_workers, int) or self.eod_backfill_workers < 1:
+            raise ValueError("eod_backfill_workers needs to be a positive integer.")
+        if not isinstance(self.live_aggregation, bool):
+            raise TypeError("live_aggregation needs to be a boolean.")
+        if not isinstance(self.live_aggregation_lag, (int, float)):
+            raise TypeError("live_aggregation_lag needs to be either an integer or float.")
+        if self.live_aggregation_lag < 0:
+            raise ValueError("live_aggregation_lag can not be negative.")
+        if not isinstance(self.raw_index, bool):
+            raise TypeError("raw_index needs to be a boolean.")
+        if not isinstance(self.interpolate_gaps, bool):
+            raise TypeError("interpolate_gaps needs to be a boolean.")
+        if self.interpolate_gaps and self.nan_limit < 0:
+            raise ValueError("nan_limit can not be negative when interpolate_gaps is on.")
+        if self.aggregations is not None:
+            if not isinstance(self.aggregations, dict):
+                raise TypeError("aggregations needs to be a table of id patterns to lists of aggregates.")
+            for (pattern, functions) in self.aggregations.items():
+                if not isinstance(functions, list) or not functions:
+                    raise TypeError(f"Aggregations of {pattern} need to be a non empty list.")
+                for function in functions:
+                    if function not in AGGREGATIONS:
+                        raise ValueError(f"Aggregation {function} of {pattern} needs to be one of {AGGREGATIONS}.")
+        if not isinstance(self.write_ahead_log, bool):
+            raise TypeError("write_ahead_log needs to be a boolean.")
+        if not isinstance(self.wal_sync_interval, (int, float)):
+            raise TypeError("wal_sync_interval needs to be either an integer or float.")
+        if self.wal_sync_interval < 0:
+            raise ValueError("wal_sync_interval can not be negative.")
+        if not isinstance(self.wal_segment_mb, (int, float)):
+            raise TypeError("wal_segment_mb needs to be either an integer or float.")
+        if self.wal_segment_mb <= 0:
+            raise ValueError("wal_segment_mb needs to be positive.")
+        if not isinstance(self.spill_to_disk, bool):
+            raise TypeError("spill_to_disk needs to be a boolean.")
+        if not isinstance(self.spill_high_water, int) or self.spill_high_water < 1:
+            raise ValueError("spill_high_water needs to be a positive integer.")
+        if not isinstance(self.spill_budget_mb, (int, float)):
+            raise TypeError("spill_budget_mb needs to be either an integer or float.")
+        if self.spill_budget_mb <= 0:
+            raise ValueError("spill_budget_mb needs to be positive.")
+        if self.spill_drop_policy not in SPILL_DROP_POLICIES:
+            raise ValueError(f"spill_drop_policy needs to be one of {SPILL_DROP_POLICIES}.")
+        if not isinstance(self.topic_structure, str):
+            raise TypeError("topic_structure needs to be a string.")
+        if not isinstance(self.id_structure, str):
+            raise TypeError("id_structure needs to be a string.")
+        if not isinstance(self.output_directory, str):
+            raise TypeError("output_directory needs to be a string.")
+        if not isinstance(self.output_filename, str):
+            raise TypeError("output_filename needs to be a string.")
+        if not isinstance(self.processed_output_directory, str):
+            raise TypeError("processed_output_directory needs to be a string.")
+        if not isinstance(self.processed_output_filename, str):
+            raise TypeError("processed_output_filename needs to be a string.")
+        resample_times = self.resample_time if isinstance(self.resample_time, list) else [self.resample_time]
+        if not resample_times:
+            raise ValueError("resample_time needs at least one resolution.")
+        for resample_time in resample_times:
+            if not isinstance(resample_time, (int, float)):
+                raise TypeError("resample_time needs to be either an integer, float or list of them.")
+            if resample_time <= 0:
+                raise ValueError("resample_time needs to be positive.")
+        for resample_time in resample_times[1:]:
+            if (resample_ns(resample_time) <= resample_ns(resample_times[0])) or (resample_ns(resample_time) % resample_ns(resample_times[0])):
+                raise ValueError("Every further resample_time needs to be a larger multiple of the first one.")
+        if not isinstance(self.subscriptions, str):
+            if isinstance(self.subscriptions, list):
+                for subscription in self.subscriptions:
+                    if not isinstance(subscription, str):
+                        raise TypeError(f"Subscription: {subscription} is not a string.")
+            else:
+                raise TypeError("subscriptions need to be either a string or list of strings")
+
+
+EXTRACTION_CONFIG = DataExtractionConfig(
+    name = config["data_extraction"]["name"],
+    node_id = config["data_extraction"]["node_id"],
+    max_buffer_length = config["data_extraction"]["max_buffer_length"],
+    max_buffer_time = config["data_extraction"]["max_buffer_time"],
+    subscriptions = config["data_extraction"]["subscriptions"],
+    topic_structure = config["mqtt"]["node_network"]["topic_structure"],
+    id_structure = config["data_extraction"]["id_structure"],
+    resample_time = config["data_extraction"]["resample_time"],
+    nan_limit = config["data_extraction"]["nan_limit"],
+    output_filename = config["data_extraction"]["ouput_filename"],
+    output_directory = config["data_extraction"]["output_directory"],
+    processed_output_filename = config["data_extraction"]["processed_output_filename"],
+    processed_output_directory = config["data_extraction"]["processed_output_directory"],
+    topic_cache_size = config["data_extraction"].get("topic_cache_size", 10_000),
+    buffer_type = config["data_extraction"].get("buffer_type", "list"),
+    timestamp_mode = config["data_extraction"].get("timestamp_mode", "datetime"),
+    raw_time_ns_column = config["data_extraction"].get("raw_time_ns_column", False),
+    pipeline_mode = config["data_extraction"].get("pipeline_mode", False),
+    pipeline_queue_size = config["data_extraction"].get("pipeline_queue_size", 100_000),
+    pipeline_batch_size = config["data_extraction"].get("pipeline_batch_size", 1_000),
+    pipeline_overflow_policy = config["data_extraction"].get("pipeline_overflow_policy", "drop_oldest"),
+    async_writer = config["data_extraction"].get("async_writer", False),
+    raw_writer = config["data_extraction"].get("raw_writer", "pandas"),
+    fsync_policy = config["data_extraction"].get("fsync_policy", "never"),
+    fsync_interval = config["data_extraction"].get("fsync_interval", 10.0),
+    raw_format = config["data_extraction"].get("raw_format", "csv"),
+    parquet_row_groups_per_file = config["data_extraction"].get("parquet_row_groups_per_file", 360),
+    raw_compression = config["data_extraction"].get("raw_compression", "none"),
+    compression_level = config["data_extraction"].get("compression_level"),
+    eod_chunk_rows = config["data_extraction"].get("eod_chunk_rows", 100_000),
+    eod_workers = config["data_extraction"].get("eod_workers", 1),
+    eod_process = config["data_extraction"].get("eod_process", False),
+    eod_memory_limit = config["data_extraction"].get("eod_memory_limit", 2*1024),
+    eod_retries = config["data_extraction"].get("eod_retries", 2),
+    eod_catch_up = config["data_extraction"].get("eod_catch_up", True),
+    eod_catch_up_days = config["data_extraction"].get("eod_catch_up_days", 7),
+    eod_backfill_workers = config["data_extraction"].get("eod_backfill_workers", 2),
+    live_aggregation = config["data_extraction"].get("live_aggregation", False),
+    live_aggregation_lag = config["data_extraction"].get("live_aggregation_lag", 60.0),
+    raw_index = config["data_extraction"].get("raw_index", True),
+    interpolate_gaps = config["data_extraction"].get("interpolate_gaps", False),
+    aggregations = config["data_extraction"].get("aggregations"),
+    write_ahead_log = config["data_extraction"].get("write_ahead_log", False),
+    wal_sync_interval = config["data_extraction"].get("wal_sync_interval", 1.0),
+    wal_segment_mb = config["data_extraction"].get("wal_segment_mb", 16),
+    spill_to_disk = config["data_extraction"].get("spill_to_disk", False),
+    spill_high_water = config["data_extraction"].get("spill_high_water", 9_000),
+    spill_budget_mb = config["data_extraction"].get("spill_budget_mb", 1024),
+    spill_drop_policy = config["data_extraction"].get("spill_drop_policy", "drop_newest"),
+)
+
+
+class DataExtractionClient(MQTTClient):
+    client_memory_usage = Gauge(
+        "client_memory_usage",
+        "Program's memory usage in MB",
+    )
+    client_buffer_length = Gauge(
+        "client_buffer_length",
+        "Length of the buffer before dumping",
+    )
+    client_df_performance_time = Gauge(
+        "client_dataframe_performance_time",
+        "Time in seconds to process csv file in Pandas",
+    )
+    client_topic_cache_hits = Gauge(
+        "client_topic_cache_hits",
+        "Number of topics resolved from the topic to id cache",
+    )
+    client_topic_cache_misses = Gauge(
+        "client_topic_cache_misses",
+        "Number of topics that had to be parsed into an id",
+    )
+    client_topic_cache_evictions = Gauge(
+        "client_topic_cache_evictions",
+        "Number of topics evicted from the topic to id cache",
+    )
+    client_buffer_rows_lost = Gauge(
+        "client_buffer_rows_lost",
+        "Number of buffered rows overwritten because the buffer reached its maxlen",
+    )
+    client_write_latency = Gauge(
+        "client_write_latency",
+        "Time in seconds the raw writer took to write the last buffer dump",
+    )
+    client_bytes_written = Gauge(
+        "client_bytes_written",
+        "Number of bytes written to raw files by the raw writer",
+    )
+    client_writer_backpressure = Gauge(
+        "client_writer_backpressure",
+        "Number of times a flush had to wait for the raw writer to finish the previous dump",
+    )
+    client_queue_depth = Gauge(
+        "client_queue_depth",
+        "Number of messages waiting for the parse worker",
+    )
+    client_parse_batch_size = Gauge(
+        "client_parse_batch_size",
+        "Number of messages parsed in the last parse worker batch",
+    )
+    client_queue_dropped = Gauge(
+        "client_queue_dropped",
+        "Number of messages dropped by the queue overflow policy",
+    )
+    client_live_late_rows = Gauge(
+        "client_live_late_rows",
+        "Number of rows that arrived after their live aggregation bucket was written",
+    )
+    client_eod_rows_processed = Gauge(
+        "client_eod_rows_processed",
+        "Number of raw rows the end of day child process has read so far",
+    )
+    client_eod_failures = Gauge(
+        "client_eod_failures",
+        "Number of end of day child processes that failed or ran out of memory",
+    )
+    client_eod_days_behind = Gauge(
+        "client_eod_days_behind",
+        "Number of past raw days without a processed file, as of the last backfill",
+    )
+    client_id_type_changes = Gauge(
+        "client_id_type_changes",
+        "Number of ids that changed between numeric and string values during the day",
+    )
+    
+    client_wal_pending_bytes = Gauge(
+        "client_wal_pending_bytes",
+        "Bytes of write-ahead log holding rows that are not in the raw file yet",
+    )
+    client_wal_replayed_rows = Gauge(
+        "client_wal_replayed_rows",
+        "Number of rows replayed from the write-ahead log of a previous run",
+    )
+    client_spilled_bytes = Gauge(
+        "client_spilled_bytes",
+        "Bytes of rows spilled to disk that are not in the raw file yet",
+    )
+    client_spill_lag = Gauge(
+        "client_spill_lag",
+        "Age in seconds of the oldest spilled row that is not in the raw file yet",
+    )
+    client_spill_rows_dropped = Gauge(
+        "client_spill_rows_dropped",
+        "Number of rows dropped because the spill files reached spill_budget_mb",
+    )
+
+    def __init__(
+            self,
+            broker_config: MQTTBrokerConfig = None,
+            data_extraction_config: DataExtractionConfig = None,
+        ):
+        broker_config = broker_config or BROKER_CONFIG
+        data_extraction_config = data_extraction_config or EXTRACTION_CONFIG
+        self.columnar_buffer = data_extraction_config.buffer_type == "columnar"
+        # The columnar buffer always records epoch nanoseconds
+        self.epoch_timestamps = self.columnar_buffer or (data_extraction_config.timestamp_mode == "epoch_ns")
+        self.raw_time_ns_column = data_extraction_config.raw_time_ns_column
+        if self.columnar_buffer:
+            buffer = ColumnarBuffer(capacity = 10_000)
+        else:
+            buffer = Buffer(maxlen = 10_000)
+        MQTTClient.__init__(
+            self,
+            broker_config = broker_config,
+            name = data_extraction_config.name,
+            node_id = data_extraction_config.node_id,
+            node_type = None,
+            logger = logger,
+            buffer = buffer,
+            topic_structure = data_extraction_config.topic_structure,
+        )
+        self.start_time = datetime.now()
+        self.max_buffer = data_extraction_config.max_buffer_length
+        resample_times = data_extraction_config.resample_time
+        if not isinstance(resample_times, list):
+            resample_times = [resample_times]
+        self.resample_time_seconds = resample_times[0]
+        # Coarser resolutions rolled up from resample_time_seconds, each into its own processed file
+        self.rollup_seconds = tuple(resample_times[1:])
+        self.buffer_time_interval = data_extraction_config.max_buffer_time
+        self.output_filename = data_extraction_config.output_filename
+        self.processed_filename = data_extraction_config.processed_output_filename
+        self.id_structure = data_extraction_config.id_structure
+        self.output_directory = data_extraction_config.output_directory
+        self.processed_directory = data_extraction_config.processed_output_directory
+        self.nan_limit = data_extraction_config.nan_limit
+        # Gaps of up to nan_limit buckets are interpolated in processed files
+        self.interpolation_limit = self.nan_limit if data_extraction_config.interpolate_gaps else None
+        # Id patterns written with their own aggregates instead of mean or last
+        self.aggregations = data_extraction_config.aggregations
+        self.eod_chunk_rows = data_extraction_config.eod_chunk_rows
+        self.eod_workers = data_extraction_config.eod_workers
+        self.eod_runner = None
+        if data_extraction_config.eod_process:
+            self.eod_runner = EodProcessRunner(
+                memory_limit_mb = data_extraction_config.eod_memory_limit,
+                retries = data_extraction_config.eod_retries
+            )
+        self.eod_catch_up = data_extraction_config.eod_catch_up
+        self.eod_catch_up_days = data_extraction_config.eod_catch_up_days
+        self.eod_backfill_workers = data_extraction_config.eod_backfill_workers
+        self.eod_days_behind = 0
+        self.subscriptions = data_extraction_config.subscriptions
+        self.decoder = PayloadDecoder(maxsize = data_extraction_config.topic_cache_size)
+        self.topic_mapper = TopicMapper(
+            self.topic_structure,
+            self.id_structure,
+            maxsize = data_extraction_config.topic_cache_size
+        )
+
+        self.pipeline_mode = data_extraction_config.pipeline_mode
+        self.pipeline_batch_size = data_extraction_config.pipeline_batch_size
+        self.message_queue = MessageQueue(
+            maxsize = data_extraction_config.pipeline_queue_size,
+            overflow_policy = data_extraction_config.pipeline_overflow_policy
+        )
+
+        self.raw_format = data_extraction_config.raw_format
+        self.parquet_writer = None
+        if self.raw_format == "parquet":
+            require_pyarrow()
+            self.parquet_writer = ParquetRawWriter(
+                row_groups_per_file = data_extraction_config.parquet_row_groups_per_file
+            )
+        self.raw_compression = data_extraction_config.raw_compression
+        self.compression_level = data_extraction_config.compression_level
+        self.stream_writer = None
+        if data_extraction_config.raw_writer == "stream":
+            self.stream_writer = StreamingCsvWriter(
+                fsync_policy = data_extraction_config.fsync_policy,
+                fsync_interval = data_extraction_config.fsync_interval,
+                compression = self.raw_compression,
+                compression_level = self.compression_level
+            )
+        self.raw_writer = None
+        if data_extraction_config.async_writer:
+            self.raw_writer = AsyncRawWriter(self.write_raw_batch, size_function = self.raw_file_size)
+        self.id_catalog = IdCatalog()
+        self.type_registry = TypeRegistry()
+        # Parquet row groups carry their own time statistics
+        self.raw_index = data_extraction_config.raw_index and (self.raw_format == "csv")
+        self.live_aggregator = None
+        if data_extraction_config.live_aggregation:
+            self.live_aggregator = LiveAggregator(
+                self.resample_time_seconds,
+                data_extraction_config.live_aggregation_lag,
+                write_function = self.write_processed_chunk,
+                widen_function = self.widen_processed_file,
+                nan_limit = self.interpolation_limit,
+                rollup_seconds = self.rollup_seconds,
+                aggregations = self.aggregations
+            )
+            self.start_live_day()
+        self.flush_condition = Condition()
+        self.flush_requested: bool = False
+        self.buffer_rows_lost: int = 0
+        self.wal = None
+        # Keeps every row logged in the segments rotate() hands out with the dump holding it
+        self.wal_lock = Lock()
+        self.wal_rows_replayed: int = 0
+        if data_extraction_config.write_ahead_log:
+            self.wal = WriteAheadLog(
+                self.output_directory,
+                self.output_filename,
+                segment_bytes = int(data_extraction_config.wal_segment_mb*1024*1024),
+                sync_interval = data_extraction_config.wal_sync_interval
+            )
+            self.wal_rows_replayed = self.replay_segments(self.wal.pending_segments())
+        self.spill = None
+        # Rows go to the spill files instead of the buffer once it holds spill_high_water rows
+        self.spill_high_water = min(data_extraction_config.spill_high_water, self.buffer.maxlen)
+        if data_extraction_config.spill_to_disk:
+            self.spill = SpillQueue(
+                self.output_directory,
+                self.output_filename,
+                budget_bytes = int(data_extraction_config.spill_budget_mb*1024*1024),
+                drop_policy = data_extraction_config.spill_drop_policy
+            )
+            self.replay_segments(self.spill.pending_segments())
+
+        # Initializing threads
+        self.eod_handle = Thread(target = self.end_of_day_thread)
+        self.catch_up_handle = Thread(target = self.catch_up_thread)
+        self.buffer_handle = Thread(target = self.manage_buffer_thread)
+        self.performance_handle = Thread(target = self.performance_thread)
+        self.parse_handle = Thread(target = self.parse_worker_thread)
+        self.continue_flag: bool = True
+
+        # os.makedirs(self.output_directory, exist_ok=True)
+        # os.makedirs(self.processed_directory, exist_ok=True)
+
+        self.metrics_label_value = ""
+        for (index, subscription) in enumerate(self.subscriptions):
+            if index != 0:
+                self.metrics_label_value += " + "
+            self.metrics_label_value += subscription.split("/")[0]
+
+
+#-------------------Functions for performance monitoring------------------------------------------------------
+    def performance_thread(self) -> None:
+        while self.continue_flag:
+            time.sleep(10)
+            self.performace()
+
+
+    # https://psutil.readthedocs.io/en/latest/
+    # https://stackoverflow.com/questions/276052/how-to-get-current-cpu-and-ram-usage-in-python
+    def performace(self) -> None:
+        svmem = psutil.virtual_memory()
+        if svmem.percent >= 95:
+            logger.critical(f"VM memory at {svmem.percent} %! Shutting down program.")
+            self.continue_flag = False
+        python_process = psutil.Process(os.getpid())
+        memory_usage = python_process.memory_info().rss / (1024*1024)  # MB
+        logger.info(f"Memory usage: {memory_usage:.2f} MB")
+        # self.client_memory_usage.labels(
+        #     subscriptions = self.metrics_label_value
+        # ).set(memory_usage)
+        self.client_memory_usage.set(memory_usage)
+        memory_limit = 2*1024
+        if memory_usage > memory_limit:
+            logger.critical(f"Memory usage of {memory_usage:.2f} MB > {memory_limit} MB. Shutting down program.")
+            self.continue_flag = False
+
+        self.client_buffer_rows_lost.set(self.rows_lost_to_overflow())
+
+        cache_info = self.topic_mapper.cache_info()
+        self.client_topic_cache_hits.set(cache_info.hits)
+        self.client_topic_cache_misses.set(cache_info.misses)
+        self.client_topic_cache_evictions.set(cache_info.evictions)
+        if self.live_aggregator is not None:
+            self.client_live_late_rows.set(self.live_aggregator.late_rows)
+        if self.eod_runner is not None:
+            self.client_eod_rows_processed.set(self.eod_runner.rows_processed)
+            self.client_eod_failures.set(self.eod_runner.failures)
+        self.client_eod_days_behind.set(self.eod_days_behind)
+        self.client_id_type_changes.set(self.type_registry.type_changes)
+        if self.wal is not None:
+            self.client_wal_pending_bytes.set(self.wal.pending_bytes())
+            self.client_wal_replayed_rows.set(self.wal_rows_replayed)
+        if self.spill is not None:
+            self.client_spilled_bytes.set(self.spill.pending_bytes)
+            self.client_spill_lag.set(self.spill.lag_seconds(time.time_ns()))
+            self.client_spill_rows_dropped.set(self.spill.rows_dropped)
+
+
+#-------------------General operational functions-------------------------------------------------------------
+    def check_message_value(self, message: MQTTMessage):
+        return self.decoder.decode(message.topic, message.payload)
+
+
+    def resolve_field_id(self, topic: str) -> str | None:
+        # Rebuilds the compiled mapping if the structures were changed at runtime
+        self.topic_mapper.ensure_structure(self.topic_structure, self.id_structure)
+        return self.topic_mapper.resolve(topic)
+
+
+    def on_message(self, client, userdata, message: MQTTMessage) -> None:
+        MQTTNode.on_message(self, client, userdata, message)
+
+        if self.pipeline_mode:
+            self.enqueue_message(time.time_ns(), message.topic, message.payload)
+            return
+
+        value = self.check_message_value(message)
+        if value is None:
+            return
+        
+        field_id = self.resolve_field_id(message.topic)
+        if field_id is None:
+            return
+
+        self.append_to_buffer([(time.time_ns(), message.topic, field_id, value)])
+
+
+    def append_to_buffer(self, rows: list[tuple[int, str, str, object]]) -> None:
+        """Appends (receive_ns, topic, id, value) rows and wakes the flush thread once the buffer is full."""
+        if self.should_spill(len(rows)):
+            self.spill.append(rows)
+            if not self.flush_requested:
+                self.request_flush()
+            return
+        if self.wal is None:
+            self.extend_buffer(rows)
+        else:
+            with self.wal_lock:
+                self.wal.append(rows)
+                self.extend_buffer(rows)
+
+        if (self.buffer.size() > self.max_buffer) and not self.flush_requested:
+            self.request_flush()
+
+
+    def should_spill(self, count: int) -> bool:
+        # Once rows are spilled the following ones are too, until the spill files are drained
+        if self.spill is None:
+            return False
+        return self.spill.not_empty() or (self.buffer.size() + count > self.spill_high_water)
+
+
+    def extend_buffer(self, rows: list[tuple[int, str, str, object]]) -> None:
+        if self.columnar_buffer:
+            self.buffer.extend(rows)
+            return
+        if self.buffer.maxlen is not None:
+            self.buffer_rows_lost += max(0, len(self.buffer) + len(rows) - self.buffer.maxlen)
+        self.buffer.extend(self.row_dicts(rows))
+
+
+    def row_dicts(self, rows: list[tuple[int, str, str, object]]):
+        """Rows as the dicts held by the list buffer."""
+        if self.epoch_timestamps:
+            return (
+                {"time": receive_ns, "topic": topic, "id": field_id, "value": value}
+                for (receive_ns, topic, field_id, value) in rows
+            )
+        return (
+            {"time": datetime.fromtimestamp(receive_ns // 1_000 / 1e6), "topic": topic, "id": field_id, "value": value}
+            for (receive_ns, topic, field_id, value) in rows
+        )
+
+
+    def rows_to_batch(self, rows: list[tuple[int, str, str, object]]):
+        """A batch of rows in the form a dump of the buffer hands to write_raw_batch()."""
+        if self.columnar_buffer:
+            buffer = ColumnarBuffer(capacity = max(1, len(rows)))
+            buffer.extend(rows)
+            return buffer.dump()
+        return list(self.row_dicts(rows))
+
+
+    def rows_lost_to_overflow(self) -> int:
+        if self.columnar_buffer:
+            return self.buffer.overwritten
+        return self.buffer_rows_lost
+
+
+#-------------------Functions for the pipelined parse worker--------------------------------------------------
+    def enqueue_message(self, receive_ns: int, topic: str, payload: bytes) -> None:
+        # Blocking is bounded so a stalled worker cannot hang the network thread forever
+        timeout = self.buffer_time_interval if self.message_queue.overflow_policy == BLOCK else None
+        self.message_queue.put((receive_ns, topic, payload), timeout = timeout)
+
+
+    def parse_worker_thread(self) -> None:
+        while self.continue_flag or len(self.message_queue):
+            batch = self.message_queue.get_batch(self.pipeline_batch_size, timeout = 1)
+            self.client_queue_depth.set(len(self.message_queue))
+            self.client_queue_dropped.set(self.message_queue.dropped)
+            if not batch:
+                continue
+            self.client_parse_batch_size.set(len(batch))
+            self.process_message_batch(batch)
+
+
+    def process_message_batch(self, batch: list[tuple[int, str, bytes]]) -> None:
+        self.topic_mapper.ensure_structure(self.topic_structure, self.id_structure)
+        decode = self.decoder.decode
+        resolve = self.topic_mapper.resolve
+
+        rows = []
+        for (receive_ns, topic, payload) in batch:
+            value = decode(topic, payload)
+            if value is None:
+                continue
+            field_id = resolve(topic)
+            if field_id is None:
+                continue
+            rows.append((receive_ns, topic, field_id, value))
+        self.wait_for_buffer_space(len(rows))
+        self.append_to_buffer(rows)
+
+
+    def wait_for_buffer_space(self, count: int) -> None:
+        # Backpressure for the parse worker: while the writer still holds the spare buffer and the
+        # active one is full, stop appending so the queue overflow policy applies instead of the ring
+        if self.raw_writer is None:
+            return
+        deadline = time.monotonic() + self.buffer_time_interval
+        while (self.buffer.size() + count > self.buffer.maxlen) and self.continue_flag:
+            if time.monotonic() > deadline:
+                logger.warning("Raw writer backpressure timed out. Oldest buffered rows will be overwritten.")
+                return
+            self.request_flush()
+            self.raw_writer.wait_idle(timeout = 0.01)
+
+
+    def run(self) -> None:
+        if self.raw_writer is not None:
+            self.raw_writer.start()
+        if self.pipeline_mode:
+            self.parse_handle.start()
+        self.eod_handle.start()
+        if self.eod_catch_up:
+            self.catch_up_handle.start()
+        self.buffer_handle.start()
+        self.performance_handle.start()
+        logger.info("Threads started.")
+
+
+    def run_forever(self) -> None:
+        self.run()
+        while self.continue_flag:
+            time.sleep(1)
+        self.stop()
+
+    
+    def stop(self) -> None:
+        logger.info("Process stopping")
+        self.continue_flag = False
+        self.request_flush()
+        if self.parse_handle.is_alive():
+            self.parse_handle.join()
+        if self.buffer_handle.is_alive():
+            self.buffer_handle.join()
+        if self.buffer.not_empty() or ((self.spill is not None) and self.spill.not_empty()):
+            # Rows received since the last dump would otherwise only survive in the write-ahead log
+            self.dump_buffer_to_csv()
+        if self.raw_writer is not None:
+            self.raw_writer.stop()
+        if self.stream_writer is not None:
+            self.stream_writer.close()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        if self.wal is not None:
+            self.wal.close()
+        if self.spill is not None:
+            self.spill.close()
+        if self.performance_handle.is_alive():
+            self.performance_handle.join()
+        if self.eod_handle.is_alive():
+            self.eod_handle.join()
+        if self.catch_up_handle.is_alive():
+            self.catch_up_handle.join()
+
+
+#-------------Functions for creating final csv based off of topics backup csv-------------------------------
+    def end_of_day_thread(self) -> None:
+        while self.continue_flag:
+            if datetime.now().day != self.start_time.day:
+                logger.info("EOD reached")
+                self.end_of_day(
+                    self.start_time.year,
+                    self.start_time.month,
+                    self.start_time.day
+                )
+            time.sleep(15)
+
+
+    # Deprecated
+    def obtain_df(self, year, month, day) -> pd.DataFrame | None:
+        filename = f"{self.output_directory}/{year}{month:02d}{day:02d}-{self.output_filename}.csv"
+        try:
+            df = pd.read_csv(filename, usecols = [0, 2, 3])
+        except FileNotFoundError:
+            logger.info(f"{self.output_filename} file not found. No data to process.")
+            return None
+        except pd.errors.EmptyDataError as error:
+            logger.error(f"Error reading {self.output_filename}: {error}")
+            return None
+        else:
+            return df
+
+
+    def end_of_day(self, year, month, day) -> None:
+        self.start_time = datetime.now()  # Move start date from yesterday to today
+        if self.live_aggregator is not None:
+            self.start_live_day()
+        if self.raw_writer is not None:
+            self.raw_writer.wait_idle()  # Last dump of the day needs to be on disk
+        
+        # df = self.obtain_df(year, month, day)
+        # if df is None:
+        #     return
+        # df = self.process_data_pandas(df)
+        # os.makedirs(self.processed_directory, exist_ok=True)
+        # filename = f"{self.processed_directory}/{year}{month:02d}{day:02d}-{self.processed_filename}.csv"
+        # self.write_to_file(df, filename)
+
+        os.makedirs(self.processed_directory, exist_ok=True)
+        backup_filename = self.raw_filename(year, month, day)
+        if self.parquet_writer is not None:
+            self.parquet_writer.close_file(backup_filename)
+        processed_filename = self.processed_output_filename(year, month, day)
+        if (self.live_aggregator is not None) and self.live_aggregator.finish(backup_filename):
+            logger.info(f"{processed_filename} was built during the day, last buckets written.")
+            self.clear_live_marker(processed_filename)
+            return
+        if self.manage_csv_buffer(backup_filename, processed_filename):
+            # Also clears a marker left by a live day that was interrupted by a restart
+            self.clear_live_marker(processed_filename)
+
+
+    def clear_live_marker(self, processed_filename: str) -> None:
+        try:
+            if os.path.exists(processed_filename + LIVE_EXTENSION):
+                os.remove(processed_filename + LIVE_EXTENSION)
+        except OSError as error:
+            logger.error(f"Failed to remove {processed_filename + LIVE_EXTENSION}: {error}")
+
+
+    def catch_up_thread(self) -> None:
+        # Days the service was down for, or whose end of day failed
+        start = None
+        if self.eod_catch_up_days:
+            start = self.start_time.date() - timedelta(days = self.eod_catch_up_days)
+        try:
+            self.backfill(start)
+        except Exception as error:
+            logger.error(f"End of day catch up failed: {error}")
+
+
+    def backfill(self, start: date | None = None, end: date | None = None, workers: int | None = None) -> list[str]:
+        """
+        Processes the days from `start` to `end` with a raw file but no processed file.
+
+        Days are processed in parallel in low priority processes and the day
+        being written is never included. Returns the processed files written.
+        """
+        yesterday = self.start_time.date() - timedelta(days = 1)
+        end = yesterday if end is None else min(end, yesterday)
+        days = missing_days(self.output_directory, self.output_filename, self.processed_directory, self.processed_filename, start, end)
+        self.eod_days_behind = len(days)
+        if not days:
+            return []
+        logger.info(f"Backfilling {len(days)} days without a processed file, {days[0]} to {days[-1]}")
+        os.makedirs(self.processed_directory, exist_ok = True)
+        jobs = backfill_jobs(
+            days,
+            self.output_directory,
+            self.output_filename,
+            self.processed_directory,
+            self.processed_filename,
+            self.resample_time_seconds,
+            chunk_rows = self.eod_chunk_rows,
+            nan_limit = self.interpolation_limit,
+            rollup_seconds = self.rollup_seconds,
+            aggregations = self.aggregations
+        )
+        completed = run_backfill(jobs, workers or self.eod_backfill_workers, should_stop = lambda: not self.continue_flag)
+        self.eod_days_behind = len(days) - len(completed)
+        return [job.processed_filename for job in completed]
+
+
+    def start_live_day(self) -> None:
+        (year, month, day) = (self.start_time.year, self.start_time.month, self.start_time.day)
+        raw_filename = self.raw_filename(year, month, day)
+        if self.raw_file_exists(raw_filename):
+            # Rows from before a restart are not in the aggregator, end of day reprocesses the whole file
+            logger.info(f"{raw_filename} already exists, live aggregation starts with the next day.")
+            return
+        processed_filename = self.processed_output_filename(year, month, day)
+        try:
+            # Until end of day the processed file is incomplete, backfill reprocesses the day if the service stops before
+            os.makedirs(self.processed_directory, exist_ok = True)
+            open(processed_filename + LIVE_EXTENSION, "w").close()
+        except OSError as error:
+            logger.error(f"Failed to mark {processed_filename} as live: {error}")
+        self.live_aggregator.start_day(raw_filename, processed_filename)
+
+
+    def feed_live_aggregator(self, batch, filename: str) -> None:
+        if len(batch) == 0:
+            return
+        if self.columnar_buffer:
+            # Same microsecond timestamps as the raw file
+            time_ns = np.asarray(batch.time_column(), dtype = "datetime64[ns]").view(np.int64)
+            ids = np.asarray(batch.ids, dtype = object)[batch.id_codes]
+            values = batch.value_column()
+        else:
+            times = [row["time"] for row in batch]
+            if self.epoch_timestamps:
+                time_ns = np.asarray(epoch_ns_to_local(np.array(times, dtype = np.int64)), dtype = "datetime64[ns]").view(np.int64)
+            else:
+                time_ns = np.array(times, dtype = "datetime64[ns]").view(np.int64)
+            ids = [row["id"] for row in batch]
+            values = [row["value"] for row in batch]
+        self.live_aggregator.add(filename, time_ns, ids, values)
+
+
+    def emit_live_buckets(self) -> None:
+        try:
+            self.live_aggregator.emit(pd.Timestamp(datetime.now()).value)
+        except Exception as error:
+            logger.error(f"Failed to write live aggregation buckets: {error}")
+
+
+    def can_cast_to_float(self, series: pd.Series) -> bool:
+        try:
+            # Try to cast each value to float
+            series.astype(float)
+            return True
+        except ValueError:
+            return False
+
+
+    def split_df_by_float(self, df: pd.DataFrame, types: dict[str, str] | None = None):
+        float_columns = []
+        string_columns = []
+        types = types or {}
+
+        # Iterate over each column, only ids missing from the type registry need a trial cast
+        for col in df.columns:
+            if col in types:
+                if types[col] == NUMERIC:
+                    float_columns.append(col)
+                else:
+                    string_columns.append(col)
+            elif self.can_cast_to_float(df[col]):
+                float_columns.append(col)
+            else:
+                string_columns.append(col)
+
+        # Create DataFrames with selected columns
+        float_df = df[float_columns].astype("float64")
+        string_df = df[string_columns]
+
+        return float_df, string_df
+
+
+    # Deprecated
+    def process_data_pandas(self, df: pd.DataFrame) -> pd.DataFrame:
+        logger.info("Starting to process data")
+        start = time.perf_counter()
+        
+        df["time"] = pd.to_datetime(df["time"])
+        df = df.pivot(index = "time", columns = ["id"], values = "value")
+
+        float_df, string_df = self.split_df_by_float(df)
+        float_df = float_df.interpolate(method = "time", limit = self.nan_limit)
+        float_df = float_df.resample(rule = f"{self.resample_time_seconds}s").mean()
+        string_df = string_df.resample(rule = f"{self.resample_time_seconds}s").last()
+        result = pd.concat([float_df, string_df], axis = 1)
+        result = result.dropna(axis = 0, how = "all")
+
+        stop = time.perf_counter()
+        performance_time = stop - start
+        self.client_df_performance_time.set(performance_time)
+        logger.info(f"Pandas performance time: {performance_time:.2f} s")
+        return result
+
+
+# ---------------- Using generators for memory efficient parsing of csv data--------------------------------
+    def get_unique_ids(self, filename: str) -> list[str]:
+        if filename.endswith(PARQUET_EXTENSION):
+            # Only the dictionary encoded id column is read
+            id_list = []
+            for batch in iter_raw_batches(filename, columns = ["id"]):
+                id_list.extend(batch.column("id").dictionary_decode().unique().to_pylist())
+            return list(dict.fromkeys(id_list))
+
+        id_list = {}
+        lines = iter_lines(filename)
+        next(lines, None)
+        for row in lines:
+            row_id = row.split(",")[2]
+            if row_id not in id_list:
+                id_list[row_id] = None
+        return list(id_list)
+
+
+    def yield_row_from_csv(self, filename: str):
+        return iter_csv_rows(filename)
+
+
+    def yield_row_from_parquet(self, filename: str):
+        return iter_parquet_rows(filename)
+
+
+    def manage_csv_buffer(self, backup_filename: str, processed_filename: str) -> bool:
+        """Processes a raw file into its processed file, False if there was nothing to process or it failed."""
+        if not self.raw_file_exists(backup_filename):
+            logger.info(f"{backup_filename} file not found. No data to process.")
+            return False
+
+        job = EodJob(
+            backup_filename,
+            processed_filename,
+            self.resample_time_seconds,
+            chunk_rows = self.eod_chunk_rows,
+            workers = self.eod_workers,
+            nan_limit = self.interpolation_limit,
+            rollup_seconds = self.rollup_seconds,
+            aggregations = self.aggregations
+        )
+        logger.info("Starting to process data.")
+        start = time.perf_counter()
+        success = True
+        if self.eod_runner is None:
+            process_day(job)
+        elif not self.eod_runner.run(job):
+            logger.error(f"End of day of {backup_filename} gave up after {self.eod_runner.retries + 1} attempts, the raw file is kept")
+            success = False
+        stop = time.perf_counter()
+        performance_time = stop - start
+        self.client_df_performance_time.set(performance_time)
+        logger.info(f"Pandas performance time: {performance_time:.2f} s")
+        return success
+
+
+    def write_processed_chunk(
+            self,
+            df: pd.DataFrame,
+            id_list: dict | list,
+            processed_filename: str,
+            written_columns: int | None,
+            resample_seconds: int | float | None = None,
+        ) -> int | None:
+        """Writes resampled rows with every known id as a column, in catalog order, and returns the header width."""
+        date_format = bucket_date_format(self.resample_time_seconds if resample_seconds is None else resample_seconds)
+        return write_processed_frame(df, id_list, processed_filename, written_columns, date_format)
+
+
+    def widen_processed_file(self, processed_filename: str, id_list: list[str]) -> None:
+        widen_processed_file(processed_filename, id_list)
+
+
+    def process_data(self, data: list, types: dict[str, str] | None = None) -> pd.DataFrame:
+        df = pd.DataFrame(data)
+        df["time"] = parse_time_column(df["time"])
+        df.set_index("time", inplace = True)
+        rounding_num_decimals = 10
+        aggregated = [column for column in df.columns if id_aggregations(column, self.aggregations or {}) is not None]
+
+        float_df, string_df = self.split_df_by_float(df.drop(columns = aggregated), types)
+        float_df = float_df.resample(rule = f"{self.resample_time_seconds}s").mean()
+        float_df = float_df.round(rounding_num_decimals)
+        if self.interpolation_limit is not None:
+            float_df = GapInterpolator(self.resample_time_seconds, self.interpolation_limit, rounding_num_decimals).finish(float_df)
+        string_df = string_df.resample(rule = f"{self.resample_time_seconds}s").last()
+        frames = [float_df, string_df]
+        if aggregated:
+            frames.append(self.aggregate_data(df[aggregated], types))
+        result = pd.concat(frames, axis = 1)
+        result = result.dropna(axis = 0, how = "all")
+        return result
+
+
+    def aggregate_data(self, df: pd.DataFrame, types: dict[str, str] | None = None) -> pd.DataFrame:
+        """Resamples the columns of ids with aggregations, every aggregate from one group-by of their rows."""
+        float_df, string_df = self.split_df_by_float(df, types)
+        time_ns = np.asarray(df.index, dtype = "datetime64[ns]").view(np.int64)
+        resampler = StreamingResampler(self.resample_time_seconds, origin_ns = bucket_origin_ns(time_ns), aggregations = self.aggregations)
+        for part in (float_df, string_df):
+            rows = part.melt(ignore_index = False, var_name = "id").dropna(subset = ["value"])
+            values = rows["value"].to_numpy(dtype = np.float64 if part is float_df else object)
+            resampler.accumulate_ns(np.asarray(rows.index, dtype = "datetime64[ns]").view(np.int64), rows["id"].to_numpy(dtype = object), values)
+        return resampler.finish()
+
+
+#--------------Functions for updating csv with topics when buffer fills up-----------------------------------
+    def request_flush(self) -> None:
+        with self.flush_condition:
+            self.flush_requested = True
+            self.flush_condition.notify()
+
+
+    def manage_buffer_thread(self) -> None:
+        # Woken by the ingest side as soon as max_buffer is crossed, the timed wait enforces max_buffer_time
+        deadline = time.monotonic() + self.buffer_time_interval
+        while self.continue_flag:
+            with self.flush_condition:
+                self.flush_condition.wait_for(
+                    lambda: self.flush_requested or not self.continue_flag,
+                    timeout = max(0, deadline - time.monotonic())
+                )
+                self.flush_requested = False
+
+            buffer_time_exceeded = time.monotonic() >= deadline
+            spilled = (self.spill is not None) and self.spill.not_empty()
+            if (self.buffer.size() > self.max_buffer) or (buffer_time_exceeded and self.buffer.not_empty()) or spilled:
+                self.client_buffer_length.set(self.buffer.size())
+                self.dump_buffer_to_csv()
+                deadline = time.monotonic() + self.buffer_time_interval
+            elif buffer_time_exceeded:
+                deadline = time.monotonic() + self.buffer_time_interval
+            if self.live_aggregator is not None:
+                self.emit_live_buckets()
+
+    
+    def dump_buffer_to_csv(self) -> None:
+        try:
+            os.makedirs(self.output_directory, exist_ok=True)
+        except Exception as error:
+            logger.error(f"{error}")
+        filename = self.raw_filename(self.start_time.year, self.start_time.month, self.start_time.day)
+        if self.buffer.not_empty():
+            if self.raw_writer is not None:
+                # The spare buffer is only free again once the writer is done with the previous dump
+                self.raw_writer.wait_idle()
+            (batch, segments) = self.dump_buffer()
+            self.submit_raw_batch(batch, filename, partial(self.release_wal_segments, segments))
+        if self.spill is not None:
+            self.drain_spill(filename)
+
+
+    def submit_raw_batch(self, batch, filename: str, on_written: Callable[[], None]) -> None:
+        if self.raw_writer is None:
+            self.write_raw_batch(batch, filename)
+            on_written()
+            return
+        # Segments of a batch that failed to write are kept and replayed on the next start
+        self.raw_writer.submit(batch, filename, on_written = on_written)
+        self.client_write_latency.set(self.raw_writer.last_write_latency)
+        self.client_bytes_written.set(self.raw_writer.bytes_written)
+        self.client_writer_backpressure.set(self.raw_writer.backpressure_waits)
+
+
+    def drain_spill(self, filename: str) -> None:
+        """Writes the spilled segments, after the buffer dump holding the rows received before them."""
+        # Only the segments there are now, rows spilled while draining wait for the next flush
+        for _ in range(self.spill.segment_count()):
+            segment = self.spill.pop()
+            if segment is None:
+                return
+            batch = self.rows_to_batch(read_segment(segment.filename))
+            self.submit_raw_batch(batch, filename, partial(self.spill.release, segment))
+
+
+    def dump_buffer(self) -> tuple[object, list[str]]:
+        """Dumps the buffer along with the write-ahead log segments holding its rows."""
+        if self.wal is None:
+            return (self.buffer.dump(), [])
+        with self.wal_lock:
+            return (self.buffer.dump(), self.wal.rotate())
+
+
+    def release_wal_segments(self, segments: list[str]) -> None:
+        if segments:
+            self.wal.release(segments)
+
+
+    def replay_segments(self, segments: list[str]) -> int:
+        """Writes rows a previous run logged or spilled but never flushed into the raw file of their day."""
+        if not segments:
+            return 0
+        days: dict[date, list] = {}
+        for filename in segments:
+            for row in read_segment(filename):
+                days.setdefault(datetime.fromtimestamp(row[0] // 1_000 / 1e6).date(), []).append(row)
+        rows_replayed = 0
+        try:
+            os.makedirs(self.output_directory, exist_ok = True)
+            for (day, rows) in sorted(days.items()):
+                self.write_raw_batch(self.rows_to_batch(rows), self.raw_filename(day.year, day.month, day.day))
+                rows_replayed += len(rows)
+        except Exception as error:
+            # The segments are kept for the next start, rows already replayed will be written twice then
+            logger.error(f"Failed to replay {segments}: {error}")
+            return 0
+        remove_segments(segments)
+        logger.warning(f"Replayed {rows_replayed} rows a previous run left in {segments}.")
+        return rows_replayed
+
+
+    def processed_output_filename(self, year: int, month: int, day: int) -> str:
+        return processed_day_filename(self.processed_directory, self.processed_filename, date(year, month, day))
+
+
+    def raw_file_exists(self, filename: str) -> bool:
+        if filename.endswith(PARQUET_EXTENSION):
+            return bool(raw_parquet_files(filename))
+        return os.path.exists(filename)
+
+
+    def raw_file_size(self, filename: str) -> int:
+        """Bytes on disk of a day's raw file, every part of it for parquet."""
+        if filename.endswith(PARQUET_EXTENSION):
+            return sum(os.path.getsize(part) for part in raw_parquet_files(filename))
+        return os.path.getsize(filename) if os.path.exists(filename) else 0
+
+
+    def raw_filename(self, year: int, month: int, day: int) -> str:
+        if self.raw_format == "parquet":
+            extension = PARQUET_EXTENSION
+        else:
+            extension = ".csv" + COMPRESSION_EXTENSIONS[self.raw_compression]
+        return f"{self.output_directory}/{year}{month:02d}{day:02d}-{self.output_filename}{extension}"
+
+
+    def batch_ids(self, batch) -> list[str]:
+        if self.columnar_buffer:
+            return [batch.ids[code] for code in pd.unique(batch.id_codes)]
+        return [row["id"] for row in batch]
+
+
+    def write_raw_batch(self, batch, filename: str) -> None:
+        ids = self.batch_ids(batch)
+        # The catalog is written ahead of the rows so it never misses an id in the raw file
+        self.id_catalog.update(filename, ids)
+        self.type_registry.update(filename, self.batch_value_types(batch))
+        start = os.path.getsize(filename) if self.raw_index and os.path.exists(filename) else 0
+        self.write_raw_file(batch, filename)
+        if self.raw_index and len(batch):
+            self.index_raw_block(batch, filename, start, ids)
+        if self.live_aggregator is not None:
+            self.feed_live_aggregator(batch, filename)
+
+
+    def batch_value_types(self, batch) -> dict[str, str]:
+        """Value type of every id of a batch, as it reads back from the raw file."""
+        if not self.columnar_buffer:
+            return batch_types((row["id"] for row in batch), (value_type(row["value"]) for row in batch))
+        # Only the rows held as objects can be anything but a float
+        numeric = np.ones(len(batch), dtype = bool)
+        numeric[np.fromiter(batch.objects, dtype = np.int64, count = len(batch.objects))] = False
+        observed = {batch.ids[code]: NUMERIC for code in pd.unique(batch.id_codes[numeric])}
+        object_types = batch_types(
+            (batch.ids[batch.id_codes[row]] for row in batch.objects),
+            (value_type(value) for value in batch.objects.values())
+        )
+        for (field_id, object_type) in object_types.items():
+            observed[field_id] = merge_type(observed.get(field_id), object_type)
+        return observed
+
+
+    def batch_local_bounds(self, batch) -> tuple[int, int]:
+        """Oldest and newest naive local time of a batch, in nanoseconds, as written to the raw file."""
+        if self.columnar_buffer:
+            return epoch_local_bounds(batch.time_ns)
+        times = [row["time"] for row in batch]
+        if self.epoch_timestamps:
+            return epoch_local_bounds(np.array(times, dtype = np.int64))
+        time_ns = np.array(times, dtype = "datetime64[ns]").view(np.int64)
+        return (int(time_ns.min()), int(time_ns.max()))
+
+
+    def index_raw_block(self, batch, filename: str, start: int, ids: list[str]) -> None:
+        try:
+            end = os.path.getsize(filename)
+            (first_ns, last_ns) = self.batch_local_bounds(batch)
+        except (OSError, ValueError) as error:
+            logger.error(f"Failed to index the flush written to {filename}: {error}")
+            return
+        append_block(filename, IndexedBlock(start, end, first_ns, last_ns, self.id_catalog.positions(filename, ids)))
+
+
+    def extract(
+            self,
+            start: str | datetime | pd.Timestamp,
+            end: str | datetime | pd.Timestamp,
+            ids: list[str] | None = None,
+            resample: bool = False,
+        ) -> pd.DataFrame:
+        """
+        Raw rows of `ids` between `start` (included) and `end` (excluded), in local time.
+
+        Only the flushes the block index places in the range are read. With
+        `resample` the rows are averaged over resample_time like end of day,
+        ids with aggregations get theirs.
+        """
+        raw_filenames = raw_day_filenames(self.output_directory, self.output_filename, start, end)
+        return extract(
+            raw_filenames,
+            start,
+            end,
+            ids = ids,
+            resample_seconds = self.resample_time_seconds if resample else None,
+            chunk_rows = self.eod_chunk_rows,
+            aggregations = self.aggregations
+        )
+
+
+    def write_raw_file(self, batch, filename: str) -> None:
+        if self.parquet_writer is not None:
+            if len(batch) == 0:
+                return
+            table = batch_to_table(batch) if self.columnar_buffer else rows_to_table(batch)
+            self.parquet_writer.write(filename, table)
+            return
+
+        if self.stream_writer is not None:
+            if len(batch) == 0:
+                return
+            if self.columnar_buffer:
+                (header, columns) = batch.to_csv_columns(time_ns_column = self.raw_time_ns_column)
+            else:
+                (header, columns) = rows_to_csv_columns(batch, time_ns_column = self.raw_time_ns_column)
+            self.stream_writer.write(filename, header, columns)
+            return
+
+        df = self.batch_to_frame(batch)
+        self.write_to_file(
+            df,
+            filename,
+            append = True,
+            compression = pandas_compression(self.raw_compression, self.compression_level)
+        )
+
+
+    def batch_to_frame(self, batch) -> pd.DataFrame:
+        if self.columnar_buffer:
+            return batch.to_frame(time_ns_column = self.raw_time_ns_column)
+
+        df = pd.DataFrame(batch)
+        if self.epoch_timestamps and not df.empty:
+            # Timestamps are formatted once for the whole dump instead of per message
+            time_ns = df["time"].to_numpy(dtype = "int64")
+            df["time"] = epoch_ns_to_local(time_ns)
+            if self.raw_time_ns_column:
+                df[TIME_NS_COLUMN] = time_ns
+        return df
+
+
+    def write_to_file(
+            self,
+            df: pd.DataFrame,
+            filepath: str,
+            append: bool = False,
+            index: bool = False,
+            compression: str | dict | None = "infer"
+        ) -> None:
+
+        if append:
+            # Appending to a gzip or xz file adds a new compressed member
+            df.to_csv(filepath, mode = 'a', header = not os.path.exists(filepath), index = index, compression = compression)
+        else:
+            df.to_csv(filepath)
+
+
+    def __del__(self):
         self.stop()
\ No newline at end of file
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Preallocated columnar ring buffer for incoming MQTT messages"""
+# ---------------------------------------------------------------------------
+from dataclasses import dataclass, field
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+from data_extraction.timestamps import (epoch_ns_to_local, TIME_NS_COLUMN)
+from data_extraction.csv_writer import (format_datetime_column, format_float_column, format_value_column)
+
+
+@dataclass
+class ColumnBatch():
+    """Rows dumped from a ColumnarBuffer, stored column by column."""
+    time_ns: np.ndarray
+    topic_codes: np.ndarray
+    id_codes: np.ndarray
+    values: np.ndarray
+    topics: list[str]
+    ids: list[str]
+    objects: dict[int, object] = field(default_factory = dict)
+
+    def __len__(self) -> int:
+        return len(self.time_ns)
+
+
+    def topic_column(self) -> pd.Categorical:
+        return pd.Categorical.from_codes(self.topic_codes, categories = self.topics[:])
+
+
+    def id_column(self) -> pd.Categorical:
+        return pd.Categorical.from_codes(self.id_codes, categories = self.ids[:])
+
+
+    def value_column(self) -> np.ndarray:
+        if not self.objects:
+            return self.values
+        value_column = self.values.astype(object)
+        for (row, value) in self.objects.items():
+            value_column[row] = value
+        return value_column
+
+
+    def time_column(self) -> pd.DatetimeIndex:
+        return epoch_ns_to_local(self.time_ns)
+
+
+    def to_frame(self, time_ns_column: bool = False) -> pd.DataFrame:
+        columns = {
+            "time": self.time_column(),
+            "topic": self.topic_column(),
+            "id": self.id_column(),
+            "value": self.value_column(),
+        }
+        if time_ns_column:
+            columns[TIME_NS_COLUMN] = self.time_ns
+        return pd.DataFrame(columns)
+
+
+    def to_csv_columns(self, time_ns_column: bool = False) -> tuple[list[str], list]:
+        """Header and formatted columns for StreamingCsvWriter, matching to_frame().to_csv()."""
+        if self.objects:
+            value_column = format_value_column(self.value_column().tolist())
+        else:
+            value_column = format_float_column(self.values)
+        header = ["time", "topic", "id", "value"]
+        columns = [
+            format_datetime_column(self.time_column().to_numpy()),
+            np.asarray(self.topics, dtype = object)[self.topic_codes],
+            np.asarray(self.ids, dtype = object)[self.id_codes],
+            value_column,
+        ]
+        if time_ns_column:
+            header.append(TIME_NS_COLUMN)
+            columns.append(self.time_ns.astype(str))
+        return (header, columns)
+
+
+class ColumnarBuffer():
+    """
+    Fixed size ring buffer holding messages in preallocated NumPy columns.
+
+    Timestamps are int64 epoch nanoseconds and numeric values are float64.
+    Topics and ids are interned into integer codes and any value that is not
+    a float (strings, booleans) is kept in a side store keyed on its slot.
+    Once full, the oldest rows are overwritten and counted in `overwritten`.
+
+    The columns are double buffered: dump() hands out views of the filled
+    columns and swaps in the spare set, so a batch stays valid until the
+    following dump() while new messages are appended to the other set.
+    """
+
+    def __init__(self, capacity: int = 10_000):
+        if not isinstance(capacity, int) or capacity < 1:
+            raise ValueError("capacity needs to be a positive integer.")
+        self.capacity = capacity
+        (self._time_ns, self._topic_codes, self._id_codes, self._values) = self._allocate()
+        self._spare_columns = self._allocate()
+        self._objects: dict[int, object] = {}
+        self._head = 0
+        self._length = 0
+        self._lock = Lock()
+
+        self.topics: list[str] = []
+        self.ids: list[str] = []
+        self._topic_codes_lookup: dict[str, int] = {}
+        self._id_codes_lookup: dict[str, int] = {}
+        self.overwritten = 0
+
+
+    def _allocate(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return (
+            np.zeros(self.capacity, dtype = np.int64),
+            np.zeros(self.capacity, dtype = np.int32),
+            np.zeros(self.capacity, dtype = np.int32),
+            np.full(self.capacity, np.nan, dtype = np.float64),
+        )
+
+
+    @property
+    def maxlen(self) -> int:
+        return self.capacity
+
+
+    def __len__(self) -> int:
+        return self._length
+
+
+    def size(self) -> int:
+        return self._length
+
+
+    def empty(self) -> bool:
+        return self._length == 0
+
+
+    def not_empty(self) -> bool:
+        return self._length != 0
+
+
+    def _intern(self, label: str, lookup: dict[str, int], labels: list[str]) -> int:
+        code = lookup.get(label)
+        if code is None:
+            code = len(labels)
+            labels.append(label)
+            lookup[label] = code
+        return code
+
+
+    def append(self, time_ns: int, topic: str, field_id: str, value) -> None:
+        with self._lock:
+            self._append(time_ns, topic, field_id, value)
+
+
+    def extend(self, rows: list[tuple[int, str, str, object]]) -> None:
+        """Appends (time_ns, topic, id, value) rows under a single lock acquisition."""
+        with self._lock:
+            for (time_ns, topic, field_id, value) in rows:
+                self._append(time_ns, topic, field_id, value)
+
+
+    def _append(self, time_ns: int, topic: str, field_id: str, value) -> None:
+        slot = self._head
+        self._time_ns[slot] = time_ns
+        self._topic_codes[slot] = self._intern(topic, self._topic_codes_lookup, self.topics)
+        self._id_codes[slot] = self._intern(field_id, self._id_codes_lookup, self.ids)
+        if type(value) is float:
+            self._values[slot] = value
+            if self._objects:
+                self._objects.pop(slot, None)
+        else:
+            self._values[slot] = np.nan
+            self._objects[slot] = value
+
+        self._head = (slot + 1) % self.capacity
+        if self._length == self.capacity:
+            self.overwritten += 1
+        else:
+            self._length += 1
+
+
+    def _ordered_slots(self) -> tuple[int, int]:
+        start = (self._head - self._length) % self.capacity
+        return (start, self._length)
+
+
+    def _take(self, column: np.ndarray, start: int, length: int) -> np.ndarray:
+        stop = start + length
+        if stop <= self.capacity:
+            return column[start:stop]
+        # Only a buffer that wrapped around needs a copy to put the rows back in order
+        return np.concatenate((column[start:], column[:stop - self.capacity]))
+
+
+    def dump(self) -> ColumnBatch:
+        with self._lock:
+            (start, length) = self._ordered_slots()
+            batch = ColumnBatch(
+                time_ns = self._take(self._time_ns, start, length),
+                topic_codes = self._take(self._topic_codes, start, length),
+                id_codes = self._take(self._id_codes, start, length),
+                values = self._take(self._values, start, length),
+                topics = self.topics,
+                ids = self.ids,
+                objects = {
+                    (slot - start) % self.capacity: value for (slot, value) in self._objects.items()
+                },
+            )
+            filled_columns = (self._time_ns, self._topic_codes, self._id_codes, self._values)
+            (self._time_ns, self._topic_codes, self._id_codes, self._values) = self._spare_columns
+            self._spare_columns = filled_columns
+            self._objects = {}
+            self._head = 0
+            self._length = 0
+        return batch
+
+
+    def __getitem__(self, index: int) -> dict:
+        if not -self._length <= index < self._length:
+            raise IndexError("buffer index out of range")
+        (start, length) = self._ordered_slots()
+        slot = (start + (index % length)) % self.capacity
+        value = self._objects.get(slot, self._values[slot])
+        return {
+            "time": datetime.fromtimestamp(self._time_ns[slot] / 1e9),
+            "topic": self.topics[self._topic_codes[slot]],
+            "id": self.ids[self._id_codes[slot]],
+            "value": float(value) if isinstance(value, np.floating) else value,
+        }
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Streaming gzip and xz compression of the raw csv files"""
+# ---------------------------------------------------------------------------
+import gzip
+import logging
+import lzma
+import zlib
+
+logger = logging.getLogger("data_extraction")
+
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_XZ = "xz"
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_GZIP, COMPRESSION_XZ)
+
+COMPRESSION_EXTENSIONS = {
+    COMPRESSION_NONE: "",
+    COMPRESSION_GZIP: ".gz",
+    COMPRESSION_XZ: ".xz",
+}
+DEFAULT_COMPRESSION_LEVELS = {
+    COMPRESSION_GZIP: 6,
+    COMPRESSION_XZ: 6,
+}
+TRUNCATION_ERRORS = (EOFError, gzip.BadGzipFile, lzma.LZMAError, zlib.error)
+
+
+def compression_from_filename(filename: str) -> str:
+    for (compression, extension) in COMPRESSION_EXTENSIONS.items():
+        if extension and filename.endswith(extension):
+            return compression
+    return COMPRESSION_NONE
+
+
+def compress_member(data: bytes, compression: str, level: int | None = None) -> bytes:
+    """
+    Compresses one flush into a self contained gzip member or xz stream.
+
+    Concatenated members decompress as one file, so appending a member per
+    flush keeps everything up to the last completed flush readable if the
+    process dies in the middle of a write.
+    """
+    if compression == COMPRESSION_NONE:
+        return data
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[compression]
+    if compression == COMPRESSION_GZIP:
+        return gzip.compress(data, compresslevel = level, mtime = 0)
+    if compression == COMPRESSION_XZ:
+        return lzma.compress(data, preset = level)
+    raise ValueError(f"compression needs to be one of {COMPRESSIONS}.")
+
+
+def pandas_compression(compression: str, level: int | None = None) -> dict | None:
+    """Equivalent `compression` argument for DataFrame.to_csv."""
+    if compression == COMPRESSION_NONE:
+        return None
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[compression]
+    if compression == COMPRESSION_GZIP:
+        return {"method": "gzip", "compresslevel": level, "mtime": 0}
+    return {"method": "xz", "preset": level}
+
+
+def open_text(filename: str):
+    compression = compression_from_filename(filename)
+    if compression == COMPRESSION_GZIP:
+        return gzip.open(filename, "rt")
+    if compression == COMPRESSION_XZ:
+        return lzma.open(filename, "rt")
+    return open(filename, "r")
+
+
+def iter_lines(filename: str):
+    """
+    Yields the lines of a raw csv, decompressing on the fly.
+
+    A trailing member cut short by a crash ends the file instead of failing
+    the whole read.
+    """
+    with open_text(filename) as file:
+        try:
+            yield from file
+        except TRUNCATION_ERRORS as error:
+            logger.error(f"{filename} ends in a truncated compressed block, skipping it: {error}")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Pandas free csv writer keeping the day's raw file open between flushes"""
+# ---------------------------------------------------------------------------
+from datetime import datetime
+import csv
+import io
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+from data_extraction.timestamps import (epoch_ns_to_local, TIME_NS_COLUMN)
+from data_extraction.compression import (compress_member, COMPRESSIONS, COMPRESSION_NONE)
+
+logger = logging.getLogger("data_extraction")
+
+FSYNC_ALWAYS = "flush"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+NANOSECONDS_PER_DAY = 86_400 * 10**9
+
+
+def format_datetime_column(times: np.ndarray) -> np.ndarray:
+    """
+    Formats datetime64 values the way DataFrame.to_csv does.
+
+    Pandas picks one sub-second precision for the whole column, the finest
+    one any value needs, and writes only the date when every value is at
+    midnight.
+    """
+    time_ns = np.asarray(times, dtype = "datetime64[ns]").view(np.int64)
+    sub_second = time_ns % 10**9
+    if np.any(sub_second % 1_000):
+        unit = "ns"
+    elif np.any(sub_second % 1_000_000):
+        unit = "us"
+    elif np.any(sub_second):
+        unit = "ms"
+    elif np.any(time_ns % NANOSECONDS_PER_DAY):
+        unit = "s"
+    else:
+        unit = "D"
+    formatted = np.datetime_as_string(time_ns.view("datetime64[ns]"), unit = unit)
+    return np.char.replace(formatted, "T", " ")
+
+
+def format_float_column(values: np.ndarray) -> np.ndarray:
+    formatted = np.asarray(values, dtype = np.float64).astype(str)
+    formatted[np.isnan(values)] = ""
+    return formatted
+
+
+def format_value_column(values: list) -> list[str] | np.ndarray:
+    if all(type(value) is float for value in values):
+        return format_float_column(np.array(values, dtype = np.float64))
+    return [
+        "" if (value is None) or (type(value) is float and math.isnan(value)) else str(value)
+        for value in values
+    ]
+
+
+def rows_to_csv_columns(rows: list[dict], time_ns_column: bool = False) -> tuple[list[str], list]:
+    """Converts a list Buffer dump into the header and formatted columns of the raw csv."""
+    times = [row["time"] for row in rows]
+    if times and isinstance(times[0], datetime):
+        time_column = format_datetime_column(np.array(times, dtype = "datetime64[us]"))
+        time_ns = None
+    else:
+        time_ns = np.array(times, dtype = np.int64)
+        time_column = format_datetime_column(epoch_ns_to_local(time_ns).to_numpy())
+
+    header = ["time", "topic", "id", "value"]
+    columns = [
+        time_column,
+        [row["topic"] for row in rows],
+        [row["id"] for row in rows],
+        format_value_column([row["value"] for row in rows]),
+    ]
+    if time_ns_column and (time_ns is not None):
+        header.append(TIME_NS_COLUMN)
+        columns.append(time_ns.astype(str))
+    return (header, columns)
+
+
+class StreamingCsvWriter():
+    """
+    Appends preformatted columns to csv files through a persistent handle.
+
+    The handle of the current file stays open between flushes with a large
+    buffer and whether the header was written is cached, so a flush is a
+    single write call. Rows are serialized with the csv module using the
+    same dialect as DataFrame.to_csv. The fsync policy is one of "flush"
+    (after every write), "interval" (at most every fsync_interval seconds)
+    or "never".
+
+    With gzip or xz compression every write is one self contained
+    compressed member, so a crash mid write only loses that flush.
+    """
+
+    def __init__(
+            self,
+            buffer_size: int = 1024 * 1024,
+            fsync_policy: str = FSYNC_NEVER,
+            fsync_interval: float = 10.0,
+            lineterminator: str = os.linesep,
+            compression: str = COMPRESSION_NONE,
+            compression_level: int | None = None,
+        ):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy needs to be one of {FSYNC_POLICIES}.")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression needs to be one of {COMPRESSIONS}.")
+        self.buffer_size = buffer_size
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.lineterminator = lineterminator
+        self.compression = compression
+        self.compression_level = compression_level
+        self.filename: str | None = None
+        self._file = None
+        self._header_written: bool = False
+        self._last_fsync = time.monotonic()
+
+
+    def _open(self, filename: str) -> None:
+        self.close()
+        self._file = open(filename, "ab", buffering = self.buffer_size)
+        self._header_written = self._file.tell() > 0
+        self.filename = filename
+
+
+    def serialize(self, header: list[str], columns: list, include_header: bool) -> bytes:
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator = self.lineterminator)
+        if include_header:
+            writer.writerow(header)
+        writer.writerows(zip(*columns))
+        return text.getvalue().encode("utf-8")
+
+
+    def write(self, filename: str, header: list[str], columns: list) -> int:
+        if (self._file is None) or (filename != self.filename):
+            self._open(filename)
+
+        data = self.serialize(header, columns, include_header = not self._header_written)
+        data = compress_member(data, self.compression, self.compression_level)
+        self._file.write(data)
+        self._file.flush()
+        self._header_written = True
+
+        if self.fsync_policy == FSYNC_ALWAYS:
+            self.fsync()
+        elif (self.fsync_policy == FSYNC_INTERVAL) and (time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self.fsync()
+        return len(data)
+
+
+    def fsync(self) -> None:
+        if self._file is None:
+            return
+        try:
+            os.fsync(self._file.fileno())
+        except OSError as error:
+            logger.error(f"fsync of {self.filename} failed: {error}")
+        self._last_fsync = time.monotonic()
+
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        if self.fsync_policy != FSYNC_NEVER:
+            self.fsync()
+        self._file.close()
+        self._file = None
+        self.filename = None
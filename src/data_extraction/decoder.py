@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Single pass decoder for MQTT message payloads"""
+# ---------------------------------------------------------------------------
+from collections import OrderedDict
+import json
+import logging
+
+logger = logging.getLogger("data_extraction")
+
+# Every payload float() can parse starts with one of these bytes
+NUMERIC_LEAD_BYTES = frozenset(b"0123456789+-.iInN \t\n\r\x0b\x0c")
+# Payloads that are not numbers are only handed to json when they look like json
+JSON_LEAD_CHARACTERS = frozenset('{["tfn')
+
+NUMERIC = "numeric"
+MIXED = "mixed"
+
+
+class PayloadDecoder():
+    """
+    Turns a raw payload into a float, string or boolean value.
+
+    Works on the bytes (or memoryview) payload directly, without decoding
+    it to a string first. Payloads are tried as a number, then as one of the
+    nan/true/false literals, then as json only when the first character
+    looks like json, and otherwise kept as a string. Topics that have only
+    ever carried numbers are remembered and go straight to float(). Hints
+    are kept for the `maxsize` most recently seen topics.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize needs to be a positive integer.")
+        self.maxsize = maxsize
+        self._type_hints: OrderedDict[str, str] = OrderedDict()
+
+
+    def decode(self, topic: str, payload: bytes | memoryview | None):
+        if payload is None:
+            logger.debug(f"Null message ignored. Received None on topic '{topic}'")
+            return None
+
+        hint = self._type_hints.get(topic)
+        if hint is not None:
+            self._type_hints.move_to_end(topic)
+        if hint == NUMERIC:
+            try:
+                value = float(payload)
+            except (ValueError, TypeError):
+                self._type_hints[topic] = MIXED
+            else:
+                if value == value:
+                    return value
+                # float() accepts 'nan', which is treated as a null message
+
+        value = self._decode(topic, payload)
+        if value is None:
+            return None
+        if hint is None:
+            self._type_hints[topic] = NUMERIC if type(value) is float else MIXED
+            if len(self._type_hints) > self.maxsize:
+                self._type_hints.popitem(last = False)
+        elif (hint == NUMERIC) and (type(value) is not float):
+            self._type_hints[topic] = MIXED
+        return value
+
+
+    def _decode(self, topic: str, payload: bytes | memoryview | str):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if len(payload) == 0:
+            return ""
+
+        if payload == b"nan":
+            logger.debug(f"Null message ignored. Received 'nan' on topic '{topic}'")
+            return None
+        if payload == b"true":
+            return True
+        if payload == b"false":
+            return False
+
+        if payload[0] in NUMERIC_LEAD_BYTES:
+            try:
+                return float(payload)
+            except ValueError:
+                pass
+
+        try:
+            value = bytes(payload).decode()
+        except UnicodeDecodeError:
+            logger.error(f"Message is not valid UTF-8. Received '{payload[:32]}' on topic '{topic}'")
+            return None
+
+        if value.lstrip()[:1] not in JSON_LEAD_CHARACTERS:
+            return value
+
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return value
+
+        if not isinstance(value, (str, int, float)):
+            logger.error(
+                f"Message is not a valid type. Received '{type(value)}' on topic '{topic}'"
+            )
+            return None
+        return value
+
+
+    def type_hint(self, topic: str) -> str | None:
+        return self._type_hints.get(topic)
+
+
+    def clear_type_hints(self) -> None:
+        self._type_hints.clear()
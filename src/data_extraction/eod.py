@@ -0,0 +1,933 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Long form resampling of raw rows for end of day processing"""
+# ---------------------------------------------------------------------------
+from dataclasses import (dataclass, field, replace)
+from fnmatch import fnmatchcase
+from threading import Lock
+from typing import (Callable, Iterable)
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_extraction.timestamps import (parse_time_column, TIME_NS_COLUMN)
+
+logger = logging.getLogger("data_extraction")
+
+NANOSECONDS_PER_SECOND = 10**9
+NANOSECONDS_PER_DAY = 86_400 * NANOSECONDS_PER_SECOND
+ROUNDING_NUM_DECIMALS = 10
+# Keys pack (bucket, id code) into one int64, a day of millisecond buckets still fits
+ID_KEY_STRIDE = 1 << 24
+# Per id aggregates, min, max, mean, std and sum over the numeric values and the rest over every value
+AGGREGATIONS = ("min", "max", "mean", "last", "first", "count", "std", "sum")
+
+
+def resample_ns(resample_seconds: int | float) -> int:
+    return round(resample_seconds * NANOSECONDS_PER_SECOND)
+
+
+def bucket_date_format(resample_seconds: int | float) -> str | None:
+    """
+    Timestamp format of whole second buckets in the processed file.
+
+    Left to pandas, a frame holding only a midnight bucket is written as a
+    bare date, so the output would depend on how rows were split into frames.
+    """
+    return "%Y-%m-%d %H:%M:%S" if resample_ns(resample_seconds) % NANOSECONDS_PER_SECOND == 0 else None
+
+
+def rollup_filename(processed_filename: str, resample_seconds: int | float) -> str:
+    """20240502-processed.csv -> 20240502-processed-10s.csv, the processed file of a coarser resolution."""
+    (stem, extension) = os.path.splitext(processed_filename)
+    return f"{stem}-{resample_seconds:g}s{extension}"
+
+
+def times_to_ns(times: list) -> np.ndarray:
+    """Naive local nanoseconds of raw time values, datetime strings, epoch nanoseconds or Timestamps."""
+    parsed = parse_time_column(pd.Series(times))
+    return np.asarray(parsed, dtype = "datetime64[ns]").view(np.int64)
+
+
+def bucket_origin_ns(time_ns: np.ndarray) -> int:
+    """Midnight of the first timestamp, the "start_day" origin DataFrame.resample uses."""
+    first_ns = int(time_ns.min())
+    return first_ns - (first_ns % NANOSECONDS_PER_DAY)
+
+
+def bucket_index(time_ns: np.ndarray, step_ns: int, origin_ns: int) -> np.ndarray:
+    """Resample bucket of every timestamp, counted in whole steps from the origin."""
+    return (time_ns - origin_ns) // step_ns
+
+
+def group_keys(buckets: np.ndarray, id_codes: np.ndarray, stride: int = ID_KEY_STRIDE) -> np.ndarray:
+    """Single int64 key per (bucket, id), sorting the keys sorts by bucket first."""
+    return buckets * stride + id_codes
+
+
+def sum_count(keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sums and counts of the non NaN values per key, mean() ignores NaN the same way."""
+    return float_stats(keys, values)[:3]
+
+
+def float_stats(
+        keys: np.ndarray,
+        values: np.ndarray,
+        stats: Iterable[str] = (),
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """
+    sum_count() plus the per key "min", "max" and "m2" in `stats`.
+
+    "m2" is the sum of squared deviations from the key's mean, which std()
+    is built from and which merges exactly. Every aggregate comes out of the
+    same np.unique of the keys.
+    """
+    valid = ~np.isnan(values)
+    values = values[valid]
+    (unique_keys, inverse) = np.unique(keys[valid], return_inverse = True)
+    sums = np.bincount(inverse, weights = values, minlength = len(unique_keys))
+    counts = np.bincount(inverse, minlength = len(unique_keys))
+    extra = {}
+    if "min" in stats:
+        extra["min"] = np.full(len(unique_keys), np.inf)
+        np.minimum.at(extra["min"], inverse, values)
+    if "max" in stats:
+        extra["max"] = np.full(len(unique_keys), -np.inf)
+        np.maximum.at(extra["max"], inverse, values)
+    if "m2" in stats:
+        deviations = values - (sums / counts)[inverse]
+        extra["m2"] = np.bincount(inverse, weights = deviations * deviations, minlength = len(unique_keys))
+    return (unique_keys, sums, counts, extra)
+
+
+def non_null(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind == "f":
+        return ~np.isnan(values)
+    return np.array([(value is not None) and not (type(value) is float and value != value) for value in values], dtype = bool)
+
+
+def last_value(keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Last non null value per key, in row order, like last()."""
+    return value_stats(keys, values)[:2]
+
+
+def value_stats(
+        keys: np.ndarray,
+        values: np.ndarray,
+        stats: Iterable[str] = (),
+    ) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """last_value() plus the per key "first" non null value and "count" of them in `stats`."""
+    valid = non_null(values)
+    keys = keys[valid]
+    values = values[valid]
+    # np.unique keeps the first occurrence, so search the reversed rows
+    (unique_keys, reversed_index, counts) = np.unique(keys[::-1], return_index = True, return_counts = True)
+    extra = {}
+    if "first" in stats:
+        extra["first"] = values[np.unique(keys, return_index = True)[1]]
+    if "count" in stats:
+        extra["count"] = counts
+    return (unique_keys, values[len(keys) - 1 - reversed_index], extra)
+
+
+def id_aggregations(field_id: str, aggregations: dict[str, list[str]]) -> list[str] | None:
+    """Aggregates of the first glob pattern in `aggregations` matching `field_id`, None for the plain mean or last."""
+    for (pattern, functions) in aggregations.items():
+        if fnmatchcase(field_id, pattern):
+            return functions
+    return None
+
+
+def aggregate_columns(ids: Iterable[str], aggregations: dict[str, list[str]] | None) -> list[str]:
+    """Processed file columns of `ids`, an id with aggregates gets an "<id>_<aggregate>" column for each."""
+    columns = []
+    for field_id in ids:
+        functions = id_aggregations(field_id, aggregations) if aggregations else None
+        if functions is None:
+            columns.append(field_id)
+        else:
+            columns.extend(f"{field_id}_{function}" for function in functions)
+    return columns
+
+
+def to_wide(
+        float_keys: np.ndarray,
+        means: np.ndarray,
+        string_keys: np.ndarray,
+        last_values: np.ndarray,
+        ids: list[str],
+        string_ids: np.ndarray,
+        origin_ns: int,
+        step_ns: int,
+        columns: np.ndarray | None = None,
+    ) -> pd.DataFrame:
+    """
+    Materializes (bucket, id) aggregates as one row per bucket.
+
+    Float ids come first and string ids after them, as in
+    process_data. Buckets without a single value produce no row. Only the
+    ids set in `columns` get a column, all of them by default.
+    """
+    id_count = len(ids)
+    buckets = np.unique(np.concatenate((float_keys // ID_KEY_STRIDE, string_keys // ID_KEY_STRIDE)))
+    if columns is None:
+        columns = np.ones(id_count, dtype = bool)
+    float_columns = np.flatnonzero(~string_ids & columns)
+    string_columns = np.flatnonzero(string_ids & columns)
+
+    float_position = np.full(id_count, -1)
+    float_position[float_columns] = np.arange(len(float_columns))
+    float_data = np.full((len(buckets), len(float_columns)), np.nan)
+    float_data[np.searchsorted(buckets, float_keys // ID_KEY_STRIDE), float_position[float_keys % ID_KEY_STRIDE]] = means
+
+    string_position = np.full(id_count, -1)
+    string_position[string_columns] = np.arange(len(string_columns))
+    string_data = np.full((len(buckets), len(string_columns)), None, dtype = object)
+    string_data[np.searchsorted(buckets, string_keys // ID_KEY_STRIDE), string_position[string_keys % ID_KEY_STRIDE]] = last_values
+
+    index = pd.DatetimeIndex((origin_ns + buckets * step_ns).view("datetime64[ns]"), name = "time")
+    float_df = pd.DataFrame(float_data, index = index, columns = [ids[code] for code in float_columns])
+    string_df = pd.DataFrame(string_data, index = index, columns = [ids[code] for code in string_columns])
+    return pd.concat([float_df, string_df], axis = 1)
+
+
+def raw_time_index(header: list[str]) -> int | None:
+    """Column of the raw epoch timestamps, which skip the datetime string parsing when available."""
+    return header.index(TIME_NS_COLUMN) if TIME_NS_COLUMN in header else None
+
+
+def parse_raw_line(line: str, time_index: int | None) -> tuple:
+    """(time, id, value) of one raw csv line, numbers as floats and anything else as a stripped string."""
+    row = line.split(",")
+    row_time = row[0] if time_index is None else int(row[time_index])
+    try:
+        row_value = float(row[3])
+    except ValueError:
+        row_value = row[3].rstrip()
+    return (row_time, row[2], row_value)
+
+
+def empty_frame() -> pd.DataFrame:
+    return pd.DataFrame(index = pd.DatetimeIndex([], name = "time"))
+
+
+def merge_sums(
+        keys: np.ndarray,
+        sums: np.ndarray,
+        counts: np.ndarray,
+        new_keys: np.ndarray,
+        new_sums: np.ndarray,
+        new_counts: np.ndarray,
+        stats: dict[str, np.ndarray] | None = None,
+        new_stats: dict[str, np.ndarray] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """Folds new float aggregates in, `stats` and `new_stats` are the float_stats() extras of the same keys."""
+    (all_sums, all_counts) = (np.concatenate((sums, new_sums)), np.concatenate((counts, new_counts)))
+    (merged_keys, inverse) = np.unique(np.concatenate((keys, new_keys)), return_inverse = True)
+    merged_sums = np.bincount(inverse, weights = all_sums, minlength = len(merged_keys))
+    merged_counts = np.bincount(inverse, weights = all_counts, minlength = len(merged_keys)).astype(np.int64)
+    merged = {}
+    for (name, values) in (stats or {}).items():
+        all_values = np.concatenate((values, new_stats[name]))
+        if name == "m2":
+            # Every part's mean is off the merged mean, which adds to its squared deviations
+            deviations = all_sums / all_counts - (merged_sums / merged_counts)[inverse]
+            merged[name] = np.bincount(inverse, weights = all_values + all_counts * deviations * deviations, minlength = len(merged_keys))
+        else:
+            merged[name] = np.full(len(merged_keys), np.inf if name == "min" else -np.inf)
+            (np.minimum if name == "min" else np.maximum).at(merged[name], inverse, all_values)
+    return (merged_keys, merged_sums, merged_counts, merged)
+
+
+def merge_last(
+        keys: np.ndarray,
+        values: np.ndarray,
+        new_keys: np.ndarray,
+        new_values: np.ndarray,
+        stats: dict[str, np.ndarray] | None = None,
+        new_stats: dict[str, np.ndarray] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """Folds new last values in, `stats` and `new_stats` are the value_stats() extras of the same keys."""
+    # Values of the newer rows come last, so they win
+    all_keys = np.concatenate((keys, new_keys))
+    all_values = np.concatenate((values, new_values))
+    (merged_keys, reversed_index, reversed_inverse) = np.unique(all_keys[::-1], return_index = True, return_inverse = True)
+    merged = {}
+    for (name, stat_values) in (stats or {}).items():
+        all_stat_values = np.concatenate((stat_values, new_stats[name]))
+        if name == "count":
+            merged[name] = np.bincount(reversed_inverse, weights = all_stat_values[::-1], minlength = len(merged_keys)).astype(np.int64)
+        else:
+            # First values of the older rows win
+            merged[name] = all_stat_values[np.unique(all_keys, return_index = True)[1]]
+    return (merged_keys, all_values[len(all_keys) - 1 - reversed_index], merged)
+
+
+@dataclass
+class PartialAggregates():
+    """Open (bucket, id) aggregates handed from one resampler to another, keyed on the codes of `ids`."""
+    origin_ns: int
+    ids: list[str]
+    string_ids: np.ndarray
+    sum_keys: np.ndarray
+    sums: np.ndarray
+    counts: np.ndarray
+    last_keys: np.ndarray
+    lasts: np.ndarray
+    # Extra aggregates of the sum and last keys, only those an aggregation spec needs
+    float_stats: dict[str, np.ndarray] = field(default_factory = dict)
+    value_stats: dict[str, np.ndarray] = field(default_factory = dict)
+
+
+class StreamingResampler():
+    """
+    Incremental resampler carrying open buckets across chunks.
+
+    Every (bucket, id) keeps the sum and count of its float values and its
+    last non null value. A bucket is emitted once a row from a later bucket
+    has been seen, so only the newest bucket stays open and the state is
+    bounded by the number of ids, not by the chunk size. Buckets are counted
+    from midnight of the first timestamp, like resampling the whole day in
+    one DataFrame.
+
+    An id is resampled with last() as soon as one of its values is not a
+    float, same as split_df_by_float, or from the start when it is one of
+    `string_ids`, the ids a type registry recorded string values for.
+    Buckets of an id emitted as means before its first string value showed
+    up stay means, those ids are counted in `retyped_ids`. Rows older than an emitted bucket are counted
+    in `late_rows` and emitted again as a separate row rather than dropped.
+
+    Resamplers given the same `origin_ns` can aggregate parts of one day
+    separately. take_partial() hands over buckets that are not complete yet
+    and merge_partial() folds them into another resampler.
+
+    roll_up() adds a coarser resolution fed from this one. The sums, counts
+    and last values of every emitted bucket are folded into it, so coarser
+    levels never look at a raw row again and emit_complete() hands out
+    their buckets once every finer bucket in them was emitted.
+
+    `aggregations` maps glob patterns of ids to the AGGREGATIONS they are
+    written with instead, each in an "<id>_<aggregate>" column, see
+    output_columns(). min, max, mean, std and sum are taken over the numeric
+    values of a bucket, first, last and count over all of them. The extra
+    aggregates are only kept when a pattern asks for them, all of them from
+    the same group-by as the sums and counts.
+    """
+
+    def __init__(
+            self,
+            resample_seconds: int | float,
+            decimals: int = ROUNDING_NUM_DECIMALS,
+            origin_ns: int | None = None,
+            string_ids: Iterable[str] | None = None,
+            aggregations: dict[str, list[str]] | None = None,
+        ):
+        self.step_ns = resample_ns(resample_seconds)
+        self.decimals = decimals
+        self.origin_ns = origin_ns
+        self.string_ids = frozenset(string_ids or ())
+        self.aggregations = {pattern: list(dict.fromkeys(functions)) for (pattern, functions) in (aggregations or {}).items()}
+        functions = {function for functions in self.aggregations.values() for function in functions}
+        if not functions.issubset(AGGREGATIONS):
+            raise ValueError(f"Aggregations need to be among {AGGREGATIONS}, not {sorted(functions.difference(AGGREGATIONS))}.")
+        self._float_stat_names = [name for name in ("min", "max") if name in functions] + (["m2"] if "std" in functions else [])
+        self._value_stat_names = [name for name in ("first", "count") if name in functions]
+        self.first_bucket: int | None = None
+        self.ids: list[str] = []
+        self._codes: dict[str, int] = {}
+        self._string_ids = np.zeros(0, dtype = bool)
+        self._emitted_float = np.zeros(0, dtype = bool)
+        # Aggregates of every id, None for ids written as a plain mean or last
+        self._aggregates: list[list[str] | None] = []
+        self._aggregated = np.zeros(0, dtype = bool)
+        self._newest_bucket: int | None = None
+        self._emitted_before: int | None = None
+        self.late_rows = 0
+        self.retyped_ids = 0
+        self.rollups: list[StreamingResampler] = []
+        # Coarser levels only, buckets before this one have all their rows
+        self._complete_before: int | None = None
+        self._reset_open()
+
+
+    def _reset_open(self) -> None:
+        self._sum_keys = np.zeros(0, dtype = np.int64)
+        self._sums = np.zeros(0, dtype = np.float64)
+        self._counts = np.zeros(0, dtype = np.int64)
+        self._last_keys = np.zeros(0, dtype = np.int64)
+        self._lasts = np.zeros(0, dtype = object)
+        self._float_stats = {name: np.zeros(0, dtype = np.float64) for name in self._float_stat_names}
+        self._value_stats = {
+            name: np.zeros(0, dtype = np.int64 if name == "count" else object) for name in self._value_stat_names
+        }
+
+
+    def roll_up(self, resample_seconds: int | float) -> "StreamingResampler":
+        """Adds a coarser level whose buckets are whole multiples of this one's and returns its resampler."""
+        rollup = StreamingResampler(
+            resample_seconds, decimals = self.decimals, origin_ns = self.origin_ns, string_ids = self.string_ids, aggregations = self.aggregations
+        )
+        if (rollup.step_ns <= self.step_ns) or (rollup.step_ns % self.step_ns):
+            raise ValueError(f"A {resample_seconds} s rollup needs to be a multiple of the {self.step_ns / NANOSECONDS_PER_SECOND:g} s buckets it is built from.")
+        self.rollups.append(rollup)
+        return rollup
+
+
+    def _roll_up(self, before_bucket: int, emitted: PartialAggregates) -> None:
+        for rollup in self.rollups:
+            ratio = rollup.step_ns // self.step_ns
+            rollup.merge_partial(replace(
+                emitted,
+                sum_keys = group_keys((emitted.sum_keys // ID_KEY_STRIDE) // ratio, emitted.sum_keys % ID_KEY_STRIDE),
+                last_keys = group_keys((emitted.last_keys // ID_KEY_STRIDE) // ratio, emitted.last_keys % ID_KEY_STRIDE),
+            ))
+            complete_before = before_bucket // ratio
+            if (rollup._complete_before is None) or (complete_before > rollup._complete_before):
+                rollup._complete_before = complete_before
+
+
+    def emit_complete(self) -> pd.DataFrame:
+        """Emits the buckets of a rolled up level that every finer bucket has been added to."""
+        if self._complete_before is None:
+            return empty_frame()
+        return self.emit_before(self._complete_before)
+
+
+    @property
+    def newest_bucket(self) -> int | None:
+        return self._newest_bucket
+
+
+    def output_columns(self, ids: Iterable[str]) -> list[str]:
+        """Columns the buckets of `ids` are written to, in the order of `ids`."""
+        return aggregate_columns(ids, self.aggregations)
+
+
+    def open_buckets(self) -> int:
+        return len(np.unique(np.concatenate((self._sum_keys, self._last_keys)) // ID_KEY_STRIDE))
+
+
+    def _intern(self, ids: list[str]) -> np.ndarray:
+        (chunk_codes, labels) = pd.factorize(pd.Series(ids, dtype = object))
+        return self._intern_labels(labels)[chunk_codes]
+
+
+    def _intern_labels(self, labels) -> np.ndarray:
+        label_codes = np.empty(len(labels), dtype = np.int64)
+        for (index, label) in enumerate(labels):
+            code = self._codes.get(label)
+            if code is None:
+                code = len(self.ids)
+                if code >= ID_KEY_STRIDE:
+                    raise ValueError(f"More than {ID_KEY_STRIDE} ids can not be resampled.")
+                self.ids.append(label)
+                self._codes[label] = code
+            label_codes[index] = code
+        if len(self.ids) > len(self._string_ids):
+            new_ids = self.ids[len(self._string_ids):]
+            self._string_ids = np.concatenate((self._string_ids, [field_id in self.string_ids for field_id in new_ids]))
+            self._emitted_float = np.concatenate((self._emitted_float, np.zeros(len(new_ids), dtype = bool)))
+            self._aggregates.extend(id_aggregations(field_id, self.aggregations) for field_id in new_ids)
+            self._aggregated = np.array([functions is not None for functions in self._aggregates], dtype = bool)
+        return label_codes
+
+
+    def _mark_string_ids(self, codes: np.ndarray) -> None:
+        new_string_ids = np.unique(codes[~self._string_ids[codes]])
+        retyped = new_string_ids[self._emitted_float[new_string_ids]]
+        if len(retyped):
+            self.retyped_ids += len(retyped)
+            logger.warning(
+                f"Ids {[self.ids[code] for code in retyped]} changed from numeric to string values, "
+                "buckets already written keep their mean"
+            )
+        self._string_ids[new_string_ids] = True
+
+
+    def add(self, times: list, ids: list[str], values: list) -> pd.DataFrame:
+        """Adds raw (time, id, value) rows and returns the buckets they closed."""
+        if not times:
+            return empty_frame()
+        self.accumulate(times, ids, values)
+        return self.emit_closed()
+
+
+    def accumulate(self, times: list, ids: list[str], values: list) -> None:
+        """Adds raw rows without emitting anything."""
+        if not times:
+            return
+        self.accumulate_ns(times_to_ns(times), ids, values)
+
+
+    def accumulate_ns(self, time_ns: np.ndarray, ids: list[str] | np.ndarray, values: list | np.ndarray) -> None:
+        """Adds rows timestamped in naive local nanoseconds, a float64 value array skips the type checks."""
+        if len(time_ns) == 0:
+            return
+        self._accumulate(time_ns, self._intern(ids), values)
+
+
+    def accumulate_codes(self, time_ns: np.ndarray, id_codes: np.ndarray, id_labels: list[str], values: list | np.ndarray) -> None:
+        """Adds rows whose ids are already codes into `id_labels`, like the blocks of a RawCsvScanner."""
+        if len(time_ns) == 0:
+            return
+        self._accumulate(time_ns, self._intern_labels(id_labels)[id_codes], values)
+
+
+    def _accumulate(self, time_ns: np.ndarray, codes: np.ndarray, values: list | np.ndarray) -> None:
+        if self.origin_ns is None:
+            self.origin_ns = bucket_origin_ns(time_ns)
+        if isinstance(values, np.ndarray) and (values.dtype.kind == "f"):
+            is_float = np.ones(len(values), dtype = bool)
+        else:
+            values = np.array(values, dtype = object)
+            is_float = np.array([type(value) is float for value in values], dtype = bool)
+            self._mark_string_ids(codes[~is_float])
+
+        buckets = bucket_index(time_ns, self.step_ns, self.origin_ns)
+        if self._emitted_before is not None:
+            self.late_rows += int(np.count_nonzero(buckets < self._emitted_before))
+        keys = group_keys(buckets, codes, ID_KEY_STRIDE)
+        if values.dtype.kind == "f":
+            float_values = values
+        else:
+            float_values = np.full(len(values), np.nan)
+            float_values[is_float] = values[is_float].astype(np.float64)
+
+        (chunk_keys, chunk_sums, chunk_counts, chunk_stats) = float_stats(keys, float_values, self._float_stat_names)
+        (self._sum_keys, self._sums, self._counts, self._float_stats) = merge_sums(
+            self._sum_keys, self._sums, self._counts, chunk_keys, chunk_sums, chunk_counts, self._float_stats, chunk_stats
+        )
+        (chunk_keys, chunk_lasts, chunk_stats) = value_stats(keys, values, self._value_stat_names)
+        (self._last_keys, self._lasts, self._value_stats) = merge_last(
+            self._last_keys, self._lasts, chunk_keys, chunk_lasts, self._value_stats, chunk_stats
+        )
+
+        if self.first_bucket is None:
+            self.first_bucket = int(buckets.min())
+        self._see_bucket(int(buckets.max()))
+
+
+    def _see_bucket(self, bucket: int) -> None:
+        if (self._newest_bucket is None) or (bucket > self._newest_bucket):
+            self._newest_bucket = bucket
+
+
+    def take_partial(self, before_bucket: int | None = None) -> PartialAggregates:
+        """Removes the open buckets before `before_bucket`, all of them by default, without emitting them."""
+        if before_bucket is None:
+            before_bucket = (self._newest_bucket + 1) if self._newest_bucket is not None else 0
+        return self._split_before(before_bucket)
+
+
+    def merge_partial(self, partial: PartialAggregates) -> None:
+        """Folds buckets taken from another resampler over the same day in, its values count as the newer rows."""
+        if self.origin_ns is None:
+            self.origin_ns = partial.origin_ns
+        elif partial.origin_ns != self.origin_ns:
+            raise ValueError("Partial aggregates need to share the resampler's origin.")
+        codes = self._intern(partial.ids) if partial.ids else np.zeros(0, dtype = np.int64)
+        self._mark_string_ids(codes[partial.string_ids])
+        sum_keys = group_keys(partial.sum_keys // ID_KEY_STRIDE, codes[partial.sum_keys % ID_KEY_STRIDE])
+        last_keys = group_keys(partial.last_keys // ID_KEY_STRIDE, codes[partial.last_keys % ID_KEY_STRIDE])
+        (self._sum_keys, self._sums, self._counts, self._float_stats) = merge_sums(
+            self._sum_keys, self._sums, self._counts, sum_keys, partial.sums, partial.counts, self._float_stats, partial.float_stats
+        )
+        (self._last_keys, self._lasts, self._value_stats) = merge_last(
+            self._last_keys, self._lasts, last_keys, partial.lasts, self._value_stats, partial.value_stats
+        )
+        keys = np.concatenate((sum_keys, last_keys))
+        if len(keys):
+            self._see_bucket(int(keys.max() // ID_KEY_STRIDE))
+
+
+    def emit_closed(self) -> pd.DataFrame:
+        """Emits every bucket before the newest one, which may still get rows."""
+        if self._newest_bucket is None:
+            return empty_frame()
+        return self.emit_before(self._newest_bucket)
+
+
+    def close_until(self, time_ns: int) -> pd.DataFrame:
+        """Emits every bucket that ends at or before `time_ns`, in naive local nanoseconds."""
+        if self.origin_ns is None:
+            return empty_frame()
+        return self.emit_before((time_ns - self.origin_ns) // self.step_ns)
+
+
+    def finish(self) -> pd.DataFrame:
+        """Emits every bucket that is still open."""
+        if self._newest_bucket is None:
+            return empty_frame()
+        return self.emit_before(self._newest_bucket + 1)
+
+
+    def _split_before(self, bucket: int) -> PartialAggregates:
+        split_key = bucket * ID_KEY_STRIDE
+        sum_split = np.searchsorted(self._sum_keys, split_key)
+        last_split = np.searchsorted(self._last_keys, split_key)
+        split = PartialAggregates(
+            self.origin_ns, list(self.ids), self._string_ids.copy(),
+            self._sum_keys[:sum_split], self._sums[:sum_split], self._counts[:sum_split],
+            self._last_keys[:last_split], self._lasts[:last_split],
+            {name: values[:sum_split] for (name, values) in self._float_stats.items()},
+            {name: values[:last_split] for (name, values) in self._value_stats.items()},
+        )
+        (self._sum_keys, self._sums, self._counts) = (self._sum_keys[sum_split:], self._sums[sum_split:], self._counts[sum_split:])
+        (self._last_keys, self._lasts) = (self._last_keys[last_split:], self._lasts[last_split:])
+        self._float_stats = {name: values[sum_split:] for (name, values) in self._float_stats.items()}
+        self._value_stats = {name: values[last_split:] for (name, values) in self._value_stats.items()}
+        self._emitted_before = bucket if self._emitted_before is None else max(self._emitted_before, bucket)
+        return split
+
+
+    def emit_before(self, bucket: int) -> pd.DataFrame:
+        """Emits every open bucket before `bucket`, counted in steps from the origin."""
+        emitted = self._split_before(bucket)
+        if self.rollups:
+            self._roll_up(bucket, emitted)
+        (sum_codes, last_codes) = (emitted.sum_keys % ID_KEY_STRIDE, emitted.last_keys % ID_KEY_STRIDE)
+        float_rows = ~self._string_ids[sum_codes] & ~self._aggregated[sum_codes]
+        (float_keys, means) = (emitted.sum_keys[float_rows], emitted.sums[float_rows] / emitted.counts[float_rows])
+        self._emitted_float[float_keys % ID_KEY_STRIDE] = True
+        string_rows = self._string_ids[last_codes] & ~self._aggregated[last_codes]
+        df = to_wide(
+            float_keys, means, emitted.last_keys[string_rows], emitted.lasts[string_rows],
+            self.ids, self._string_ids, self.origin_ns, self.step_ns, columns = ~self._aggregated
+        )
+        float_columns = [self.ids[code] for code in np.flatnonzero(~self._string_ids & ~self._aggregated)]
+        df[float_columns] = df[float_columns].round(self.decimals)
+        if self._aggregated.any():
+            df = self._with_aggregates(df, emitted)
+        return df
+
+
+    def _with_aggregates(self, df: pd.DataFrame, emitted: PartialAggregates) -> pd.DataFrame:
+        """Adds the columns of the ids with aggregates, every aggregate a (bucket, id) grid filled at once."""
+        buckets = np.unique(np.concatenate((emitted.sum_keys, emitted.last_keys)) // ID_KEY_STRIDE)
+        codes = np.flatnonzero(self._aggregated)
+        position = np.full(len(self.ids), -1)
+        position[codes] = np.arange(len(codes))
+        functions = {function for code in codes for function in self._aggregates[code]}
+
+        sum_rows = self._aggregated[emitted.sum_keys % ID_KEY_STRIDE]
+        sum_keys = emitted.sum_keys[sum_rows]
+        sum_cells = (np.searchsorted(buckets, sum_keys // ID_KEY_STRIDE), position[sum_keys % ID_KEY_STRIDE])
+        (sums, counts) = (emitted.sums[sum_rows], emitted.counts[sum_rows])
+        float_values = {"sum": sums, "mean": sums / counts}
+        for name in ("min", "max"):
+            if name in functions:
+                float_values[name] = emitted.float_stats[name][sum_rows]
+        if "std" in functions:
+            with np.errstate(invalid = "ignore", divide = "ignore"):
+                float_values["std"] = np.where(counts > 1, np.sqrt(emitted.float_stats["m2"][sum_rows] / (counts - 1)), np.nan)
+
+        last_rows = self._aggregated[emitted.last_keys % ID_KEY_STRIDE]
+        last_keys = emitted.last_keys[last_rows]
+        last_cells = (np.searchsorted(buckets, last_keys // ID_KEY_STRIDE), position[last_keys % ID_KEY_STRIDE])
+        values = {"last": emitted.lasts[last_rows]}
+        for name in ("first", "count"):
+            if name in functions:
+                values[name] = emitted.value_stats[name][last_rows]
+
+        grids = {}
+        for function in functions:
+            if function in float_values:
+                grids[function] = np.full((len(buckets), len(codes)), np.nan)
+                grids[function][sum_cells] = np.round(float_values[function], self.decimals)
+            elif function == "count":
+                grids[function] = np.zeros((len(buckets), len(codes)), dtype = np.int64)
+                grids[function][last_cells] = values[function]
+            else:
+                grids[function] = np.full((len(buckets), len(codes)), np.nan, dtype = object)
+                grids[function][last_cells] = values[function]
+
+        columns = {}
+        for code in codes:
+            for function in self._aggregates[code]:
+                column = grids[function][:, position[code]]
+                if (function in ("first", "last")) and not self._string_ids[code]:
+                    column = np.round(column.astype(np.float64), self.decimals)
+                columns[f"{self.ids[code]}_{function}"] = column
+        index = pd.DatetimeIndex((self.origin_ns + buckets * self.step_ns).view("datetime64[ns]"), name = "time")
+        return pd.concat([df.reindex(index), pd.DataFrame(columns, index = index)], axis = 1)
+
+
+def gap_buckets(buckets: np.ndarray, previous: int, limit: int) -> np.ndarray:
+    """Buckets missing between consecutive `buckets`, in gaps short enough to be filled."""
+    before = np.concatenate(([previous], buckets[:-1]))
+    gaps = buckets - before - 1
+    counts = np.where((gaps > 0) & (gaps <= limit), gaps, 0)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(before + 1, counts) + offsets
+
+
+class GapInterpolator():
+    """
+    Time weighted interpolation of resampled frames, a chunk at a time.
+
+    In float columns, gaps of at most `limit` missing buckets are filled on
+    the straight line between the buckets around them, the same values as
+    DataFrame.interpolate(method = "time", limit_area = "inside") over the
+    whole day. Longer gaps and the buckets before the first or after the
+    last value of an id stay empty, as do string columns. Buckets without a
+    row get one when a gap through them is filled.
+
+    Frames are pushed in bucket order. The last value of every column
+    carries over between them, and only the rows of a gap that is not over
+    yet are held back, no more than `limit` buckets, so memory does not
+    grow with the day. Rows older than a bucket already pushed are passed
+    through as they are.
+    """
+
+    def __init__(self, resample_seconds: int | float, limit: int, decimals: int = ROUNDING_NUM_DECIMALS):
+        self.step_ns = resample_ns(resample_seconds)
+        self.limit = limit
+        self.decimals = decimals
+        self.filled = 0
+        self._reference_ns: int | None = None
+        self._newest_bucket: int | None = None
+        # Last value of every float column and its bucket, from the rows already returned
+        self._carry_buckets: dict[str, int] = {}
+        self._carry_values: dict[str, float] = {}
+        self._pending = empty_frame()
+        self._pending_buckets = np.zeros(0, dtype = np.int64)
+        self._pending_inserted = np.zeros(0, dtype = bool)
+
+
+    def _buckets(self, index: pd.DatetimeIndex) -> np.ndarray:
+        time_ns = np.asarray(index, dtype = "datetime64[ns]").view(np.int64)
+        if self._reference_ns is None:
+            self._reference_ns = int(time_ns[0])
+        return (time_ns - self._reference_ns) // self.step_ns
+
+
+    def push(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Adds the next resampled frame and returns the rows that can not change anymore."""
+        if df.empty:
+            return empty_frame()
+        buckets = self._buckets(df.index)
+        late = np.zeros(len(df), dtype = bool) if self._newest_bucket is None else (buckets <= self._newest_bucket)
+        late_rows = df[late]
+        (df, buckets) = (df[~late], buckets[~late])
+        if df.empty:
+            return late_rows
+
+        previous = int(buckets[0]) if self._newest_bucket is None else self._newest_bucket
+        inserted = gap_buckets(buckets, previous, self.limit)
+        index = pd.DatetimeIndex((self._reference_ns + inserted * self.step_ns).view("datetime64[ns]"), name = df.index.name)
+        frame = pd.concat([self._pending, df, pd.DataFrame(index = index)])
+        all_buckets = np.concatenate((self._pending_buckets, buckets, inserted))
+        is_inserted = np.concatenate((self._pending_inserted, np.zeros(len(df), dtype = bool), np.ones(len(inserted), dtype = bool)))
+        order = np.argsort(all_buckets, kind = "stable")
+        self._newest_bucket = int(all_buckets.max())
+        released = self._settle(frame.iloc[order], all_buckets[order], is_inserted[order], final = False)
+        if late_rows.empty:
+            return released
+        return pd.concat([released, late_rows])
+
+
+    def finish(self, df: pd.DataFrame | None = None) -> pd.DataFrame:
+        """Adds a last frame and returns every row held back, gaps still open at the end stay empty."""
+        released = empty_frame() if df is None else self.push(df)
+        if self._pending.empty:
+            return released
+        rest = self._settle(self._pending, self._pending_buckets, self._pending_inserted, final = True)
+        return pd.concat([released, rest])
+
+
+    def _settle(self, frame: pd.DataFrame, buckets: np.ndarray, inserted: np.ndarray, final: bool) -> pd.DataFrame:
+        """Fills the gaps of `frame` that are decided, returns its rows up to the first undecided one and holds back the rest."""
+        float_columns = [column for column in frame.columns if frame[column].dtype.kind == "f"]
+        for column in frame.columns.difference(float_columns):
+            # An id that changed to strings starts over
+            self._carry_buckets.pop(column, None)
+            self._carry_values.pop(column, None)
+        values = frame[float_columns].to_numpy(dtype = np.float64, copy = True)
+        (row_count, column_count) = values.shape
+        valid = ~np.isnan(values)
+        rows = np.arange(row_count)[:, None]
+        columns = np.arange(column_count)
+        prev_rows = np.maximum.accumulate(np.where(valid, rows, -1), axis = 0)
+        next_rows = np.minimum.accumulate(np.where(valid, rows, row_count)[::-1], axis = 0)[::-1]
+
+        carry_buckets = np.array([self._carry_buckets.get(column, np.nan) for column in float_columns], dtype = np.float64)
+        carry_values = np.array([self._carry_values.get(column, np.nan) for column in float_columns], dtype = np.float64)
+        prev_buckets = np.where(prev_rows >= 0, buckets[np.maximum(prev_rows, 0)], carry_buckets)
+        prev_values = np.where(prev_rows >= 0, values[np.maximum(prev_rows, 0), columns], carry_values)
+        has_next = next_rows < row_count
+        next_buckets = buckets[np.minimum(next_rows, row_count - 1)]
+        next_values = values[np.minimum(next_rows, row_count - 1), columns]
+
+        missing = ~valid & ~np.isnan(prev_buckets)
+        fill = missing & has_next & (next_buckets - prev_buckets - 1 <= self.limit)
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            # Same arithmetic as np.interp, which DataFrame.interpolate uses
+            slopes = (next_values - prev_values) / (next_buckets - prev_buckets)
+            interpolated = slopes * (buckets[:, None] - prev_buckets) + prev_values
+        values[fill] = np.round(interpolated[fill], self.decimals)
+
+        cut = row_count
+        if not final:
+            # A gap that has not ended yet may still be short enough to fill
+            undecided = missing & ~has_next & (buckets[-1] - prev_buckets <= self.limit)
+            undecided_rows = np.flatnonzero(undecided.any(axis = 1))
+            if len(undecided_rows):
+                cut = int(undecided_rows[0])
+
+        released = frame.iloc[:cut].copy()
+        released[float_columns] = values[:cut]
+        for (position, column) in enumerate(float_columns):
+            known = np.flatnonzero(~np.isnan(values[:cut, position]))
+            if len(known):
+                self._carry_buckets[column] = int(buckets[known[-1]])
+                self._carry_values[column] = float(values[known[-1], position])
+        self.filled += int(np.count_nonzero(fill[:cut]))
+        (self._pending, self._pending_buckets, self._pending_inserted) = (frame.iloc[cut:], buckets[cut:], inserted[cut:])
+        # Inserted buckets no gap was filled through are not written
+        keep = ~inserted[:cut] | released.notna().any(axis = 1).to_numpy()
+        return released[keep]
+
+
+@dataclass
+class LiveDay():
+    """One resolution of a day being aggregated, the finest one holds its coarser levels in `rollups`."""
+    processed_filename: str
+    resample_seconds: int | float
+    resampler: StreamingResampler
+    written_columns: int | None = None
+    interpolator: GapInterpolator | None = None
+    rollups: list["LiveDay"] = field(default_factory = list)
+
+    def levels(self) -> list["LiveDay"]:
+        return [self] + self.rollups
+
+
+class LiveAggregator():
+    """
+    Resamples flushed rows during the day so end of day only has to finalize.
+
+    Every raw flush of a day being aggregated is added to that day's
+    StreamingResampler. emit() appends the buckets that ended more than
+    `lag_seconds` ago to the processed file, so rows arriving within the lag
+    still land in their bucket. finish() writes the buckets still open at
+    the end of the day. Days are keyed on their raw filename, so the next
+    day can be started before the last flush of the previous one is done.
+    Rows of a day that was not started are only counted in `ignored_rows`,
+    end of day processes that day from its raw file instead. With a
+    `nan_limit` short gaps are interpolated as the buckets are written.
+    Every resolution in `rollup_seconds` is rolled up from the emitted
+    buckets into its own processed file, named by rollup_filename(). Ids
+    matching a pattern of `aggregations` are written with its aggregates.
+    """
+
+    def __init__(
+            self,
+            resample_seconds: int | float,
+            lag_seconds: int | float,
+            write_function: Callable[[pd.DataFrame, list[str], str, int | None, int | float], int | None],
+            widen_function: Callable[[str, list[str]], None],
+            nan_limit: int | None = None,
+            rollup_seconds: Iterable[int | float] = (),
+            aggregations: dict[str, list[str]] | None = None,
+        ):
+        self.resample_seconds = resample_seconds
+        self.nan_limit = nan_limit
+        self.rollup_seconds = list(rollup_seconds)
+        self.aggregations = aggregations
+        self.lag_ns = resample_ns(lag_seconds)
+        self.write_function = write_function
+        self.widen_function = widen_function
+        self.days: dict[str, LiveDay] = {}
+        self.ignored_rows = 0
+        self.late_rows = 0
+        self._lock = Lock()
+
+
+    def _level(self, processed_filename: str, resample_seconds: int | float, resampler: StreamingResampler) -> LiveDay:
+        interpolator = None if self.nan_limit is None else GapInterpolator(resample_seconds, self.nan_limit)
+        return LiveDay(processed_filename, resample_seconds, resampler, interpolator = interpolator)
+
+
+    def start_day(self, raw_filename: str, processed_filename: str) -> None:
+        with self._lock:
+            if raw_filename not in self.days:
+                resampler = StreamingResampler(self.resample_seconds, aggregations = self.aggregations)
+                day = self._level(processed_filename, self.resample_seconds, resampler)
+                day.rollups = [
+                    self._level(rollup_filename(processed_filename, seconds), seconds, day.resampler.roll_up(seconds))
+                    for seconds in self.rollup_seconds
+                ]
+                self.days[raw_filename] = day
+
+
+    def add(self, raw_filename: str, time_ns: np.ndarray, ids: list[str] | np.ndarray, values: list | np.ndarray) -> None:
+        with self._lock:
+            day = self.days.get(raw_filename)
+            if day is None:
+                self.ignored_rows += len(time_ns)
+                return
+            day.resampler.accumulate_ns(time_ns, ids, values)
+
+
+    def emit(self, now_ns: int) -> None:
+        with self._lock:
+            for day in self.days.values():
+                self._write(day, day.resampler.close_until(now_ns - self.lag_ns))
+                for rollup in day.rollups:
+                    self._write(rollup, rollup.resampler.emit_complete())
+
+
+    def finish(self, raw_filename: str) -> bool:
+        """Writes the last buckets of `raw_filename`'s day, False if that day was not aggregated live."""
+        with self._lock:
+            day = self.days.pop(raw_filename, None)
+            if day is None:
+                return False
+            # The finest level goes first, its last buckets still roll up
+            for level in day.levels():
+                df = level.resampler.finish()
+                if level.interpolator is not None:
+                    df = level.interpolator.finish(df)
+                self._write(level, df, interpolate = False)
+                columns = level.resampler.output_columns(level.resampler.ids)
+                if (level.written_columns is not None) and (level.written_columns != len(columns)):
+                    self.widen_function(level.processed_filename, columns)
+            if day.resampler.late_rows:
+                logger.warning(f"{day.resampler.late_rows} rows of {raw_filename} arrived after their bucket was written")
+            self.late_rows += day.resampler.late_rows
+            return True
+
+
+    def _write(self, day: LiveDay, df: pd.DataFrame, interpolate: bool = True) -> None:
+        if interpolate and (day.interpolator is not None):
+            df = day.interpolator.push(df)
+        day.written_columns = self.write_function(
+            df, day.resampler.output_columns(day.resampler.ids), day.processed_filename, day.written_columns, day.resample_seconds
+        )
+
+
+def resample_long(
+        times: list,
+        ids: list[str],
+        values: list,
+        resample_seconds: int | float,
+        decimals: int = ROUNDING_NUM_DECIMALS,
+    ) -> pd.DataFrame:
+    """
+    Resamples raw (time, id, value) rows without pivoting them first.
+
+    Timestamps are binned with integer arithmetic and aggregated per
+    (bucket, id) with NumPy group-by primitives: mean for ids holding only
+    numbers, last for ids holding any string. The result is the same frame
+    process_data builds from dense rows.
+    """
+    if not times:
+        return empty_frame()
+    resampler = StreamingResampler(resample_seconds, decimals = decimals)
+    resampler.accumulate(times, ids, values)
+    return resampler.finish()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""End of day processing of a raw day file, in the service or in a child process"""
+# ---------------------------------------------------------------------------
+from dataclasses import (dataclass, replace)
+from functools import partial
+from threading import (Lock, Thread)
+from typing import Callable
+import csv
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+
+import pandas as pd
+import psutil
+
+from data_extraction.compression import iter_lines
+from data_extraction.eod import (
+    GapInterpolator, StreamingResampler, bucket_date_format, parse_raw_line, raw_time_index, rollup_filename
+)
+from data_extraction.id_catalog import read_id_catalog
+from data_extraction.parallel_eod import (process_day_parallel, parallel_supported)
+from data_extraction.raw_parquet import (iter_raw_batches, PARQUET_EXTENSION)
+from data_extraction.raw_scanner import (RawCsvScanner, can_scan)
+from data_extraction.timestamps import epoch_ns_to_local
+from data_extraction.type_registry import (read_type_registry, string_ids)
+
+logger = logging.getLogger("data_extraction")
+
+PROGRESS = "progress"
+DONE = "done"
+ERROR = "error"
+MEMORY = "memory"
+MEMORY_EXIT_CODE = 3
+MEMORY_CHECK_INTERVAL = 1.0
+PARTIAL_EXTENSION = ".eod"
+
+
+@dataclass
+class EodJob():
+    """Everything a child process needs to build one day's processed file."""
+    raw_filename: str
+    processed_filename: str
+    resample_seconds: int | float
+    chunk_rows: int = 100_000
+    workers: int = 1
+    # Gaps of up to this many buckets are interpolated, None leaves them empty
+    nan_limit: int | None = None
+    # Coarser resolutions rolled up into their own processed files
+    rollup_seconds: tuple[int | float, ...] = ()
+    # Glob patterns of ids to the aggregates they are written with, mean or last otherwise
+    aggregations: dict[str, list[str]] | None = None
+
+
+def iter_csv_rows(filename: str):
+    # Compressed raw files are decompressed on the fly
+    lines = iter_lines(filename)
+    time_index = raw_time_index(next(lines, "").rstrip().split(","))
+    for line in lines:
+        yield parse_raw_line(line, time_index)
+
+
+def iter_parquet_rows(filename: str):
+    for batch in iter_raw_batches(filename, columns = ["time_ns", "id", "value", "value_str"]):
+        row_times = epoch_ns_to_local(batch.column("time_ns").to_numpy(), precision_ns = 1)
+        row_ids = batch.column("id").to_pylist()
+        row_values = batch.column("value").to_pylist()
+        row_strings = batch.column("value_str").to_pylist()
+        for (row_time, row_id, row_value, row_string) in zip(row_times, row_ids, row_values, row_strings):
+            yield (row_time, row_id, row_value if row_string is None else row_string)
+
+
+def iter_raw_rows(filename: str):
+    """(time, id, value) of every row of a raw day file, csv or parquet."""
+    if filename.endswith(PARQUET_EXTENSION):
+        return iter_parquet_rows(filename)
+    return iter_csv_rows(filename)
+
+
+def feed_resampler(raw_filename: str, resampler: StreamingResampler, chunk_rows: int):
+    """
+    Adds the rows of a raw day file to `resampler` a chunk at a time, yielding the rows added by each chunk.
+
+    Uncompressed csv files are scanned in NumPy blocks, compressed csv and
+    parquet files are read row by row.
+    """
+    if can_scan(raw_filename):
+        scanner = RawCsvScanner(raw_filename, block_rows = chunk_rows)
+        for block in scanner:
+            resampler.accumulate_codes(block.time_ns, block.id_codes, scanner.ids, block.values)
+            yield len(block)
+        return
+    # Rows stay in long form, they are only pivoted once resampled
+    (times, ids, values) = ([], [], [])
+    for (row_time, row_id, row_value) in iter_raw_rows(raw_filename):
+        times.append(row_time)
+        ids.append(row_id)
+        values.append(row_value)
+        if len(times) == chunk_rows:
+            resampler.accumulate(times, ids, values)
+            yield len(times)
+            (times, ids, values) = ([], [], [])
+    if times:
+        resampler.accumulate(times, ids, values)
+        yield len(times)
+
+
+def write_processed_frame(
+        df: pd.DataFrame,
+        id_list: dict | list,
+        processed_filename: str,
+        written_columns: int | None,
+        date_format: str | None = None,
+    ) -> int | None:
+    """Writes resampled rows with every known id as a column, in catalog order, and returns the header width."""
+    if df.empty:
+        return written_columns
+    df = df.reindex(columns = list(id_list))
+    df.to_csv(processed_filename, mode = "a", header = not os.path.exists(processed_filename), date_format = date_format)
+    return len(id_list) if written_columns is None else written_columns
+
+
+def widen_processed_file(processed_filename: str, id_list: list[str]) -> None:
+    """
+    Rewrites the header of a processed file after ids showed up that were not in the catalog.
+
+    Ids are only ever added to the end of the column list, so rows written
+    before an id was discovered are padded with empty fields.
+    """
+    logger.info(f"{processed_filename} gained columns during processing, rewriting its header")
+    temporary_filename = f"{processed_filename}.tmp"
+    width = len(id_list) + 1
+    with open(processed_filename, "r", newline = "") as source, open(temporary_filename, "w", newline = "") as target:
+        reader = csv.reader(source)
+        writer = csv.writer(target, lineterminator = os.linesep)
+        index_label = next(reader, ["time"])[0]
+        writer.writerow([index_label] + id_list)
+        for row in reader:
+            writer.writerow(row + [""] * (width - len(row)))
+    os.replace(temporary_filename, processed_filename)
+
+
+def processed_filenames(job: EodJob) -> list[str]:
+    """Processed file of every resolution of `job`, the finest first."""
+    return [job.processed_filename] + [rollup_filename(job.processed_filename, seconds) for seconds in job.rollup_seconds]
+
+
+def process_day(job: EodJob, progress: Callable[[int], None] | None = None) -> int:
+    """
+    Resamples a raw day file into its processed csv and returns the number of rows read.
+
+    The day is written to temporary files that replace the processed files
+    once complete, so a failed run never leaves half a day behind. `progress`
+    is called with the rows read so far after every chunk.
+    """
+    filenames = processed_filenames(job)
+    temporary_filenames = [filename + PARTIAL_EXTENSION for filename in filenames]
+    for temporary_filename in temporary_filenames:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+    rows = resample_day(replace(job, processed_filename = temporary_filenames[0]), progress, temporary_filenames[1:])
+    for (temporary_filename, filename) in zip(temporary_filenames, filenames):
+        if os.path.exists(temporary_filename):
+            os.replace(temporary_filename, filename)
+    return rows
+
+
+def resample_day(job: EodJob, progress: Callable[[int], None] | None = None, rollup_filenames: list[str] | None = None) -> int:
+    """process_day() writing straight to `job.processed_filename` and `rollup_filenames`."""
+    # Columns come from the catalog written during ingest, ids missing from it are picked up as rows are read
+    id_list = dict.fromkeys(read_id_catalog(job.raw_filename) or [])
+    # Types recorded during ingest, ids that turned to strings late in the day are not averaged before that
+    types = read_type_registry(job.raw_filename)
+    known_string_ids = string_ids(types)
+    write_function = partial(write_processed_frame, date_format = bucket_date_format(job.resample_seconds))
+    # Partitions write their complete buckets straight to the processed file, gaps and rollups are only built in one pass.
+    # Without a registry partitions could type an id that turns to strings differently
+    if (job.workers > 1) and parallel_supported(job.raw_filename) and (job.nan_limit is None) and not job.rollup_seconds and (types is not None):
+        rows = process_day_parallel(
+            job.raw_filename,
+            job.processed_filename,
+            job.resample_seconds,
+            job.workers,
+            write_function,
+            id_list = list(id_list),
+            chunk_rows = job.chunk_rows,
+            string_ids = known_string_ids,
+            aggregations = job.aggregations,
+        )
+        if progress is not None:
+            progress(rows)
+        return rows
+
+    # Open buckets carry over between chunks, so chunk boundaries do not split a bucket
+    resampler = StreamingResampler(job.resample_seconds, string_ids = known_string_ids, aggregations = job.aggregations)
+    if rollup_filenames is None:
+        rollup_filenames = processed_filenames(job)[1:]
+    levels = [(job.processed_filename, job.resample_seconds, resampler)] + [
+        (filename, seconds, resampler.roll_up(seconds)) for (filename, seconds) in zip(rollup_filenames, job.rollup_seconds)
+    ]
+    write_functions = [partial(write_processed_frame, date_format = bucket_date_format(seconds)) for (_, seconds, _) in levels]
+    interpolators = [None if job.nan_limit is None else GapInterpolator(seconds, job.nan_limit) for (_, seconds, _) in levels]
+    written_columns = [None] * len(levels)
+
+    def write(level: int, df: pd.DataFrame, last: bool = False) -> None:
+        interpolator = interpolators[level]
+        if interpolator is not None:
+            df = interpolator.finish(df) if last else interpolator.push(df)
+        written_columns[level] = write_functions[level](df, resampler.output_columns(id_list), levels[level][0], written_columns[level])
+
+    rows = 0
+    for chunk_rows in feed_resampler(job.raw_filename, resampler, job.chunk_rows):
+        rows += chunk_rows
+        id_list.update(dict.fromkeys(resampler.ids))
+        write(0, resampler.emit_closed())
+        for level in range(1, len(levels)):
+            write(level, levels[level][2].emit_complete())
+        if progress is not None:
+            progress(rows)
+    # The finest level goes first, its last buckets still roll up
+    columns = resampler.output_columns(id_list)
+    for (level, (filename, _, level_resampler)) in enumerate(levels):
+        write(level, level_resampler.finish(), last = True)
+        if (written_columns[level] is not None) and (written_columns[level] != len(columns)):
+            widen_processed_file(filename, columns)
+    if resampler.late_rows:
+        logger.warning(f"{resampler.late_rows} rows of {job.raw_filename} were older than buckets already written")
+    return rows
+
+
+def spawn_context() -> multiprocessing.context.SpawnContext:
+    """Context of every end of day process, spawned processes do not inherit the client's threads and locks."""
+    return multiprocessing.get_context("spawn")
+
+
+def lower_priority() -> None:
+    """Lets the scheduler favour the ingest process over end of day."""
+    try:
+        process = psutil.Process()
+        process.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS if os.name == "nt" else 10)
+    except (psutil.Error, OSError) as error:
+        logger.warning(f"Could not lower the end of day priority: {error}")
+
+
+def tree_memory_mb(process: psutil.Process) -> float:
+    """Resident memory of a process and every process it started, the eod_workers pool included."""
+    rss = process.memory_info().rss
+    for child in process.children(recursive = True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            # Exited since it was listed
+            continue
+    return rss / (1024*1024)
+
+
+def terminate_children(process: psutil.Process, timeout: float = 5.0) -> None:
+    """Stops every process `process` started, pool workers are not daemons and would outlive it."""
+    children = process.children(recursive = True)
+    for child in children:
+        try:
+            child.terminate()
+        except psutil.Error:
+            continue
+    (_, alive) = psutil.wait_procs(children, timeout = timeout)
+    for child in alive:
+        try:
+            child.kill()
+        except psutil.Error:
+            continue
+
+
+def watch_memory(send: Callable[[tuple], None], memory_limit_mb: int | float) -> None:
+    process = psutil.Process()
+    while True:
+        memory_usage = tree_memory_mb(process)
+        if memory_usage > memory_limit_mb:
+            send((MEMORY, memory_usage))
+            terminate_children(process)
+            os._exit(MEMORY_EXIT_CODE)
+        time.sleep(MEMORY_CHECK_INTERVAL)
+
+
+def run_child(job: EodJob, connection, memory_limit_mb: int | float) -> None:
+    """Child process entry point."""
+    lock = Lock()
+
+    def send(message: tuple) -> None:
+        with lock:
+            connection.send(message)
+
+    lower_priority()
+    Thread(target = watch_memory, args = (send, memory_limit_mb), daemon = True).start()
+    try:
+        rows = process_day(job, progress = lambda rows: send((PROGRESS, rows)))
+        send((DONE, rows))
+    except Exception:
+        send((ERROR, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+class EodProcessRunner():
+    """
+    Runs end of day jobs in a child process with its own memory budget, its worker pool included.
+
+    The child reports its progress over a pipe. A child that fails is
+    started again up to `retries` times, with half the chunk size if it ran
+    out of memory. Spawned children share no threads, locks or GIL with the
+    ingest process, which keeps running at full speed meanwhile.
+    """
+
+    def __init__(self, memory_limit_mb: int | float = 2*1024, retries: int = 2):
+        self.memory_limit_mb = memory_limit_mb
+        self.retries = retries
+        self.rows_processed = 0
+        self.attempts = 0
+        self.failures = 0
+
+
+    def run(self, job: EodJob) -> bool:
+        """Processes `job` and returns True once its processed file is complete."""
+        for attempt in range(self.retries + 1):
+            self.attempts += 1
+            (outcome, detail) = self._attempt(job)
+            if outcome == DONE:
+                logger.info(f"End of day of {job.raw_filename} processed {detail} rows in a child process")
+                return True
+            self.failures += 1
+            if outcome == MEMORY:
+                logger.error(f"End of day of {job.raw_filename} used {detail:.2f} MB > {self.memory_limit_mb} MB")
+                job = replace(job, chunk_rows = max(1, job.chunk_rows // 2))
+            else:
+                logger.error(f"End of day of {job.raw_filename} failed: {detail}")
+            if attempt < self.retries:
+                logger.info(f"Retrying end of day of {job.raw_filename} with {job.chunk_rows} rows per chunk")
+        return False
+
+
+    def _attempt(self, job: EodJob) -> tuple[str, object]:
+        context = spawn_context()
+        (receiver, sender) = context.Pipe(duplex = False)
+        # Not a daemon, a daemonic process can not start the eod_workers pool
+        process = context.Process(target = run_child, args = (job, sender, self.memory_limit_mb), name = "end_of_day")
+        process.start()
+        sender.close()
+        self.rows_processed = 0
+        result = None
+        while result is None:
+            try:
+                (kind, value) = receiver.recv()
+            except EOFError:
+                break
+            if kind == PROGRESS:
+                self.rows_processed = value
+                logger.debug(f"End of day of {job.raw_filename}: {value} rows")
+            else:
+                result = (kind, value)
+        receiver.close()
+        process.join()
+        if result is None:
+            result = (ERROR, f"child process exited with code {process.exitcode}")
+        return result
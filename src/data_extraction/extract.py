@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Time range extraction from raw day files without reading the whole day"""
+# ---------------------------------------------------------------------------
+from datetime import (date, datetime, timedelta)
+from itertools import islice
+from typing import Iterable, Iterator
+import gzip
+import io
+import logging
+import lzma
+import os
+
+from dateutil.tz import tzlocal
+import numpy as np
+import pandas as pd
+
+from data_extraction.block_index import (covering_blocks, read_block_index)
+from data_extraction.compression import (compression_from_filename, open_text, COMPRESSION_GZIP, COMPRESSION_NONE, TRUNCATION_ERRORS)
+from data_extraction.eod import (StreamingResampler, raw_time_index)
+from data_extraction.id_catalog import read_id_catalog
+from data_extraction.raw_parquet import (iter_raw_batches, raw_parquet_files, PARQUET_EXTENSION)
+from data_extraction.raw_scanner import RawCsvScanner
+from data_extraction.timestamps import epoch_ns_to_local
+
+logger = logging.getLogger("data_extraction")
+
+RAW_DAY_EXTENSIONS = (".csv", ".csv.gz", ".csv.xz", PARQUET_EXTENSION)
+NANOSECONDS_PER_HOUR = 3_600 * 10**9
+
+
+def to_local_ns(moment: str | datetime | pd.Timestamp) -> int:
+    """Naive local nanoseconds, the clock raw csv files are written in."""
+    timestamp = pd.Timestamp(moment)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(tzlocal()).tz_localize(None)
+    return timestamp.value
+
+
+def raw_day_filename(directory: str, output_filename: str, day: date) -> str | None:
+    """Raw file of `day`, whichever format or compression it was written with, None if there is none."""
+    for extension in RAW_DAY_EXTENSIONS:
+        filename = f"{directory}/{day:%Y%m%d}-{output_filename}{extension}"
+        if (extension == PARQUET_EXTENSION and raw_parquet_files(filename)) or os.path.exists(filename):
+            return filename
+    return None
+
+
+def raw_day_filenames(directory: str, output_filename: str, start: datetime, end: datetime) -> list[str]:
+    """Raw files of the days from `start` to `end` that exist."""
+    filenames = []
+    day = start.date() if isinstance(start, datetime) else date.fromisoformat(str(start)[:10])
+    last_day = end.date() if isinstance(end, datetime) else date.fromisoformat(str(end)[:10])
+    while day <= last_day:
+        filename = raw_day_filename(directory, output_filename, day)
+        if filename is not None:
+            filenames.append(filename)
+        day += timedelta(days = 1)
+    return filenames
+
+
+def byte_ranges(
+        raw_filename: str,
+        start_ns: int,
+        end_ns: int,
+        ids: Iterable[str] | None = None,
+    ) -> list[tuple[int, int]]:
+    """Byte ranges of a raw csv that can hold rows of `ids` in [start_ns, end_ns), adjacent blocks merged."""
+    blocks = covering_blocks(read_block_index(raw_filename) or [], os.path.getsize(raw_filename))
+    positions = None
+    catalog = read_id_catalog(raw_filename)
+    if (ids is not None) and (catalog is not None):
+        wanted = set(ids)
+        positions = {position for (position, field_id) in enumerate(catalog) if field_id in wanted}
+    ranges = []
+    for block in blocks:
+        if not block.overlaps(start_ns, end_ns):
+            continue
+        if (positions is not None) and (block.ids is not None) and positions.isdisjoint(block.ids):
+            continue
+        if ranges and (ranges[-1][1] == block.start):
+            ranges[-1] = (ranges[-1][0], block.end)
+        else:
+            ranges.append((block.start, block.end))
+    return ranges
+
+
+def read_time_index(raw_filename: str) -> int | None:
+    with open_text(raw_filename) as file:
+        return raw_time_index(file.readline().rstrip().split(","))
+
+
+class RangeReader(io.RawIOBase):
+    """Reads `length` bytes of a file from its current position, then reports the end of the file."""
+
+    def __init__(self, file, length: int):
+        self.file = file
+        self.remaining = length
+
+
+    def readable(self) -> bool:
+        return True
+
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        count = self.file.readinto(memoryview(buffer)[:size]) or 0
+        self.remaining -= count
+        return count
+
+
+def iter_compressed_range(raw_filename: str, start: int, end: int, chunk_rows: int) -> Iterator[tuple]:
+    # Every flush is a self contained member, so a range of whole flushes decompresses on its own,
+    # streamed from the file in chunk_rows lines
+    scanner = RawCsvScanner(raw_filename)
+    time_index = read_time_index(raw_filename)
+    with open(raw_filename, "rb") as file:
+        file.seek(start)
+        data = io.BufferedReader(RangeReader(file, end - start))
+        if compression_from_filename(raw_filename) == COMPRESSION_GZIP:
+            stream = gzip.GzipFile(fileobj = data)
+        else:
+            stream = lzma.LZMAFile(data)
+        with stream:
+            try:
+                if start == 0:
+                    stream.readline()
+                while lines := list(islice(stream, chunk_rows)):
+                    block = scanner.parse(b"".join(lines), time_index)
+                    yield (block.time_ns, np.asarray(scanner.ids, dtype = object)[block.id_codes], block.values)
+            except TRUNCATION_ERRORS as error:
+                logger.error(f"{raw_filename} ends in a truncated compressed block, skipping it: {error}")
+
+
+def iter_csv_range(raw_filename: str, start: int, end: int, chunk_rows: int) -> Iterator[tuple]:
+    if compression_from_filename(raw_filename) != COMPRESSION_NONE:
+        yield from iter_compressed_range(raw_filename, start, end, chunk_rows)
+        return
+    scanner = RawCsvScanner(raw_filename, block_rows = chunk_rows, start = start, end = end)
+    for block in scanner:
+        yield (block.time_ns, np.asarray(scanner.ids, dtype = object)[block.id_codes], block.values)
+
+
+def iter_parquet_range(raw_filename: str, start_ns: int, end_ns: int, ids: list[str] | None) -> Iterator[tuple]:
+    # Parquet stores epoch time, the local offset at the start of the range is widened by an hour for daylight saving
+    offset_ns = int(np.asarray(epoch_ns_to_local(np.array([start_ns]), precision_ns = 1), dtype = "datetime64[ns]").view(np.int64)[0]) - start_ns
+    batches = iter_raw_batches(
+        raw_filename,
+        columns = ["time_ns", "id", "value", "value_str"],
+        start_ns = start_ns - offset_ns - NANOSECONDS_PER_HOUR,
+        end_ns = end_ns - offset_ns + NANOSECONDS_PER_HOUR,
+        ids = ids,
+    )
+    for batch in batches:
+        time_ns = np.asarray(epoch_ns_to_local(batch.column("time_ns").to_numpy(), precision_ns = 1), dtype = "datetime64[ns]").view(np.int64)
+        strings = batch.column("value_str").to_numpy(zero_copy_only = False)
+        values = batch.column("value").to_numpy(zero_copy_only = False)
+        if not all(string is None for string in strings):
+            values = np.where(pd.isna(strings), values.astype(object), strings)
+        yield (time_ns, np.asarray(batch.column("id").to_pylist(), dtype = object), values)
+
+
+def iter_extract(
+        raw_filename: str,
+        start_ns: int,
+        end_ns: int,
+        ids: Iterable[str] | None = None,
+        chunk_rows: int = 100_000,
+    ) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    (time_ns, ids, values) arrays of the rows of a raw file in [start_ns, end_ns).
+
+    Times are naive local nanoseconds. A csv file is only read in the flushes
+    its block index places in the range and holding one of `ids`, parquet
+    files skip row groups on their statistics.
+    """
+    ids = None if ids is None else list(dict.fromkeys(ids))
+    if raw_filename.endswith(PARQUET_EXTENSION):
+        chunks = iter_parquet_range(raw_filename, start_ns, end_ns, ids)
+    else:
+        chunks = (
+            chunk
+            for (start, end) in byte_ranges(raw_filename, start_ns, end_ns, ids)
+            for chunk in iter_csv_range(raw_filename, start, end, chunk_rows)
+        )
+    for (time_ns, row_ids, values) in chunks:
+        mask = (time_ns >= start_ns) & (time_ns < end_ns)
+        if ids is not None:
+            mask &= pd.Series(row_ids).isin(ids).to_numpy()
+        if mask.any():
+            yield (time_ns[mask], row_ids[mask], values[mask])
+
+
+def extract(
+        raw_filenames: str | list[str],
+        start: str | datetime | pd.Timestamp,
+        end: str | datetime | pd.Timestamp,
+        ids: Iterable[str] | None = None,
+        resample_seconds: int | float | None = None,
+        chunk_rows: int = 100_000,
+        aggregations: dict[str, list[str]] | None = None,
+    ) -> pd.DataFrame:
+    """
+    Rows of the raw files between `start` (included) and `end` (excluded).
+
+    Without `resample_seconds` the rows come back in long form with time, id
+    and value columns, in the order they were written. Otherwise they are
+    resampled the same way as end of day, one column per id, or one per
+    aggregate for ids matching a pattern of `aggregations`.
+    """
+    if isinstance(raw_filenames, str):
+        raw_filenames = [raw_filenames]
+    ids = None if ids is None else list(dict.fromkeys(ids))
+    (start_ns, end_ns) = (to_local_ns(start), to_local_ns(end))
+    chunks = (
+        chunk
+        for raw_filename in raw_filenames
+        for chunk in iter_extract(raw_filename, start_ns, end_ns, ids, chunk_rows)
+    )
+    if resample_seconds is not None:
+        resampler = StreamingResampler(resample_seconds, aggregations = aggregations)
+        for (time_ns, row_ids, values) in chunks:
+            resampler.accumulate_ns(time_ns, row_ids, values)
+        df = resampler.finish()
+        if ids is not None:
+            df = df.reindex(columns = [column for column in resampler.output_columns(ids) if column in df.columns])
+        return df
+
+    frames = [
+        pd.DataFrame({"time": time_ns.view("datetime64[ns]"), "id": row_ids, "value": values})
+        for (time_ns, row_ids, values) in chunks
+    ]
+    if not frames:
+        return pd.DataFrame({
+            "time": np.array([], dtype = "datetime64[ns]"),
+            "id": np.array([], dtype = object),
+            "value": np.array([], dtype = object)
+        })
+    return pd.concat(frames, ignore_index = True)
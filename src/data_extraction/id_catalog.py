@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Per day catalog of the ids written to a raw file"""
+# ---------------------------------------------------------------------------
+from typing import Iterable
+import logging
+import os
+
+logger = logging.getLogger("data_extraction")
+
+CATALOG_EXTENSION = ".ids"
+RAW_EXTENSIONS = (".gz", ".xz", ".csv", ".parquet")
+
+
+def raw_stem(raw_filename: str) -> str:
+    """20240613-raw.csv.gz -> 20240613-raw, the name sidecar files of a raw file share"""
+    stem = raw_filename
+    for extension in RAW_EXTENSIONS:
+        if stem.endswith(extension):
+            stem = stem[:-len(extension)]
+    return stem
+
+
+def catalog_filename(raw_filename: str) -> str:
+    """20240613-raw.csv.gz -> 20240613-raw.ids"""
+    return raw_stem(raw_filename) + CATALOG_EXTENSION
+
+
+def read_id_catalog(raw_filename: str) -> list[str] | None:
+    """Ids in the order they were first written, None if the day has no catalog."""
+    filename = catalog_filename(raw_filename)
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "r", encoding = "utf-8") as file:
+        return list(dict.fromkeys(line.rstrip("\n") for line in file if line.strip()))
+
+
+class IdCatalog():
+    """
+    Ordered set of the ids seen in the current day's raw file.
+
+    New ids are appended to the catalog file before the rows that carry
+    them are written, so the catalog is always a superset of the ids in the
+    raw file and end of day knows its columns without scanning the data.
+    """
+
+    def __init__(self):
+        self.raw_filename: str | None = None
+        # Id to its position in the catalog
+        self.ids: dict[str, int] = {}
+
+
+    def _switch(self, raw_filename: str) -> None:
+        # Picks up an existing catalog when restarted in the middle of a day
+        self.raw_filename = raw_filename
+        self.ids = {field_id: position for (position, field_id) in enumerate(read_id_catalog(raw_filename) or [])}
+
+
+    def update(self, raw_filename: str, ids: Iterable[str]) -> list[str]:
+        if raw_filename != self.raw_filename:
+            self._switch(raw_filename)
+        new_ids = [field_id for field_id in dict.fromkeys(ids) if field_id not in self.ids]
+        if not new_ids:
+            return new_ids
+        try:
+            with open(catalog_filename(raw_filename), "a", encoding = "utf-8") as file:
+                file.write("".join(f"{field_id}\n" for field_id in new_ids))
+        except OSError as error:
+            logger.error(f"Failed to update id catalog of {raw_filename}: {error}")
+            return []
+        self.ids.update((field_id, position) for (position, field_id) in enumerate(new_ids, start = len(self.ids)))
+        return new_ids
+
+
+    def positions(self, raw_filename: str, ids: Iterable[str]) -> list[int] | None:
+        """Catalog positions of `ids`, None if one of them is not in the catalog of `raw_filename`."""
+        if raw_filename != self.raw_filename:
+            return None
+        try:
+            return sorted({self.ids[field_id] for field_id in ids})
+        except KeyError:
+            return None
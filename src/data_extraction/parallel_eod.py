@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""End of day resampling of a raw file split across a process pool"""
+# ---------------------------------------------------------------------------
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+import csv
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from data_extraction.eod import (
+    StreamingResampler, PartialAggregates, bucket_date_format, bucket_origin_ns, parse_raw_line, raw_time_index, times_to_ns
+)
+from data_extraction.raw_parquet import (pq, raw_row_groups, PARQUET_EXTENSION)
+from data_extraction.raw_scanner import (RawCsvScanner, can_scan)
+from data_extraction.timestamps import epoch_ns_to_local
+
+logger = logging.getLogger("data_extraction")
+
+PART_EXTENSION = ".part"
+
+
+@dataclass
+class PartitionTask():
+    """One worker's share of a raw file, a byte range of a csv or a run of parquet row groups."""
+    raw_filename: str
+    part_filename: str
+    resample_seconds: int | float
+    origin_ns: int
+    id_list: list[str]
+    chunk_rows: int
+    byte_range: tuple[int, int] | None = None
+    time_index: int | None = None
+    row_groups: list[tuple[str, int]] | None = None
+    string_ids: list[str] | None = None
+    aggregations: dict[str, list[str]] | None = None
+
+
+@dataclass
+class PartitionResult():
+    """
+    What a worker hands back for merging.
+
+    Buckets strictly between the partition's first and last bucket are
+    complete and already written to `part_filename` with `columns` as the
+    header. The first and last bucket may share rows with the neighbouring
+    partitions, they come back as open aggregates.
+    """
+    part_filename: str
+    ids: list[str]
+    columns: list[str]
+    uniform: bool
+    rows: int
+    late_rows: int
+    first_bucket: int | None
+    last_bucket: int | None
+    leading: PartialAggregates | None
+    trailing: PartialAggregates | None
+
+
+def parallel_supported(raw_filename: str) -> bool:
+    """Uncompressed csv can be split on line boundaries and parquet on row groups, compressed csv can not."""
+    if raw_filename.endswith(PARQUET_EXTENSION):
+        return pq is not None
+    return can_scan(raw_filename)
+
+
+def csv_byte_ranges(filename: str, partitions: int) -> list[tuple[int, int]]:
+    """Splits the rows of a raw csv into byte ranges of about equal size, each starting at a line."""
+    size = os.path.getsize(filename)
+    with open(filename, "rb") as file:
+        file.readline()
+        boundaries = [file.tell()]
+        for index in range(1, partitions):
+            target = boundaries[0] + (size - boundaries[0]) * index // partitions
+            # Reading the rest of the line from one byte early keeps a range that already starts at a line
+            file.seek(max(target - 1, boundaries[-1]))
+            file.readline()
+            boundaries.append(max(file.tell(), boundaries[-1]))
+        boundaries.append(size)
+    return [(start, end) for (start, end) in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def split_row_groups(row_groups: list[tuple[str, int]], partitions: int) -> list[list[tuple[str, int]]]:
+    """Contiguous runs of row groups, so every partition holds consecutive flushes."""
+    bounds = [len(row_groups) * index // partitions for index in range(partitions + 1)]
+    return [row_groups[start:end] for (start, end) in zip(bounds, bounds[1:]) if end > start]
+
+
+def feed_partition(task: PartitionTask, resampler: StreamingResampler):
+    """Adds a partition's rows to `resampler` a chunk at a time, yielding the rows added by each chunk."""
+    if task.row_groups is None:
+        scanner = RawCsvScanner(task.raw_filename, block_rows = task.chunk_rows, start = task.byte_range[0], end = task.byte_range[1])
+        for block in scanner:
+            resampler.accumulate_codes(block.time_ns, block.id_codes, scanner.ids, block.values)
+            yield len(block)
+        return
+    for (part, index) in task.row_groups:
+        table = pq.ParquetFile(part).read_row_group(index, columns = ["time_ns", "id", "value", "value_str"])
+        for batch in table.to_batches(max_chunksize = task.chunk_rows):
+            local_time = epoch_ns_to_local(batch.column("time_ns").to_numpy(), precision_ns = 1)
+            values = [
+                row_value if row_string is None else row_string
+                for (row_value, row_string) in zip(batch.column("value").to_pylist(), batch.column("value_str").to_pylist())
+            ]
+            resampler.accumulate_ns(np.asarray(local_time, dtype = "datetime64[ns]").view(np.int64), batch.column("id").to_pylist(), values)
+            yield len(batch)
+
+
+def aggregate_partition(task: PartitionTask) -> PartitionResult:
+    """Worker entry point, resamples one partition and writes its complete buckets to a part file."""
+    resampler = StreamingResampler(
+        task.resample_seconds, origin_ns = task.origin_ns, string_ids = task.string_ids, aggregations = task.aggregations
+    )
+    columns = dict.fromkeys(task.id_list)
+    date_format = bucket_date_format(task.resample_seconds)
+    leading = None
+    (rows, uniform, written) = (0, True, False)
+    with open(task.part_filename, "w", newline = "") as part:
+        for chunk_rows in feed_partition(task, resampler):
+            rows += chunk_rows
+            if (leading is None) and (resampler.newest_bucket > resampler.first_bucket):
+                leading = resampler.take_partial(resampler.first_bucket + 1)
+            if leading is None:
+                continue
+            df = resampler.emit_closed()
+            if df.empty:
+                continue
+            new_ids = [field_id for field_id in resampler.ids if field_id not in columns]
+            if new_ids:
+                columns.update(dict.fromkeys(new_ids))
+                uniform = uniform and not written
+            df.reindex(columns = resampler.output_columns(columns)).to_csv(part, header = False, date_format = date_format)
+            written = True
+
+    if leading is None:
+        (leading, trailing) = ((resampler.take_partial() if rows else None), None)
+    else:
+        trailing = resampler.take_partial()
+    return PartitionResult(
+        task.part_filename, list(resampler.ids), resampler.output_columns(columns), uniform, rows, resampler.late_rows,
+        resampler.first_bucket, resampler.newest_bucket, leading, trailing
+    )
+
+
+def partition_tasks(
+        raw_filename: str,
+        processed_filename: str,
+        resample_seconds: int | float,
+        partitions: int,
+        id_list: list[str],
+        chunk_rows: int,
+        string_ids: list[str] | None = None,
+        aggregations: dict[str, list[str]] | None = None,
+    ) -> list[PartitionTask]:
+    """
+    Splits a raw file into tasks sharing the bucket origin of its first row.
+
+    Returns no tasks for a file without rows.
+    """
+    if raw_filename.endswith(PARQUET_EXTENSION):
+        row_groups = raw_row_groups(raw_filename)
+        if not row_groups:
+            return []
+        (part, index) = row_groups[0]
+        first_ns = pq.ParquetFile(part).read_row_group(index, columns = ["time_ns"]).column("time_ns").to_numpy()
+        origin_ns = bucket_origin_ns(np.asarray(epoch_ns_to_local(first_ns, precision_ns = 1), dtype = "datetime64[ns]").view(np.int64))
+        shares = [{"row_groups": share} for share in split_row_groups(row_groups, partitions)]
+    else:
+        with open(raw_filename, "r") as file:
+            time_index = raw_time_index(file.readline().rstrip().split(","))
+            first_line = file.readline()
+        if not first_line:
+            return []
+        origin_ns = bucket_origin_ns(times_to_ns([parse_raw_line(first_line, time_index)[0]]))
+        shares = [
+            {"byte_range": byte_range, "time_index": time_index}
+            for byte_range in csv_byte_ranges(raw_filename, partitions)
+        ]
+    return [
+        PartitionTask(
+            raw_filename, f"{processed_filename}{PART_EXTENSION}{index}", resample_seconds, origin_ns,
+            list(id_list), chunk_rows, string_ids = string_ids, aggregations = aggregations, **share
+        )
+        for (index, share) in enumerate(shares)
+    ]
+
+
+def append_part(result: PartitionResult, id_list: list[str], processed_filename: str) -> None:
+    """Appends a worker's rows, as they are when its columns match, realigned to `id_list` otherwise."""
+    if result.uniform and (result.columns == id_list):
+        with open(result.part_filename, "rb") as source, open(processed_filename, "ab") as target:
+            shutil.copyfileobj(source, target)
+        return
+    position = {field_id: index for (index, field_id) in enumerate(id_list, start = 1)}
+    positions = [position[field_id] for field_id in result.columns]
+    with open(result.part_filename, "r", newline = "") as source, open(processed_filename, "a", newline = "") as target:
+        writer = csv.writer(target, lineterminator = os.linesep)
+        for row in csv.reader(source):
+            aligned = [row[0]] + [""] * len(id_list)
+            for (index, field) in zip(positions, row[1:]):
+                aligned[index] = field
+            writer.writerow(aligned)
+
+
+def write_header(processed_filename: str, id_list: list[str]) -> None:
+    with open(processed_filename, "w", newline = "") as file:
+        csv.writer(file, lineterminator = os.linesep).writerow(["time"] + id_list)
+
+
+def merge_partitions(
+        results: list[PartitionResult],
+        processed_filename: str,
+        resample_seconds: int | float,
+        origin_ns: int,
+        id_list: list[str],
+        write_function: Callable[[pd.DataFrame, list[str], str, int | None], int | None],
+        string_ids: list[str] | None = None,
+        aggregations: dict[str, list[str]] | None = None,
+    ) -> None:
+    """
+    Writes the partitions in file order, finishing the buckets they share.
+
+    The columns of every partition are known before the first row is
+    written, so the header is written once with all of them.
+    """
+    columns = dict.fromkeys(id_list)
+    for result in results:
+        columns.update(dict.fromkeys(result.ids))
+    resampler = StreamingResampler(resample_seconds, origin_ns = origin_ns, string_ids = string_ids, aggregations = aggregations)
+    id_list = resampler.output_columns(columns)
+    written_columns = None
+    for result in results:
+        if result.leading is None:
+            continue
+        written_columns = write_function(resampler.emit_before(result.first_bucket), id_list, processed_filename, written_columns)
+        resampler.merge_partial(result.leading)
+        if result.last_bucket == result.first_bucket:
+            # The next partition may still add rows to this bucket
+            continue
+        written_columns = write_function(resampler.emit_before(result.first_bucket + 1), id_list, processed_filename, written_columns)
+        if os.path.getsize(result.part_filename):
+            if (written_columns is None) and not os.path.exists(processed_filename):
+                write_header(processed_filename, id_list)
+                written_columns = len(id_list)
+            append_part(result, id_list, processed_filename)
+        resampler.merge_partial(result.trailing)
+    write_function(resampler.finish(), id_list, processed_filename, written_columns)
+
+
+def process_day_parallel(
+        raw_filename: str,
+        processed_filename: str,
+        resample_seconds: int | float,
+        workers: int,
+        write_function: Callable[[pd.DataFrame, list[str], str, int | None], int | None],
+        id_list: list[str] | None = None,
+        chunk_rows: int = 100_000,
+        string_ids: list[str] | None = None,
+        aggregations: dict[str, list[str]] | None = None,
+    ) -> int:
+    """
+    Resamples a raw file with one process per partition and returns the number of rows read.
+
+    Partitions are contiguous stretches of a time ordered file. Every worker
+    streams its stretch through a StreamingResampler, so memory per worker
+    is bounded the same way as the serial end of day, and the parent only
+    merges the buckets at the partition edges. An id whose values switch
+    between numbers and strings is typed per partition unless it is one of
+    `string_ids`, so end of day only takes this path for days with a type
+    registry and otherwise the output matches the serial pass. With a
+    resample_time below a second, buckets on whole seconds may be written
+    with or without fractional digits, as the serial pass already does
+    depending on its chunks.
+    """
+    tasks = partition_tasks(raw_filename, processed_filename, resample_seconds, workers, id_list or [], chunk_rows, string_ids, aggregations)
+    if not tasks:
+        logger.info(f"{raw_filename} has no rows. No data to process.")
+        return 0
+    # Imported here, eod_process imports this module
+    from data_extraction.eod_process import spawn_context
+    try:
+        with ProcessPoolExecutor(max_workers = len(tasks), mp_context = spawn_context()) as executor:
+            results = list(executor.map(aggregate_partition, tasks))
+        merge_partitions(
+            results, processed_filename, resample_seconds, tasks[0].origin_ns, id_list or [], write_function, string_ids, aggregations
+        )
+    finally:
+        for task in tasks:
+            if os.path.exists(task.part_filename):
+                os.remove(task.part_filename)
+    rows = sum(result.rows for result in results)
+    late_rows = sum(result.late_rows for result in results)
+    if late_rows:
+        logger.warning(f"{late_rows} rows of {raw_filename} were older than buckets already written")
+    logger.info(f"Processed {rows} rows of {raw_filename} in {len(tasks)} partitions")
+    return rows
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Bounded message queue between the MQTT network thread and the parse worker"""
+# ---------------------------------------------------------------------------
+from collections import deque
+from threading import (Condition, Lock)
+import time
+
+BLOCK = "block"
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+OVERFLOW_POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST)
+
+
+class MessageQueue():
+    """
+    Bounded FIFO of raw (receive_ns, topic, payload) messages.
+
+    The network thread only puts messages, the parse worker takes them out in
+    batches. When the queue is full the overflow policy decides whether the
+    producer blocks, the new message is dropped or the oldest message is
+    dropped to make room.
+    """
+
+    def __init__(self, maxsize: int = 100_000, overflow_policy: str = DROP_OLDEST):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize needs to be a positive integer.")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy needs to be one of {OVERFLOW_POLICIES}.")
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        self._items: deque = deque()
+        lock = Lock()
+        self._not_empty = Condition(lock)
+        self._not_full = Condition(lock)
+
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+    def put(self, item, timeout: float | None = None) -> bool:
+        with self._not_full:
+            if len(self._items) >= self.maxsize:
+                if self.overflow_policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif self.overflow_policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while len(self._items) >= self.maxsize:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if (remaining is not None) and (remaining <= 0):
+                            self.dropped += 1
+                            return False
+                        self._not_full.wait(remaining)
+            self._items.append(item)
+            self._not_empty.notify()
+        return True
+
+
+    def get_batch(self, max_items: int, timeout: float | None = None) -> list:
+        with self._not_empty:
+            if not self._items:
+                self._not_empty.wait(timeout)
+            count = min(max_items, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            if count:
+                self._not_full.notify_all()
+        return batch
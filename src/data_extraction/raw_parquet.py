@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Parquet raw output with one row group per buffer flush"""
+# ---------------------------------------------------------------------------
+from datetime import datetime
+from threading import Lock
+import glob
+import logging
+import os
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency, install with the "parquet" extra
+    pa = ds = pq = None
+
+logger = logging.getLogger("data_extraction")
+
+PARQUET_EXTENSION = ".parquet"
+RAW_COLUMNS = ["time_ns", "topic", "id", "value", "value_str"]
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("The parquet raw format needs pyarrow. Install data_extraction[parquet].")
+
+
+def raw_schema():
+    require_pyarrow()
+    return pa.schema([
+        ("time_ns", pa.int64()),
+        ("topic", pa.dictionary(pa.int32(), pa.string())),
+        ("id", pa.dictionary(pa.int32(), pa.string())),
+        ("value", pa.float64()),
+        ("value_str", pa.string()),
+    ])
+
+
+def raw_parquet_files(filename: str) -> list[str]:
+    """All parts of a day's parquet file, in the order they were written."""
+    (stem, _) = os.path.splitext(filename)
+    parts = sorted(
+        glob.glob(glob.escape(stem) + ".part*" + PARQUET_EXTENSION),
+        key = lambda part: int(part[len(stem) + len(".part"):-len(PARQUET_EXTENSION)])
+    )
+    return ([filename] if os.path.exists(filename) else []) + parts
+
+
+def _string_values(values: list) -> tuple[np.ndarray, list]:
+    """Splits values into a float column and a nullable string column."""
+    floats = np.full(len(values), np.nan, dtype = np.float64)
+    strings = [None] * len(values)
+    for (index, value) in enumerate(values):
+        if type(value) is float:
+            floats[index] = value
+        else:
+            strings[index] = str(value)
+    return (floats, strings)
+
+
+def batch_to_table(batch):
+    """Converts a ColumnarBuffer batch into an arrow table, reusing its interned codes."""
+    require_pyarrow()
+    value_mask = np.zeros(len(batch), dtype = bool)
+    strings = [None] * len(batch)
+    for (row, value) in batch.objects.items():
+        value_mask[row] = True
+        strings[row] = str(value)
+    return pa.Table.from_arrays(
+        [
+            pa.array(batch.time_ns, type = pa.int64()),
+            pa.DictionaryArray.from_arrays(pa.array(batch.topic_codes, type = pa.int32()), pa.array(batch.topics[:], type = pa.string())),
+            pa.DictionaryArray.from_arrays(pa.array(batch.id_codes, type = pa.int32()), pa.array(batch.ids[:], type = pa.string())),
+            pa.array(batch.values, type = pa.float64(), mask = value_mask),
+            pa.array(strings, type = pa.string()),
+        ],
+        schema = raw_schema()
+    )
+
+
+def rows_to_table(rows: list[dict]):
+    """Converts a list Buffer dump into an arrow table."""
+    require_pyarrow()
+    times = [row["time"] for row in rows]
+    if times and isinstance(times[0], datetime):
+        # Naive datetimes are local time, same as datetime.now()
+        time_ns = np.array([round(row_time.timestamp() * 1e6) * 1_000 for row_time in times], dtype = np.int64)
+    else:
+        time_ns = np.array(times, dtype = np.int64)
+    (floats, strings) = _string_values([row["value"] for row in rows])
+    return pa.Table.from_arrays(
+        [
+            pa.array(time_ns, type = pa.int64()),
+            pa.array([row["topic"] for row in rows], type = pa.string()).dictionary_encode(),
+            pa.array([row["id"] for row in rows], type = pa.string()).dictionary_encode(),
+            pa.array(floats, type = pa.float64(), mask = np.array([value is not None for value in strings], dtype = bool)),
+            pa.array(strings, type = pa.string()),
+        ],
+        schema = raw_schema()
+    )
+
+
+class ParquetRawWriter():
+    """
+    Appends one row group per flush to the day's parquet file.
+
+    A parquet file is only readable once its footer is written, so the
+    writer is closed at day rollover and on stop, and rotates to a new part
+    file every `row_groups_per_file` flushes to bound what a crash can cost.
+    Parts are named <day file>.part<n>.parquet and read back together.
+    """
+
+    def __init__(self, row_groups_per_file: int = 360, compression: str = "zstd"):
+        require_pyarrow()
+        self.row_groups_per_file = row_groups_per_file
+        self.compression = compression
+        self.filename: str | None = None
+        self.path: str | None = None
+        self._writer = None
+        self._row_groups = 0
+        self._lock = Lock()
+
+
+    def _next_path(self, filename: str) -> str:
+        if not os.path.exists(filename):
+            return filename
+        (stem, _) = os.path.splitext(filename)
+        part = len(raw_parquet_files(filename))
+        while os.path.exists(f"{stem}.part{part}{PARQUET_EXTENSION}"):
+            part += 1
+        return f"{stem}.part{part}{PARQUET_EXTENSION}"
+
+
+    def _open(self, filename: str) -> None:
+        self._close()
+        self.path = self._next_path(filename)
+        self.filename = filename
+        self._writer = pq.ParquetWriter(
+            self.path,
+            raw_schema(),
+            compression = self.compression,
+            use_dictionary = ["topic", "id", "value_str"],
+        )
+        self._row_groups = 0
+
+
+    def write(self, filename: str, table) -> None:
+        with self._lock:
+            if (self._writer is None) or (filename != self.filename) or (self._row_groups >= self.row_groups_per_file):
+                self._open(filename)
+            self._writer.write_table(table, row_group_size = max(1, table.num_rows))
+            self._row_groups += 1
+
+
+    def close_file(self, filename: str) -> None:
+        """Writes the footer of `filename` if it is the file currently open, so it can be read."""
+        with self._lock:
+            if filename == self.filename:
+                self._close()
+
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+    def _close(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        self.filename = None
+        self.path = None
+
+
+def readable_raw_parts(filename: str) -> list[tuple[str, int]]:
+    """(part, row group count) of the parts of a day's parquet file that have a footer."""
+    require_pyarrow()
+    parts = []
+    for part in raw_parquet_files(filename):
+        try:
+            metadata = pq.read_metadata(part)
+        except (pa.ArrowInvalid, OSError) as error:
+            logger.error(f"Skipping unreadable parquet part {part}: {error}")
+            continue
+        parts.append((part, metadata.num_row_groups))
+    return parts
+
+
+def raw_row_groups(filename: str) -> list[tuple[str, int]]:
+    """Every (part, row group) of a day's parquet file, one per buffer flush, in the order they were written."""
+    return [(part, index) for (part, count) in readable_raw_parts(filename) for index in range(count)]
+
+
+def open_raw_dataset(filename: str):
+    """Dataset over the readable parts of a day's parquet file, skipping parts without a footer."""
+    files = [part for (part, _) in readable_raw_parts(filename)]
+    if not files:
+        return None
+    return ds.dataset(files, schema = raw_schema(), format = "parquet")
+
+
+def raw_filter(start_ns: int | None = None, end_ns: int | None = None, ids: list[str] | None = None):
+    require_pyarrow()
+    expression = None
+    conditions = []
+    if start_ns is not None:
+        conditions.append(ds.field("time_ns") >= start_ns)
+    if end_ns is not None:
+        conditions.append(ds.field("time_ns") < end_ns)
+    if ids is not None:
+        conditions.append(ds.field("id").cast(pa.string()).isin(ids))
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def iter_raw_batches(
+        filename: str,
+        columns: list[str] | None = None,
+        start_ns: int | None = None,
+        end_ns: int | None = None,
+        ids: list[str] | None = None,
+    ):
+    """Yields record batches with column and predicate pushdown."""
+    dataset = open_raw_dataset(filename)
+    if dataset is None:
+        return
+    yield from dataset.to_batches(columns = columns, filter = raw_filter(start_ns, end_ns, ids))
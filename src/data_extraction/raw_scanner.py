@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Memory mapped scanning of uncompressed raw csv files into NumPy blocks"""
+# ---------------------------------------------------------------------------
+from dataclasses import dataclass
+import io
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_extraction.compression import (compression_from_filename, COMPRESSION_NONE)
+from data_extraction.eod import (raw_time_index, times_to_ns)
+from data_extraction.raw_parquet import (pa, PARQUET_EXTENSION)
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # Optional dependency, blocks are parsed with pandas without it
+    pc = pa_csv = None
+
+NEWLINE = ord("\n")
+INITIAL_WINDOW_BYTES = 1 << 20
+# Plain decimal and exponent notation, Arrow converts these exactly like float()
+FLOAT_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+
+def can_scan(raw_filename: str) -> bool:
+    """Only uncompressed csv files can be mapped and split on newlines."""
+    if raw_filename.endswith(PARQUET_EXTENSION):
+        return False
+    return compression_from_filename(raw_filename) == COMPRESSION_NONE
+
+
+@dataclass
+class RawBlock():
+    """Rows of one block, ids as codes into the scanner's `ids`."""
+    time_ns: np.ndarray
+    id_codes: np.ndarray
+    values: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.time_ns)
+
+
+def empty_block() -> RawBlock:
+    return RawBlock(np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64), np.zeros(0))
+
+
+def newline_blocks(buffer: np.ndarray, start: int, end: int, block_rows: int):
+    """
+    Yields (start, end) byte ranges of `block_rows` whole lines.
+
+    Newlines are found with a vectorized search over a window that grows
+    until it holds a full block, so no byte is looked at by Python code.
+    """
+    window = INITIAL_WINDOW_BYTES
+    position = start
+    while position < end:
+        stop = min(end, position + window)
+        newlines = np.flatnonzero(buffer[position:stop] == NEWLINE)
+        if len(newlines) >= block_rows:
+            block_end = position + int(newlines[block_rows - 1]) + 1
+        elif stop == end:
+            block_end = end
+        else:
+            window *= 2
+            continue
+        yield (position, block_end)
+        position = block_end
+
+
+def parse_value(text: str) -> float | str:
+    try:
+        return float(text)
+    except ValueError:
+        return text.rstrip()
+
+
+def parse_values(column: np.ndarray) -> np.ndarray:
+    """
+    Raw value strings as float64, or as objects mixing floats and strings.
+
+    Numbers are converted with float() semantics, so they round trip the
+    same as the line by line reader. Anything float() rejects is kept as a
+    stripped string.
+    """
+    try:
+        return column.astype(np.float64)
+    except ValueError:
+        pass
+    # Only values pandas can not read as numbers need a second look
+    maybe_strings = np.isnan(pd.to_numeric(column, errors = "coerce"))
+    values = np.empty(len(column), dtype = object)
+    values[~maybe_strings] = column[~maybe_strings].astype(np.float64).astype(object)
+    for index in np.flatnonzero(maybe_strings):
+        values[index] = parse_value(column[index])
+    return values
+
+
+def parse_arrow_values(column) -> np.ndarray:
+    """
+    parse_values() for an Arrow string column.
+
+    Plain numbers are cast by Arrow. Everything else, mostly a few distinct
+    states like "ON", goes through parse_value() once per distinct text.
+    """
+    numeric = pc.match_substring_regex(column, FLOAT_PATTERN)
+    if pc.all(numeric).as_py() is not False:
+        return pc.cast(column, pa.float64()).to_numpy()
+    others = column.filter(pc.invert(numeric)).combine_chunks().dictionary_encode()
+    converted = np.array([parse_value(text) for text in others.dictionary.to_pylist()], dtype = object)
+    mask = numeric.to_numpy()
+    values = np.empty(len(column), dtype = object)
+    values[mask] = pc.cast(column.filter(numeric), pa.float64()).to_numpy().astype(object)
+    values[~mask] = converted[others.indices.to_numpy()]
+    return values
+
+
+class RawCsvScanner():
+    """
+    Reads an uncompressed raw csv in blocks of `block_rows` lines.
+
+    The file is memory mapped and every block is parsed in one call to the
+    Arrow csv reader, or to the pandas C reader without pyarrow, yielding
+    arrays of times, id codes and values instead of a tuple per row. Ids are interned across blocks into `ids`, in the
+    order they first appear. `start` and `end` restrict the scan to a byte
+    range that begins at a line, the header is always read from the top.
+    """
+
+    def __init__(self, filename: str, block_rows: int = 100_000, start: int | None = None, end: int | None = None):
+        self.filename = filename
+        self.block_rows = block_rows
+        self.start = start
+        self.end = end
+        self.ids: list[str] = []
+        self._codes: dict[str, int] = {}
+
+
+    def _intern(self, labels) -> np.ndarray:
+        label_codes = np.empty(len(labels), dtype = np.int64)
+        for (index, label) in enumerate(labels):
+            code = self._codes.get(label)
+            if code is None:
+                code = len(self.ids)
+                self.ids.append(label)
+                self._codes[label] = code
+            label_codes[index] = code
+        return label_codes
+
+
+    def parse(self, data: bytes, time_index: int | None) -> RawBlock:
+        if not data.strip():
+            return empty_block()
+        if pa_csv is not None:
+            return self.parse_arrow(data, time_index)
+        return self.parse_pandas(data, time_index)
+
+
+    def parse_arrow(self, data: bytes, time_index: int | None) -> RawBlock:
+        time_column = f"f{0 if time_index is None else time_index}"
+        table = pa_csv.read_csv(
+            pa.py_buffer(data),
+            read_options = pa_csv.ReadOptions(autogenerate_column_names = True),
+            convert_options = pa_csv.ConvertOptions(
+                include_columns = [time_column, "f2", "f3"],
+                column_types = {time_column: pa.string() if time_index is None else pa.int64(), "f2": pa.string(), "f3": pa.string()},
+                strings_can_be_null = False,
+                quoted_strings_can_be_null = False,
+            ),
+        )
+        times = table.column(time_column)
+        if time_index is None:
+            try:
+                time_ns = pc.cast(times, pa.timestamp("ns")).to_numpy().view(np.int64)
+            except pa.ArrowInvalid:
+                # Formats Arrow does not know are left to pandas
+                time_ns = times_to_ns(times.to_numpy())
+        else:
+            time_ns = times_to_ns(times.to_numpy())
+        ids = table.column("f2").combine_chunks().dictionary_encode()
+        return RawBlock(
+            time_ns,
+            self._intern(ids.dictionary.to_pylist())[ids.indices.to_numpy()],
+            parse_arrow_values(table.column("f3")),
+        )
+
+
+    def parse_pandas(self, data: bytes, time_index: int | None) -> RawBlock:
+        time_column = 0 if time_index is None else time_index
+        try:
+            df = pd.read_csv(
+                io.BytesIO(data),
+                header = None,
+                usecols = [time_column, 2, 3],
+                dtype = {time_column: str if time_index is None else np.int64, 2: str, 3: str},
+                na_filter = False,
+                engine = "c",
+            )
+        except pd.errors.EmptyDataError:
+            return empty_block()
+        (block_codes, labels) = pd.factorize(df[2])
+        return RawBlock(
+            times_to_ns(df[time_column]),
+            self._intern(labels)[block_codes],
+            parse_values(df[3].to_numpy(dtype = object)),
+        )
+
+
+    def __iter__(self):
+        with open(self.filename, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+                header_end = mapped.find(b"\n") + 1 or size
+                time_index = raw_time_index(mapped[:header_end].decode().rstrip().split(","))
+                start = header_end if self.start is None else max(self.start, header_end)
+                end = size if self.end is None else min(self.end, size)
+                buffer = np.frombuffer(mapped, dtype = np.uint8)
+                try:
+                    for (block_start, block_end) in newline_blocks(buffer, start, end, self.block_rows):
+                        yield self.parse(mapped[block_start:block_end], time_index)
+                finally:
+                    # The map can only be closed once no array points into it
+                    del buffer
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Overflow of the ingest buffer into segment files on local disk"""
+# ---------------------------------------------------------------------------
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock
+import logging
+import os
+
+from data_extraction.pipeline import (DROP_NEWEST, DROP_OLDEST)
+from data_extraction.wal import (encode_record, next_sequence, remove_segments, segment_files)
+
+logger = logging.getLogger("data_extraction")
+
+SPILL_EXTENSION = ".spill"
+SPILL_DROP_POLICIES = (DROP_NEWEST, DROP_OLDEST)
+
+
+@dataclass
+class SpillSegment():
+    """A spill file with the bytes, rows and first receive time of the records in it."""
+    filename: str
+    size: int = 0
+    rows: int = 0
+    first_ns: int | None = None
+
+
+class SpillQueue():
+    """
+    Rows that did not fit the ingest buffer, kept in order in segment files.
+
+    append() writes rows as one write-ahead log record to the open segment,
+    which is sealed once it holds `segment_bytes`. pop() hands out the
+    oldest segment, sealing the open one when nothing else is left, and
+    release() deletes it once its rows are in the raw file.
+
+    Segments count against `budget_bytes` until they are released. Rows
+    that would go over it are handled by `drop_policy`: drop_newest drops
+    the rows being spilled, drop_oldest deletes the oldest segments not
+    handed out yet to make room. Dropped rows are counted in `rows_dropped`.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            name: str,
+            budget_bytes: int,
+            drop_policy: str = DROP_NEWEST,
+            segment_bytes: int = 4*1024*1024,
+        ):
+        if drop_policy not in SPILL_DROP_POLICIES:
+            raise ValueError(f"drop_policy needs to be one of {SPILL_DROP_POLICIES}.")
+        self.directory = directory
+        self.name = name
+        self.budget_bytes = budget_bytes
+        self.drop_policy = drop_policy
+        self.segment_bytes = segment_bytes
+        self.pending_bytes = 0
+        self.rows_spilled = 0
+        self.rows_dropped = 0
+        # Rows are dropped until one fits the budget again, warned about once per episode
+        self._dropping = False
+        self._next_sequence = next_sequence(directory, name, SPILL_EXTENSION)
+        self._sealed: deque[SpillSegment] = deque()
+        # Segments handed out by pop() that are not released yet
+        self._taken: list[SpillSegment] = []
+        self._segment: SpillSegment | None = None
+        self._file = None
+        self._lock = Lock()
+
+
+    def pending_segments(self) -> list[str]:
+        """Spill files in the directory, oldest first, on startup the ones a previous run left behind."""
+        return segment_files(self.directory, self.name, SPILL_EXTENSION)
+
+
+    def not_empty(self) -> bool:
+        """Whether there are spilled rows pop() has not handed out yet."""
+        with self._lock:
+            return bool(self._sealed) or (self._segment is not None)
+
+
+    def segment_count(self) -> int:
+        with self._lock:
+            return len(self._sealed) + (self._segment is not None)
+
+
+    def lag_seconds(self, now_ns: int) -> float:
+        """Age of the oldest spilled row that is not in the raw file yet."""
+        with self._lock:
+            segments = [*self._taken, *self._sealed] + ([self._segment] if self._segment is not None else [])
+            first_ns = min((segment.first_ns for segment in segments if segment.first_ns is not None), default = None)
+        if first_ns is None:
+            return 0.0
+        return max(0.0, (now_ns - first_ns) / 1e9)
+
+
+    def append(self, rows: list[tuple[int, str, str, object]]) -> int:
+        """Spills (receive_ns, topic, id, value) rows and returns how many of them had to be dropped."""
+        if not rows:
+            return 0
+        record = encode_record(rows)
+        with self._lock:
+            if (self.pending_bytes + len(record) > self.budget_bytes) and (self.drop_policy == DROP_OLDEST):
+                self._drop_oldest(len(record))
+            if self.pending_bytes + len(record) > self.budget_bytes:
+                if not self._dropping:
+                    logger.warning(f"Spill budget of {self.budget_bytes} bytes reached, dropping new rows until spilled rows are written.")
+                    self._dropping = True
+                self.rows_dropped += len(rows)
+                return len(rows)
+            if self._dropping:
+                logger.warning(f"Spill budget has room again after {self.rows_dropped} dropped rows in total.")
+                self._dropping = False
+            if self._segment is None:
+                self._open()
+            self._file.write(record)
+            # Out of the process right away, a killed client leaves whole records for the next start
+            self._file.flush()
+            self._segment.size += len(record)
+            self._segment.rows += len(rows)
+            if self._segment.first_ns is None:
+                self._segment.first_ns = rows[0][0]
+            self.pending_bytes += len(record)
+            self.rows_spilled += len(rows)
+            if self._segment.size >= self.segment_bytes:
+                self._seal()
+        return 0
+
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok = True)
+        filename = os.path.join(self.directory, f"{self.name}.{self._next_sequence:08d}{SPILL_EXTENSION}")
+        self._next_sequence += 1
+        self._file = open(filename, "wb")
+        self._segment = SpillSegment(filename)
+
+
+    def _seal(self) -> None:
+        self._file.close()
+        self._sealed.append(self._segment)
+        (self._file, self._segment) = (None, None)
+
+
+    def _drop_oldest(self, length: int) -> None:
+        while self._sealed and (self.pending_bytes + length > self.budget_bytes):
+            segment = self._sealed.popleft()
+            remove_segments([segment.filename])
+            self.pending_bytes -= segment.size
+            self.rows_dropped += segment.rows
+            logger.warning(f"Spill budget of {self.budget_bytes} bytes reached, dropped {segment.rows} spilled rows.")
+
+
+    def pop(self) -> SpillSegment | None:
+        """The oldest spilled segment, None once every spilled row was handed out."""
+        with self._lock:
+            if (not self._sealed) and (self._segment is not None):
+                self._seal()
+            if not self._sealed:
+                return None
+            segment = self._sealed.popleft()
+            self._taken.append(segment)
+            return segment
+
+
+    def release(self, segment: SpillSegment) -> None:
+        """Deletes a segment handed out by pop() once its rows are in the raw file."""
+        remove_segments([segment.filename])
+        with self._lock:
+            self._taken.remove(segment)
+            self.pending_bytes -= segment.size
+
+
+    def close(self) -> None:
+        """Seals the open segment, rows not released stay on disk for the next start."""
+        with self._lock:
+            if self._segment is not None:
+                self._seal()
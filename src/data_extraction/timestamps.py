@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Vectorized conversions for int64 epoch nanosecond timestamps"""
+# ---------------------------------------------------------------------------
+from dateutil.tz import tzlocal
+import numpy as np
+import pandas as pd
+
+TIME_NS_COLUMN = "time_ns"
+
+
+def epoch_ns_to_local(time_ns: np.ndarray, precision_ns: int = 1_000) -> pd.DatetimeIndex:
+    """
+    Converts epoch nanoseconds into naive local datetimes in one pass.
+
+    The result matches what datetime.now() would have recorded, truncated to
+    microseconds by default so the csv output keeps its usual format.
+    """
+    time_ns = np.asarray(time_ns, dtype = np.int64)
+    if precision_ns > 1:
+        time_ns = time_ns - (time_ns % precision_ns)
+    local_time = pd.to_datetime(time_ns, unit = "ns")
+    return local_time.tz_localize("UTC").tz_convert(tzlocal()).tz_localize(None)
+
+
+def parse_time_column(column: pd.Series) -> pd.Series | pd.DatetimeIndex:
+    """Parses a time column that holds either datetime strings or epoch nanoseconds."""
+    if pd.api.types.is_integer_dtype(column):
+        return epoch_ns_to_local(column.to_numpy(), precision_ns = 1)
+    # Every flush picks its own sub-second precision, so one chunk can mix formats
+    return pd.to_datetime(column, format = "ISO8601")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Compiled topic to id mapping with a bounded LRU cache"""
+# ---------------------------------------------------------------------------
+from collections import OrderedDict, namedtuple
+import logging
+import sys
+
+logger = logging.getLogger("data_extraction")
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "size", "maxsize"])
+
+
+class TopicMapper():
+    """
+    Resolves an MQTT topic into its field id.
+
+    The topic and id structures are compiled once into the list of topic
+    positions that make up the id. Resolved ids are interned and kept in an
+    LRU cache keyed on the topic string, so repeated topics cost a single
+    dict lookup.
+    """
+
+    def __init__(self, topic_structure: str, id_structure: str, maxsize: int = 10_000):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize needs to be a positive integer.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self.compile(topic_structure, id_structure)
+
+
+    def compile(self, topic_structure: str, id_structure: str) -> None:
+        topic_structure_breakdown = topic_structure.split("/")
+        id_breakdown = id_structure.split("/")
+
+        # Later duplicates win, same as building a dict from the breakdown
+        positions = {subsection: index for (index, subsection) in enumerate(topic_structure_breakdown)}
+        try:
+            self._id_positions = tuple(positions[id_subsection] for id_subsection in id_breakdown)
+        except KeyError as error:
+            raise ValueError(f"id_structure field {error} is not part of topic_structure.") from None
+
+        self.topic_structure = topic_structure
+        self.id_structure = id_structure
+        self._topic_length = len(topic_structure_breakdown)
+        self._cache.clear()
+
+
+    def ensure_structure(self, topic_structure: str, id_structure: str) -> None:
+        """Recompiles the mapper if either structure has changed since the last compile."""
+        if (topic_structure is self.topic_structure) and (id_structure is self.id_structure):
+            return
+        if (topic_structure != self.topic_structure) or (id_structure != self.id_structure):
+            logger.info("Topic or id structure changed. Rebuilding topic mapper.")
+            self.compile(topic_structure, id_structure)
+        else:
+            # Equal strings but new objects, keep the cache and speed up the identity check
+            self.topic_structure = topic_structure
+            self.id_structure = id_structure
+
+
+    def resolve(self, topic: str) -> str | None:
+        try:
+            field_id = self._cache[topic]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            self._cache.move_to_end(topic)
+            return field_id
+
+        self.misses += 1
+        field_id = self._build_id(topic)
+        if field_id is None:
+            return None
+
+        self._cache[topic] = field_id
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last = False)
+            self.evictions += 1
+        return field_id
+
+
+    def _build_id(self, topic: str) -> str | None:
+        message_topic_breakdown = topic.split("/")
+        if len(message_topic_breakdown) != self._topic_length:
+            logger.warning("Topic structure and message structure lengths not equal. Check config file.")
+
+        try:
+            field_id = "/".join(message_topic_breakdown[position] for position in self._id_positions)
+        except IndexError:
+            logger.error(f"Topic '{topic}' is too short to build an id. Message ignored.")
+            return None
+        return sys.intern(field_id)
+
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, len(self._cache), self.maxsize)
+
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
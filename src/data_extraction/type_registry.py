@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Per day registry of the value type of every id written to a raw file"""
+# ---------------------------------------------------------------------------
+from typing import Iterable
+import json
+import logging
+import os
+
+from data_extraction.decoder import (MIXED, NUMERIC)
+from data_extraction.id_catalog import raw_stem
+
+logger = logging.getLogger("data_extraction")
+
+TYPES_EXTENSION = ".types"
+STRING = "string"
+
+
+def types_filename(raw_filename: str) -> str:
+    """20240613-raw.csv.gz -> 20240613-raw.types"""
+    return raw_stem(raw_filename) + TYPES_EXTENSION
+
+
+def read_type_registry(raw_filename: str) -> dict[str, str] | None:
+    """Id to NUMERIC, STRING or MIXED, None if the day has no registry."""
+    filename = types_filename(raw_filename)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, "r", encoding = "utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError) as error:
+        logger.error(f"Failed to read type registry {filename}, value types are detected from the data: {error}")
+        return None
+
+
+def string_ids(types: dict[str, str] | None) -> list[str]:
+    """Ids resampled with last(), every id that held a value float() can not read."""
+    if types is None:
+        return []
+    return [field_id for (field_id, value_type) in types.items() if value_type != NUMERIC]
+
+
+def value_type(value) -> str:
+    """How a value reads back from the raw file, a string of a number is written as that number."""
+    if type(value) is float:
+        return NUMERIC
+    if isinstance(value, str):
+        try:
+            float(value)
+            return NUMERIC
+        except ValueError:
+            pass
+    return STRING
+
+
+def merge_type(old_type: str | None, new_type: str) -> str:
+    if (old_type is None) or (old_type == new_type):
+        return new_type
+    return MIXED
+
+
+def batch_types(ids: Iterable[str], types: Iterable[str]) -> dict[str, str]:
+    """Type of every id of a flush, from the (id, type) of its rows."""
+    observed: dict[str, str] = {}
+    for (field_id, row_type) in zip(ids, types):
+        old_type = observed.get(field_id)
+        if old_type != row_type:
+            observed[field_id] = merge_type(old_type, row_type)
+    return observed
+
+
+class TypeRegistry():
+    """
+    Value type of every id seen in the current day's raw file.
+
+    An id is NUMERIC while all of its values are numbers, STRING while none
+    of them are and MIXED once it held both. The registry is rewritten
+    whenever an id is added or changes type, so end of day knows which ids
+    to average and which to resample with last() before reading a row.
+    Changes of an id already in the registry are counted in `type_changes`.
+    """
+
+    def __init__(self):
+        self.raw_filename: str | None = None
+        self.types: dict[str, str] = {}
+        self.type_changes = 0
+
+
+    def _switch(self, raw_filename: str) -> None:
+        # Picks up an existing registry when restarted in the middle of a day
+        self.raw_filename = raw_filename
+        self.types = read_type_registry(raw_filename) or {}
+
+
+    def update(self, raw_filename: str, observed: dict[str, str]) -> list[str]:
+        """Merges the types of a flush in and returns the ids that changed type."""
+        if raw_filename != self.raw_filename:
+            self._switch(raw_filename)
+        updated = {}
+        changed = []
+        for (field_id, new_type) in observed.items():
+            old_type = self.types.get(field_id)
+            merged = merge_type(old_type, new_type)
+            if merged == old_type:
+                continue
+            updated[field_id] = merged
+            if old_type is not None:
+                changed.append(field_id)
+        if not updated:
+            return changed
+        if changed:
+            self.type_changes += len(changed)
+            logger.warning(f"Ids {changed} of {raw_filename} now hold both numbers and strings, end of day resamples them with last()")
+        self.types.update(updated)
+        self._write(raw_filename)
+        return changed
+
+
+    def _write(self, raw_filename: str) -> None:
+        filename = types_filename(raw_filename)
+        temporary_filename = f"{filename}.tmp"
+        try:
+            with open(temporary_filename, "w", encoding = "utf-8") as file:
+                json.dump(self.types, file, separators = (",", ":"))
+            os.replace(temporary_filename, filename)
+        except OSError as error:
+            logger.error(f"Failed to update type registry of {raw_filename}: {error}")
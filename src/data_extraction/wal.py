@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Write-ahead log of the rows held in the ingest buffer"""
+# ---------------------------------------------------------------------------
+from threading import Lock
+from typing import Iterable, Iterator
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+
+logger = logging.getLogger("data_extraction")
+
+WAL_EXTENSION = ".wal"
+# Payload length and crc32 of every record, a zero length marks the end of a segment
+RECORD_HEADER = struct.Struct("<II")
+ROW_COUNT = struct.Struct("<I")
+# Receive time, topic length, id length and value tag of every row
+ROW_HEADER = struct.Struct("<qHHB")
+FLOAT = struct.Struct("<d")
+INTEGER = struct.Struct("<q")
+TEXT_LENGTH = struct.Struct("<I")
+(TAG_FLOAT, TAG_STRING, TAG_TRUE, TAG_FALSE, TAG_INTEGER, TAG_BIG_INTEGER) = range(6)
+
+
+def encode_rows(rows: Iterable[tuple[int, str, str, object]]) -> bytes:
+    """One record payload for (receive_ns, topic, id, value) rows."""
+    parts = [b""]
+    count = 0
+    for (receive_ns, topic, field_id, value) in rows:
+        topic_bytes = topic.encode()
+        id_bytes = field_id.encode()
+        value_type = type(value)
+        if value_type is float:
+            (tag, value_bytes) = (TAG_FLOAT, FLOAT.pack(value))
+        elif value_type is bool:
+            (tag, value_bytes) = (TAG_TRUE if value else TAG_FALSE, b"")
+        elif (value_type is int) and (-2**63 <= value < 2**63):
+            (tag, value_bytes) = (TAG_INTEGER, INTEGER.pack(value))
+        else:
+            text = str(value).encode()
+            tag = TAG_BIG_INTEGER if value_type is int else TAG_STRING
+            value_bytes = TEXT_LENGTH.pack(len(text)) + text
+        parts.append(ROW_HEADER.pack(receive_ns, len(topic_bytes), len(id_bytes), tag))
+        parts.append(topic_bytes)
+        parts.append(id_bytes)
+        parts.append(value_bytes)
+        count += 1
+    parts[0] = ROW_COUNT.pack(count)
+    return b"".join(parts)
+
+
+def decode_rows(payload: bytes) -> list[tuple[int, str, str, object]]:
+    (count,) = ROW_COUNT.unpack_from(payload, 0)
+    position = ROW_COUNT.size
+    rows = []
+    for _ in range(count):
+        (receive_ns, topic_length, id_length, tag) = ROW_HEADER.unpack_from(payload, position)
+        position += ROW_HEADER.size
+        topic = payload[position:position + topic_length].decode()
+        position += topic_length
+        field_id = payload[position:position + id_length].decode()
+        position += id_length
+        if tag == TAG_FLOAT:
+            (value,) = FLOAT.unpack_from(payload, position)
+            position += FLOAT.size
+        elif tag in (TAG_TRUE, TAG_FALSE):
+            value = tag == TAG_TRUE
+        elif tag == TAG_INTEGER:
+            (value,) = INTEGER.unpack_from(payload, position)
+            position += INTEGER.size
+        else:
+            (text_length,) = TEXT_LENGTH.unpack_from(payload, position)
+            position += TEXT_LENGTH.size
+            value = payload[position:position + text_length].decode()
+            position += text_length
+            if tag == TAG_BIG_INTEGER:
+                value = int(value)
+        rows.append((receive_ns, topic, field_id, value))
+    return rows
+
+
+def encode_record(rows: Iterable[tuple[int, str, str, object]]) -> bytes:
+    payload = encode_rows(rows)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_records(data: bytes) -> Iterator[list[tuple[int, str, str, object]]]:
+    """
+    Rows of every complete record of a segment, in the order they were logged.
+
+    Reading stops at the first record that is empty, runs past the end or
+    fails its checksum, the record being written when the process died.
+    """
+    position = 0
+    while position + RECORD_HEADER.size <= len(data):
+        (length, checksum) = RECORD_HEADER.unpack_from(data, position)
+        start = position + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if (length == 0) or (len(payload) != length) or (zlib.crc32(payload) != checksum):
+            return
+        yield decode_rows(payload)
+        position = start + length
+
+
+def read_segment(filename: str) -> list[tuple[int, str, str, object]]:
+    """Every row logged in a segment file."""
+    with open(filename, "rb") as file:
+        data = file.read()
+    return [row for rows in iter_records(data) for row in rows]
+
+
+def segment_pattern(name: str, extension: str) -> re.Pattern:
+    return re.compile(rf"^{re.escape(name)}\.(\d+){re.escape(extension)}$")
+
+
+def segment_files(directory: str, name: str, extension: str = WAL_EXTENSION) -> list[str]:
+    """Segment files of `name` in the directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    pattern = segment_pattern(name, extension)
+    sequences = {}
+    for entry in os.listdir(directory):
+        match = pattern.match(entry)
+        if match:
+            sequences[entry] = int(match.group(1))
+    return [os.path.join(directory, entry) for entry in sorted(sequences, key = sequences.get)]
+
+
+def next_sequence(directory: str, name: str, extension: str = WAL_EXTENSION) -> int:
+    """Sequence number after the last segment file, so new segments sort after the ones left behind."""
+    pattern = segment_pattern(name, extension)
+    sequences = [int(pattern.match(os.path.basename(filename)).group(1)) for filename in segment_files(directory, name, extension)]
+    return max(sequences, default = -1) + 1
+
+
+def remove_segments(filenames: list[str]) -> None:
+    """Deletes segments whose rows are in the raw file."""
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            logger.error(f"Failed to delete segment {filename}: {error}")
+
+
+class WalSegment():
+    """A preallocated segment file mapped into memory, records are copied into the map."""
+
+    def __init__(self, filename: str, size: int):
+        self.filename = filename
+        self.size = size
+        self.offset = 0
+        self.synced = 0
+        self._file = open(filename, "w+b")
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+
+    def fits(self, length: int) -> bool:
+        # Room for the zero header that ends the segment is always left
+        return self.offset + length + RECORD_HEADER.size <= self.size
+
+
+    def write(self, record: bytes) -> None:
+        self._map[self.offset:self.offset + len(record)] = record
+        self.offset += len(record)
+
+
+    def sync(self) -> None:
+        """msync of the pages written since the last sync only."""
+        if self.offset == self.synced:
+            return
+        start = self.synced - (self.synced % mmap.ALLOCATIONGRANULARITY)
+        self._map.flush(start, self.offset - start)
+        self.synced = self.offset
+
+
+    def close(self) -> None:
+        self.sync()
+        self._map.close()
+        # The unused tail of the preallocation is given back
+        self._file.truncate(self.offset)
+        self._file.close()
+
+
+class WriteAheadLog():
+    """
+    Append-only log of the rows in the ingest buffer, so a killed process loses none of them.
+
+    Every append is one checksummed record copied into a memory mapped
+    segment file. The pages reach the page cache right away, which survives
+    the process being killed, and are msynced to disk at most every
+    `sync_interval` seconds. rotate() closes the segment when the buffer is
+    dumped and hands out the segments holding the dumped rows, which
+    release() deletes once they are in the raw file. Segments left behind by
+    a previous process are listed by pending_segments() for replay.
+    """
+
+    def __init__(self, directory: str, name: str, segment_bytes: int = 16*1024*1024, sync_interval: float = 1.0):
+        self.directory = directory
+        self.name = name
+        self.segment_bytes = segment_bytes
+        self.sync_interval = sync_interval
+        self.bytes_logged = 0
+        self.syncs = 0
+        self._next_sequence = next_sequence(directory, name)
+        self._segment: WalSegment | None = None
+        # Closed segments whose rows have not been handed to a flush yet
+        self._sealed: list[str] = []
+        self._next_sync = time.monotonic() + sync_interval
+        self._lock = Lock()
+
+
+    def pending_segments(self) -> list[str]:
+        """Segment files in the directory, oldest first."""
+        return segment_files(self.directory, self.name)
+
+
+    def _open_segment(self, length: int) -> WalSegment:
+        os.makedirs(self.directory, exist_ok = True)
+        filename = os.path.join(self.directory, f"{self.name}.{self._next_sequence:08d}{WAL_EXTENSION}")
+        self._next_sequence += 1
+        return WalSegment(filename, max(self.segment_bytes, length + RECORD_HEADER.size))
+
+
+    def append(self, rows: list[tuple[int, str, str, object]]) -> None:
+        if not rows:
+            return
+        record = encode_record(rows)
+        with self._lock:
+            if (self._segment is not None) and not self._segment.fits(len(record)):
+                self._seal()
+            if self._segment is None:
+                self._segment = self._open_segment(len(record))
+            self._segment.write(record)
+            self.bytes_logged += len(record)
+            if time.monotonic() >= self._next_sync:
+                self._segment.sync()
+                self.syncs += 1
+                self._next_sync = time.monotonic() + self.sync_interval
+
+
+    def _seal(self) -> None:
+        self._segment.close()
+        self._sealed.append(self._segment.filename)
+        self._segment = None
+
+
+    def rotate(self) -> list[str]:
+        """Closes the current segment and returns every segment logged since the last rotate()."""
+        with self._lock:
+            if self._segment is not None:
+                self._seal()
+            (segments, self._sealed) = (self._sealed, [])
+            return segments
+
+
+    def release(self, segments: list[str]) -> None:
+        """Deletes segments whose rows are in the raw file."""
+        remove_segments(segments)
+
+
+    def pending_bytes(self) -> int:
+        """Bytes logged for rows that are not in the raw file yet, closed segments included."""
+        total = 0
+        for filename in self.pending_segments():
+            try:
+                total += os.path.getsize(filename)
+            except OSError:
+                pass
+        with self._lock:
+            if self._segment is not None:
+                total += self._segment.offset - self._segment.size
+        return total
+
+
+    def close(self) -> None:
+        """Syncs and closes the current segment, its rows stay pending until released."""
+        with self._lock:
+            if self._segment is not None:
+                self._seal()
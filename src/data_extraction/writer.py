@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# version ='1.1'
+# ---------------------------------------------------------------------------
+"""Writer thread that serializes and writes buffer dumps off the flush thread"""
+# ---------------------------------------------------------------------------
+from threading import (Condition, Thread)
+from typing import Callable
+import logging
+import os
+import time
+
+logger = logging.getLogger("data_extraction")
+
+
+def file_size(filename: str) -> int:
+    return os.path.getsize(filename) if os.path.exists(filename) else 0
+
+
+class AsyncRawWriter():
+    """
+    Single slot hand-off between the flush thread and a writer thread.
+
+    The flush thread submits a dumped batch and goes back to waiting while
+    the writer thread serializes and writes it with `write_function`. Only
+    one batch is in flight at a time, the one the ingest buffer swapped out,
+    so a submit while the writer is still busy waits for it to finish.
+    `size_function` measures everything a write to a filename can grow, so
+    `bytes_written` also counts writers that spread a day over several files.
+    """
+
+    def __init__(
+            self,
+            write_function: Callable[[object, str], None],
+            size_function: Callable[[str], int] = file_size,
+        ):
+        self.write_function = write_function
+        self.size_function = size_function
+        self.last_write_latency: float = 0.0
+        self.bytes_written: int = 0
+        self.batches_written: int = 0
+        self.backpressure_waits: int = 0
+        self.failed_writes: int = 0
+        self._pending: tuple[object, str, Callable[[], None] | None] | None = None
+        self._busy: bool = False
+        self._running: bool = False
+        self._condition = Condition()
+        self._handle = Thread(target = self._writer_thread, name = "raw_writer")
+
+
+    def start(self) -> None:
+        self._running = True
+        self._handle.start()
+
+
+    def stop(self) -> None:
+        """Writes whatever is still pending and stops the writer thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._handle.is_alive():
+            self._handle.join()
+
+
+    def is_idle(self) -> bool:
+        return (self._pending is None) and not self._busy
+
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        with self._condition:
+            if not self.is_idle():
+                self.backpressure_waits += 1
+            return self._condition.wait_for(self.is_idle, timeout = timeout)
+
+
+    def submit(
+            self,
+            batch,
+            filename: str,
+            timeout: float | None = None,
+            on_written: Callable[[], None] | None = None,
+        ) -> bool:
+        """Hands a batch to the writer thread, `on_written` is called once it was written successfully."""
+        with self._condition:
+            if not self._condition.wait_for(self.is_idle, timeout = timeout):
+                return False
+            self._pending = (batch, filename, on_written)
+            self._condition.notify_all()
+        if not self._running:
+            # Writer thread is not running, write on the caller's thread
+            self._write_pending()
+        return True
+
+
+    def _writer_thread(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: (self._pending is not None) or not self._running)
+                if self._pending is None:
+                    return
+            self._write_pending()
+
+
+    def _write_pending(self) -> None:
+        with self._condition:
+            if self._pending is None:
+                return
+            (batch, filename, on_written) = self._pending
+            self._pending = None
+            self._busy = True
+
+        start = time.perf_counter()
+        try:
+            size_before = self.size_function(filename)
+        except Exception as error:
+            size_before = None
+            logger.error(f"Failed to measure {filename} before writing to it: {error}")
+        try:
+            self.write_function(batch, filename)
+        except Exception as error:
+            self.failed_writes += 1
+            logger.error(f"Failed to write buffer to {filename}: {error}")
+        else:
+            self.batches_written += 1
+            # Nothing raised here may reach the writer thread, it would leave every later submit waiting
+            try:
+                if size_before is not None:
+                    self.bytes_written += max(0, self.size_function(filename) - size_before)
+                if on_written is not None:
+                    on_written()
+            except Exception as error:
+                logger.error(f"Failed to complete the write to {filename}: {error}")
+        finally:
+            self.last_write_latency = time.perf_counter() - start
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
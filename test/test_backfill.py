@@ -0,0 +1,81 @@
+from datetime import (date, timedelta)
+from data_extraction.backfill import (backfill_jobs, missing_days, processed_day_filename, raw_days, run_backfill, LIVE_EXTENSION)
+from data_extraction.cli import backfill_main
+from data_extraction.eod_process import (EodJob, process_day)
+
+
+def write_raw(filename: str, day: str) -> None:
+    with open(filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for second in range(20):
+            file.write(f"{day} 12:00:{second:02d}.5,t,pyrometer/ir_01,{float(second)}\n")
+
+
+def test_raw_days(tmp_path):
+    for name in [
+        "20240528-raw.csv", "20240529-raw.csv.gz", "20240530-raw.parquet", "20240531-raw.part1.parquet",
+        "20240601-raw.ids", "20240601-raw.idx", "20240602-other.csv", "2024060-raw.csv", "20241399-raw.csv",
+    ]:
+        (tmp_path / name).touch()
+    assert raw_days(str(tmp_path), "raw") == [date(2024, 5, 28), date(2024, 5, 29), date(2024, 5, 30), date(2024, 5, 31)]
+    assert raw_days(str(tmp_path / "missing"), "raw") == []
+
+
+def test_missing_days(tmp_path):
+    for day in ("20240528", "20240529", "20240530", "20240531"):
+        (tmp_path / f"{day}-raw.csv").touch()
+    (tmp_path / "20240528-processed.csv").touch()
+    # Live aggregation was still building this one when the service stopped
+    (tmp_path / "20240529-processed.csv").touch()
+    (tmp_path / f"20240529-processed.csv{LIVE_EXTENSION}").touch()
+    directory = str(tmp_path)
+    assert missing_days(directory, "raw", directory, "processed") == [date(2024, 5, 29), date(2024, 5, 30), date(2024, 5, 31)]
+    assert missing_days(directory, "raw", directory, "processed", end = date(2024, 5, 30)) == [date(2024, 5, 29), date(2024, 5, 30)]
+    assert missing_days(directory, "raw", directory, "processed", start = date(2024, 5, 31)) == [date(2024, 5, 31)]
+
+
+def test_run_backfill(tmp_path, monkeypatch):
+    # Spawned workers must not need the client's ./config
+    monkeypatch.chdir(tmp_path)
+    raw_directory = tmp_path / "raw"
+    raw_directory.mkdir()
+    for day in ("2024-05-28", "2024-05-29", "2024-05-30"):
+        write_raw(str(raw_directory / f"{day.replace('-', '')}-raw.csv"), day)
+    (raw_directory / "20240531-raw.csv").write_text("")
+    directory = str(tmp_path)
+    (tmp_path / f"20240529-processed.csv{LIVE_EXTENSION}").touch()
+    days = missing_days(str(raw_directory), "raw", directory, "processed", end = date(2024, 5, 30))
+    jobs = backfill_jobs(days, str(raw_directory), "raw", directory, "processed", 1)
+    assert [job.processed_filename for job in jobs] == [processed_day_filename(directory, "processed", day) for day in days]
+    assert run_backfill(jobs, workers = 2) == jobs
+
+    process_day(EodJob(str(raw_directory / "20240529-raw.csv"), str(tmp_path / "reference.csv"), 1))
+    assert (tmp_path / "20240529-processed.csv").read_text() == (tmp_path / "reference.csv").read_text()
+    assert not (tmp_path / f"20240529-processed.csv{LIVE_EXTENSION}").exists()
+    assert missing_days(str(raw_directory), "raw", directory, "processed") == [date(2024, 5, 31)]
+
+
+def test_failed_day_is_not_completed(tmp_path):
+    jobs = [EodJob(str(tmp_path / "20240528-raw.csv"), str(tmp_path / "20240528-processed.csv"), 1)]
+    assert run_backfill(jobs) == []
+
+
+def test_today_is_not_backfilled(tmp_path):
+    (today, yesterday) = (date.today(), date.today() - timedelta(days = 1))
+    for day in (yesterday, today):
+        write_raw(str(tmp_path / f"{day:%Y%m%d}-raw.csv"), day.isoformat())
+    # Live aggregation is building today's file
+    live = tmp_path / f"{today:%Y%m%d}-processed.csv"
+    live.write_text("time\n")
+    (tmp_path / f"{today:%Y%m%d}-processed.csv{LIVE_EXTENSION}").touch()
+    directory = str(tmp_path)
+    arguments = ["--raw-directory", directory, "--raw-name", "raw", "--processed-directory", directory, "--processed-name", "processed", "--resample", "1"]
+    backfill_main([*arguments, "--workers", "1", "--end", today.isoformat()])
+    assert (tmp_path / f"{yesterday:%Y%m%d}-processed.csv").exists()
+    assert live.read_text() == "time\n"
+    assert (tmp_path / f"{today:%Y%m%d}-processed.csv{LIVE_EXTENSION}").exists()
+
+    # A job for today run directly leaves the marker to live aggregation
+    jobs = backfill_jobs([today], directory, "raw", directory, "processed", 1)
+    assert run_backfill(jobs) == jobs
+    assert (tmp_path / f"{today:%Y%m%d}-processed.csv{LIVE_EXTENSION}").exists()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from data_extraction.block_index import (
+    IndexedBlock, append_block, block_index_filename, covering_blocks, epoch_local_bounds, read_block_index
+)
+from data_extraction.timestamps import epoch_ns_to_local
+
+
+def test_block_index_filename():
+    assert block_index_filename("raw/20240618-raw.csv.gz") == "raw/20240618-raw.idx"
+
+
+def test_blocks_round_trip(tmp_path):
+    raw_filename = str(tmp_path / "20240618-raw.csv")
+    assert read_block_index(raw_filename) is None
+    blocks = [IndexedBlock(0, 120, 10, 20, [0, 1]), IndexedBlock(120, 180, 21, 30, None)]
+    for block in blocks:
+        append_block(raw_filename, block)
+    with open(block_index_filename(raw_filename), "a") as file:
+        file.write('{"start":180,"en')
+    assert read_block_index(raw_filename) == blocks
+
+
+def test_covering_blocks_fill_gaps():
+    blocks = covering_blocks([IndexedBlock(100, 150, 1, 2), IndexedBlock(200, 250, 3, 4), IndexedBlock(250, 400, 5, 6)], 300)
+    assert [(block.start, block.end) for block in blocks] == [(0, 100), (100, 150), (150, 200), (200, 250), (250, 300)]
+    assert blocks[0].overlaps(-10**18, 10**18) and blocks[-1].ids is None
+
+
+def test_epoch_local_bounds():
+    time_ns = np.array([1_718_700_000_123_456_789, 1_718_690_000_000_000_000, 1_718_710_000_000_000_001])
+    local_ns = np.asarray(epoch_ns_to_local(time_ns), dtype = "datetime64[ns]").view(np.int64)
+    (first_ns, last_ns) = epoch_local_bounds(time_ns)
+    assert first_ns <= local_ns.min() and last_ns >= local_ns.max()
+    assert last_ns - first_ns < pd.Timedelta(hours = 6).value
@@ -1,11 +1,16 @@
 import pytest
 from data_extraction.client import (DataExtractionClient, DataExtractionConfig)
+from data_extraction.block_index import read_block_index
+from data_extraction.type_registry import (read_type_registry, TypeRegistry, MIXED, STRING)
+from data_extraction.spill import SpillQueue
 from mqtt_node_network.client import MQTTBrokerConfig
 from datetime import datetime
+from dataclasses import replace
 import numpy as np
 import pandas as pd
 from paho.mqtt.client import MQTTMessage
 import time
+import os
 
 
 BROKER_CONFIG = MQTTBrokerConfig(
@@ -40,7 +45,9 @@ def client() -> DataExtractionClient:
         broker_config = BROKER_CONFIG,
         data_extraction_config = EXTRACTION_CONFIG
     )
-    return client
+    yield client
+    # stop() on garbage collection would flush leftover rows into test/test_files
+    client.buffer.dump()
 
 
 def test_client_initialization(client):  
@@ -224,6 +231,45 @@ def test_data_config_fails():
         )
 
 
+@pytest.mark.parametrize("resample_time", [[], [10, 1], [1, 2.5], [0.5, "1"]])
+def test_resample_time_list_fails(resample_time):
+    with pytest.raises((TypeError, ValueError)):
+        replace(EXTRACTION_CONFIG, resample_time = resample_time)
+
+
+def test_resample_time_list_rolls_up():
+    client = DataExtractionClient(
+        broker_config = BROKER_CONFIG,
+        data_extraction_config = replace(EXTRACTION_CONFIG, resample_time = [0.5, 10, 60])
+    )
+    assert client.resample_time_seconds == 0.5
+    assert client.rollup_seconds == (10, 60)
+
+
+@pytest.mark.parametrize("aggregations", [["max"], {"*": "max"}, {"*": []}, {"*": ["median"]}])
+def test_aggregations_fail(aggregations):
+    with pytest.raises((TypeError, ValueError)):
+        replace(EXTRACTION_CONFIG, aggregations = aggregations)
+
+
+def test_process_data_aggregations():
+    client = DataExtractionClient(
+        broker_config = BROKER_CONFIG,
+        data_extraction_config = replace(EXTRACTION_CONFIG, aggregations = {"*/pressure": ["max", "count"], "*/valve": ["last"]})
+    )
+    data = [
+        {"time": datetime(2024, 4, 30, 9, 30, 0, 100_000), "a/pressure": 1.0, "a/valve": "OPEN", "a/temperature": 20.0},
+        {"time": datetime(2024, 4, 30, 9, 30, 0, 600_000), "a/pressure": 3.0, "a/valve": "CLOSED", "a/temperature": 22.0},
+        {"time": datetime(2024, 4, 30, 9, 30, 1, 200_000), "a/pressure": 2.0, "a/valve": None, "a/temperature": None},
+    ]
+    df = client.process_data(data)
+    assert sorted(df.columns) == ["a/pressure_count", "a/pressure_max", "a/temperature", "a/valve_last"]
+    assert df["a/pressure_max"].tolist() == [3.0, 2.0]
+    assert df["a/pressure_count"].tolist() == [2, 1]
+    assert df["a/valve_last"].iloc[0] == "CLOSED"
+    assert df["a/temperature"].iloc[0] == 21.0
+
+
 def test_on_message(mocker, client):
     class MockMessage:
         def __init__(self):
@@ -244,6 +290,15 @@ def test_on_message(mocker, client):
     assert client.buffer[0]["value"] == mock_message.value
 
 
+def test_buffer_overflow_signals_flush(client):
+    rows = [(time.time_ns(), "p0/normal/sensor/a/pyrometer/ir_01", "sensor/pyrometer/ir_01", 1.0)] * 10_005
+    assert client.flush_requested is False
+    client.append_to_buffer(rows)
+    assert len(client.buffer) == 10_000
+    assert client.rows_lost_to_overflow() == 5
+    assert client.flush_requested is True
+
+
 #----------Testing reading in files and processing the data------------
 def test_single_line_topics_file(client):
     expected_results = {
@@ -712,4 +767,235 @@ def test_interpolate_df():
     }
     intended_result_df = pd.DataFrame(intended_result_data)
     
-    pd.testing.assert_frame_equal(sample_df.interpolate(), intended_result_df)
\ No newline at end of file
+    pd.testing.assert_frame_equal(sample_df.interpolate(), intended_result_df)
+
+def test_raw_writes_update_id_catalog(client, tmp_path):
+    filename = str(tmp_path / "20240502-test.csv")
+    rows = [
+        {"time": datetime(2024, 5, 2, 12, 0, 0), "topic": "p0/n/sensor/a/pyrometer/ir_01", "id": "sensor/pyrometer/ir_01", "value": 20.0},
+        {"time": datetime(2024, 5, 2, 12, 0, 1), "topic": "p0/n/control/a/heater/enable", "id": "control/heater/enable", "value": "ON"},
+    ]
+    client.write_raw_batch(rows, filename)
+    client.write_raw_batch(rows[:1], filename)
+    with open(tmp_path / "20240502-test.ids") as file:
+        assert file.read() == "sensor/pyrometer/ir_01\ncontrol/heater/enable\n"
+
+
+@pytest.mark.parametrize("buffer_type", ["list", "columnar"])
+def test_raw_writes_record_value_types(tmp_path, buffer_type):
+    filename = str(tmp_path / "20240502-test.csv")
+    rows = [
+        (1714651200000000000, "p0/n/sensor/a/pyrometer/ir_01", "sensor/pyrometer/ir_01", 20.0),
+        (1714651201000000000, "p0/n/control/a/heater/enable", "control/heater/enable", "ON"),
+        (1714651202000000000, "p0/n/control/a/valve/state", "control/valve/state", 1.0),
+    ]
+    client = DataExtractionClient(
+        broker_config = BROKER_CONFIG,
+        data_extraction_config = replace(EXTRACTION_CONFIG, buffer_type = buffer_type, timestamp_mode = "epoch_ns")
+    )
+    client.append_to_buffer(rows)
+    client.write_raw_batch(client.buffer.dump(), filename)
+    client.append_to_buffer([(1714651203000000000, "p0/n/control/a/valve/state", "control/valve/state", "OPEN")])
+    client.write_raw_batch(client.buffer.dump(), filename)
+    assert read_type_registry(filename) == {
+        "sensor/pyrometer/ir_01": "numeric", "control/heater/enable": "string", "control/valve/state": "mixed"
+    }
+    assert client.type_registry.type_changes == 1
+
+
+def test_end_of_day_discovers_ids_in_one_pass(client, tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    processed_filename = str(tmp_path / "processed.csv")
+    with open(raw_filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for second in range(4):
+            file.write(f"2024-05-02 12:00:0{second},t,pyrometer/ir_01,{20.0 + second}\n")
+        file.write("2024-05-02 12:00:04,t,heater/enable,ON\n")
+    client.eod_chunk_rows = 2
+    client.manage_csv_buffer(raw_filename, processed_filename)
+
+    df = pd.read_csv(processed_filename, index_col = 0)
+    assert list(df.columns) == ["pyrometer/ir_01", "heater/enable"]
+    assert df["pyrometer/ir_01"].tolist()[:4] == [20.0, 21.0, 22.0, 23.0]
+    assert df["heater/enable"].tolist()[-1] == "ON"
+    assert df["heater/enable"].isna().sum() == 4
+
+
+def test_end_of_day_buckets_span_chunks(client, tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    processed_filename = str(tmp_path / "processed.csv")
+    with open(raw_filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for tenth in range(10):
+            file.write(f"2024-05-02 12:00:00.{tenth}00000,t,pyrometer/ir_01,{float(tenth)}\n")
+    client.eod_chunk_rows = 3
+    client.manage_csv_buffer(raw_filename, processed_filename)
+
+    df = pd.read_csv(processed_filename, index_col = 0)
+    assert df["pyrometer/ir_01"].tolist() == [4.5]
+
+
+def test_live_aggregation_builds_processed_file(tmp_path):
+    config = DataExtractionConfig(**{
+        **EXTRACTION_CONFIG.__dict__,
+        "output_directory": str(tmp_path),
+        "processed_output_directory": str(tmp_path),
+        "live_aggregation": True,
+        "live_aggregation_lag": 0,
+    })
+    client = DataExtractionClient(broker_config = BROKER_CONFIG, data_extraction_config = config)
+    today = client.start_time
+    raw_filename = client.raw_filename(today.year, today.month, today.day)
+    rows = [
+        {"time": datetime(today.year, today.month, today.day, 0, 0, 0, 250000), "topic": "t", "id": "pyrometer/ir_01", "value": 1.0},
+        {"time": datetime(today.year, today.month, today.day, 0, 0, 0, 750000), "topic": "t", "id": "pyrometer/ir_01", "value": 2.0},
+        {"time": datetime(today.year, today.month, today.day, 0, 0, 1, 500000), "topic": "t", "id": "pyrometer/ir_01", "value": 5.0},
+    ]
+    client.write_raw_batch(rows, raw_filename)
+    client.emit_live_buckets()
+    processed_filename = client.processed_output_filename(today.year, today.month, today.day)
+    assert pd.read_csv(processed_filename, index_col = 0)["pyrometer/ir_01"].tolist() == [1.5, 5.0]
+
+    assert os.path.exists(processed_filename + ".live")
+
+    client.end_of_day(today.year, today.month, today.day)
+    assert pd.read_csv(processed_filename, index_col = 0)["pyrometer/ir_01"].tolist() == [1.5, 5.0]
+    assert not os.path.exists(processed_filename + ".live")
+
+
+@pytest.mark.parametrize("registry", [True, False])
+def test_parallel_end_of_day_matches_serial(client, tmp_path, registry):
+    raw_filename = str(tmp_path / "raw.csv")
+    with open(raw_filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for tenth in range(300):
+            row_id = "heater/enable" if tenth % 7 == 0 else f"pyrometer/ir_0{tenth % 3}"
+            row_value = "ON" if row_id == "heater/enable" else float(tenth)
+            file.write(f"2024-05-02 12:00:{tenth // 10:02d}.{tenth % 10}00000,t,{row_id},{row_value}\n")
+            # Numbers in the first partitions, strings in the last
+            if tenth % 5 == 0:
+                file.write(f"2024-05-02 12:00:{tenth // 10:02d}.{tenth % 10}00000,t,valve/state,{float(tenth) if tenth < 250 else 'OPEN'}\n")
+    # Without the types recorded during ingest the partitions can not agree on valve/state
+    if registry:
+        TypeRegistry().update(raw_filename, {"heater/enable": STRING, "valve/state": MIXED})
+    client.manage_csv_buffer(raw_filename, str(tmp_path / "serial.csv"))
+    client.eod_workers = 3
+    client.manage_csv_buffer(raw_filename, str(tmp_path / "parallel.csv"))
+
+    with open(tmp_path / "serial.csv") as serial, open(tmp_path / "parallel.csv") as parallel:
+        assert parallel.read() == serial.read()
+
+
+def test_raw_writes_are_indexed_for_extraction(client, tmp_path):
+    client.output_directory = str(tmp_path)
+    filename = client.raw_filename(2024, 5, 2)
+    for minute in range(3):
+        client.write_raw_batch([
+            {"time": datetime(2024, 5, 2, 12, minute, second), "topic": "t", "id": f"sensor/field_{second % 2 + minute}", "value": float(second)}
+            for second in range(10)
+        ], filename)
+    blocks = read_block_index(filename)
+    assert [block.ids for block in blocks] == [[0, 1], [1, 2], [2, 3]]
+    assert blocks[1].first_ns == pd.Timestamp("2024-05-02 12:01:00").value
+    assert blocks[2].end == os.path.getsize(filename)
+
+    df = client.extract(datetime(2024, 5, 2, 12, 1, 5), datetime(2024, 5, 2, 12, 2, 2), ids = ["sensor/field_2"])
+    assert df["time"].tolist() == [pd.Timestamp(f"2024-05-02 12:01:0{second}") for second in (5, 7, 9)] + [pd.Timestamp("2024-05-02 12:02:00")]
+    df = client.extract(datetime(2024, 5, 2, 12, 1), datetime(2024, 5, 2, 12, 1, 10), resample = True)
+    assert list(df.columns) == ["sensor/field_1", "sensor/field_2"]
+
+
+def test_backfill_processes_missed_days(tmp_path):
+    config = DataExtractionConfig(**{
+        **EXTRACTION_CONFIG.__dict__,
+        "output_directory": str(tmp_path / "raw"),
+        "processed_output_directory": str(tmp_path / "processed"),
+    })
+    client = DataExtractionClient(broker_config = BROKER_CONFIG, data_extraction_config = config)
+    os.makedirs(config.output_directory)
+    today = client.start_time
+    for day in (today - pd.Timedelta(days = 2), today - pd.Timedelta(days = 1), today):
+        client.write_raw_batch([
+            {"time": datetime(day.year, day.month, day.day, 12, 0, second), "topic": "t", "id": "pyrometer/ir_01", "value": float(second)}
+            for second in range(5)
+        ], client.raw_filename(day.year, day.month, day.day))
+    yesterday = today - pd.Timedelta(days = 1)
+    # The day being written is left to end of day
+    assert client.backfill() == [
+        client.processed_output_filename(day.year, day.month, day.day) for day in (today - pd.Timedelta(days = 2), yesterday)
+    ]
+    assert client.eod_days_behind == 0
+    df = pd.read_csv(client.processed_output_filename(yesterday.year, yesterday.month, yesterday.day), index_col = 0)
+    assert df["pyrometer/ir_01"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert client.backfill() == []
+
+
+@pytest.mark.parametrize("buffer_type", ["list", "columnar"])
+def test_write_ahead_log_is_replayed_on_start(tmp_path, buffer_type):
+    config = replace(EXTRACTION_CONFIG, output_directory = str(tmp_path), buffer_type = buffer_type, write_ahead_log = True)
+    client = DataExtractionClient(broker_config = BROKER_CONFIG, data_extraction_config = config)
+    now_ns = time.time_ns()
+    client.append_to_buffer([(now_ns, "t", "pyrometer/ir_01", 1.5), (now_ns + 1_000, "t", "heater/enable", "ON")])
+    # Killed before the buffer was dumped
+    client.buffer.dump()
+    client.wal.close()
+    assert len(client.wal.pending_segments()) == 1
+
+    restarted = DataExtractionClient(broker_config = BROKER_CONFIG, data_extraction_config = config)
+    assert restarted.wal_rows_replayed == 2
+    assert restarted.wal.pending_segments() == []
+    today = datetime.fromtimestamp(now_ns / 1e9)
+    df = pd.read_csv(restarted.raw_filename(today.year, today.month, today.day))
+    assert df["id"].tolist() == ["pyrometer/ir_01", "heater/enable"]
+    assert df["value"].tolist() == ["1.5", "ON"]
+
+
+def test_stop_flushes_buffer_and_write_ahead_log(tmp_path):
+    config = replace(EXTRACTION_CONFIG, output_directory = str(tmp_path), write_ahead_log = True, async_writer = True)
+    client = DataExtractionClient(broker_config = BROKER_CONFIG, data_extraction_config = config)
+    client.append_to_buffer([(time.time_ns(), "t", "pyrometer/ir_01", 1.5)])
+    client.stop()
+    assert client.buffer.empty()
+    assert client.wal.pending_segments() == []
+    today = client.start_time
+    assert pd.read_csv(client.raw_filename(today.year, today.month, today.day))["value"].tolist() == [1.5]
+
+
+@pytest.mark.parametrize("async_writer", [False, True])
+def test_full_buffer_spills_and_drains_in_order(tmp_path, async_writer):
+    config = replace(EXTRACTION_CONFIG, output_directory = str(tmp_path), spill_to_disk = True, spill_high_water = 5, async_writer = async_writer)
+    client = DataExtractionClient(broker_config = BROKER_CONFIG, data_extraction_config = config)
+    now_ns = time.time_ns()
+    for second in range(12):
+        client.append_to_buffer([(now_ns + second * 1_000, "t", "pyrometer/ir_01", float(second))])
+    assert len(client.buffer) == 5
+    assert client.spill.rows_spilled == 7
+    assert client.flush_requested is True
+
+    client.dump_buffer_to_csv()
+    client.append_to_buffer([(now_ns + 12_000, "t", "pyrometer/ir_01", 12.0)])
+    client.stop()
+    today = client.start_time
+    assert pd.read_csv(client.raw_filename(today.year, today.month, today.day))["value"].tolist() == [float(second) for second in range(13)]
+    assert client.spill.pending_bytes == 0
+    assert client.spill.pending_segments() == []
+
+
+def test_spilled_rows_are_replayed_on_start(tmp_path):
+    config = replace(EXTRACTION_CONFIG, output_directory = str(tmp_path), spill_to_disk = True)
+    now_ns = time.time_ns()
+    # Left behind by a run killed before the spill was drained
+    spill = SpillQueue(str(tmp_path), config.output_filename, budget_bytes = 10**6)
+    spill.append([(now_ns + second * 1_000, "t", "pyrometer/ir_01", float(second)) for second in range(3)])
+    spill.close()
+
+    restarted = DataExtractionClient(broker_config = BROKER_CONFIG, data_extraction_config = config)
+    assert restarted.spill.pending_segments() == []
+    today = datetime.fromtimestamp(now_ns / 1e9)
+    assert pd.read_csv(restarted.raw_filename(today.year, today.month, today.day))["value"].tolist() == [0.0, 1.0, 2.0]
+
+
+@pytest.mark.parametrize("field, value", [("spill_high_water", 0), ("spill_budget_mb", 0), ("spill_drop_policy", "block")])
+def test_spill_config_fails(field, value):
+    with pytest.raises(ValueError):
+        replace(EXTRACTION_CONFIG, **{field: value})
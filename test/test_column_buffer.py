@@ -0,0 +1,68 @@
+import pytest
+import pandas as pd
+from datetime import datetime
+from data_extraction.column_buffer import ColumnarBuffer
+
+
+@pytest.fixture
+def buffer() -> ColumnarBuffer:
+    return ColumnarBuffer(capacity = 4)
+
+
+def test_append_and_dump(buffer):
+    buffer.append(1_000, "p0/normal/sensor/a/pyrometer/ir_01", "sensor/pyrometer/ir_01", 20.0)
+    buffer.append(2_000, "p0/normal/control/a/heater/enable", "control/heater/enable", "ON")
+    buffer.append(3_000, "p0/normal/sensor/a/pyrometer/ir_01", "sensor/pyrometer/ir_01", 21.0)
+    assert len(buffer) == 3
+    assert buffer[1]["value"] == "ON"
+    assert buffer[-1]["id"] == "sensor/pyrometer/ir_01"
+
+    batch = buffer.dump()
+    assert buffer.empty() is True
+    assert len(batch) == 3
+    assert batch.time_ns.tolist() == [1_000, 2_000, 3_000]
+    assert batch.id_codes.tolist() == [0, 1, 0]
+    assert batch.objects == {1: "ON"}
+    assert batch.value_column().tolist() == [20.0, "ON", 21.0]
+
+
+def test_overwrite_oldest(buffer):
+    for index in range(6):
+        buffer.append(index, "topic", "id", float(index))
+    assert len(buffer) == 4
+    assert buffer.overwritten == 2
+    batch = buffer.dump()
+    assert batch.time_ns.tolist() == [2, 3, 4, 5]
+    assert batch.values.tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_side_store_slot_reused(buffer):
+    buffer.append(0, "topic", "id", "ON")
+    for index in range(1, 5):
+        buffer.append(index, "topic", "id", float(index))
+    batch = buffer.dump()
+    assert batch.objects == {}
+    assert batch.values.tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_to_frame_matches_list_buffer(buffer):
+    now = datetime(2024, 5, 29, 8, 45, 46, 250000)
+    time_ns = int(now.timestamp() * 1e6) * 1_000
+    buffer.append(time_ns + 999, "p0/normal/sensor/a/pyrometer/ir_01", "sensor/pyrometer/ir_01", 20.5)
+    buffer.append(time_ns, "p0/normal/control/a/heater/enable", "control/heater/enable", True)
+    expected = pd.DataFrame([
+        {"time": now, "topic": "p0/normal/sensor/a/pyrometer/ir_01", "id": "sensor/pyrometer/ir_01", "value": 20.5},
+        {"time": now, "topic": "p0/normal/control/a/heater/enable", "id": "control/heater/enable", "value": True},
+    ])
+    df = buffer.dump().to_frame()
+    assert df.to_csv(index = False) == expected.to_csv(index = False)
+
+
+def test_batch_valid_until_next_dump(buffer):
+    buffer.append(1, "topic", "id", 1.0)
+    batch = buffer.dump()
+    buffer.append(2, "topic", "id", 2.0)
+    assert batch.values.tolist() == [1.0]
+    buffer.dump()
+    buffer.append(3, "topic", "id", 3.0)
+    assert batch.values.tolist() == [3.0]
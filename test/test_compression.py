@@ -0,0 +1,68 @@
+import pytest
+import os
+import gzip
+import lzma
+import pandas as pd
+from data_extraction.compression import (compress_member, iter_lines, pandas_compression, compression_from_filename)
+from data_extraction.csv_writer import StreamingCsvWriter
+
+
+@pytest.mark.parametrize("compression,extension,opener", [
+    ("gzip", ".gz", gzip.open),
+    ("xz", ".xz", lzma.open),
+])
+def test_members_concatenate(tmp_path, compression, extension, opener):
+    filename = str(tmp_path / f"raw.csv{extension}")
+    with open(filename, "ab") as file:
+        file.write(compress_member(b"time,id\n", compression, 1))
+        file.write(compress_member(b"1,a\n2,b\n", compression, 9))
+    with opener(filename, "rb") as file:
+        assert file.read() == b"time,id\n1,a\n2,b\n"
+    assert list(iter_lines(filename)) == ["time,id\n", "1,a\n", "2,b\n"]
+
+
+def test_no_compression_passthrough(tmp_path):
+    assert compress_member(b"abc", "none") == b"abc"
+    filename = str(tmp_path / "raw.csv")
+    with open(filename, "w") as file:
+        file.write("a\nb\n")
+    assert list(iter_lines(filename)) == ["a\n", "b\n"]
+
+
+def test_compression_from_filename():
+    assert compression_from_filename("raw.csv.gz") == "gzip"
+    assert compression_from_filename("raw.csv.xz") == "xz"
+    assert compression_from_filename("raw.csv") == "none"
+
+
+@pytest.mark.parametrize("compression,extension", [("gzip", ".gz"), ("xz", ".xz")])
+def test_truncated_member_is_skipped(tmp_path, compression, extension):
+    filename = str(tmp_path / f"raw.csv{extension}")
+    complete = compress_member(b"time,id\n1,a\n", compression)
+    partial = compress_member(b"2,b\n" * 1000, compression)
+    with open(filename, "wb") as file:
+        file.write(complete + partial[:len(partial) // 2])
+    lines = list(iter_lines(filename))
+    assert lines[:2] == ["time,id\n", "1,a\n"]
+    assert all(line == "2,b\n" for line in lines[2:])
+
+
+@pytest.mark.parametrize("compression,extension", [("gzip", ".gz"), ("xz", ".xz")])
+def test_stream_writer_matches_pandas(tmp_path, compression, extension):
+    frames = [pd.DataFrame({"id": ["a", "b"], "value": [1.5, 2.5]}), pd.DataFrame({"id": ["c"], "value": [3.5]})]
+    pandas_filename = str(tmp_path / f"pandas.csv{extension}")
+    stream_filename = str(tmp_path / f"stream.csv{extension}")
+    writer = StreamingCsvWriter(compression = compression, compression_level = 1)
+    for df in frames:
+        df.to_csv(
+            pandas_filename, mode = "a", header = not os.path.exists(pandas_filename), index = False,
+            compression = pandas_compression(compression, 1)
+        )
+        writer.write(stream_filename, ["id", "value"], [df["id"].tolist(), df["value"].astype(str).tolist()])
+    writer.close()
+    assert list(iter_lines(stream_filename)) == list(iter_lines(pandas_filename))
+
+
+def test_stream_writer_rejects_unknown_compression():
+    with pytest.raises(ValueError):
+        StreamingCsvWriter(compression = "zip")
@@ -0,0 +1,81 @@
+import pytest
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from data_extraction.csv_writer import (StreamingCsvWriter, rows_to_csv_columns, format_datetime_column)
+from data_extraction.column_buffer import ColumnarBuffer
+
+
+def pandas_append(rows: list[dict], filename: str) -> None:
+    # Same call the pandas raw writer makes
+    df = pd.DataFrame(rows)
+    df.to_csv(filename, mode = "a", header = not os.path.exists(filename), index = False)
+
+
+@pytest.mark.parametrize("times", [
+    [datetime(2024, 5, 2, 12, 0, 0, 250123), datetime(2024, 5, 2, 12, 0, 1)],
+    [datetime(2024, 5, 2, 12, 0, 0, 250000), datetime(2024, 5, 2, 12, 0, 1)],
+    [datetime(2024, 5, 2, 12, 0, 0), datetime(2024, 5, 2, 12, 0, 1)],
+    [datetime(2024, 5, 2), datetime(2024, 5, 3)],
+])
+def test_datetime_format_matches_pandas(times):
+    expected = pd.DataFrame({"time": times}).to_csv(index = False).splitlines()[1:]
+    assert format_datetime_column(np.array(times, dtype = "datetime64[us]")).tolist() == expected
+
+
+@pytest.mark.parametrize("values", [
+    [20.0, 0.1, 1e16, 1e-05, float("nan")],
+    [20.0, "ON", True, "a,b", 'say "hi"', float("nan")],
+    ["ON", "OFF", "", "x", "y"],
+])
+def test_rows_byte_identical_to_pandas(tmp_path, values):
+    rows = [
+        {"time": datetime(2024, 5, 2, 12, 0, index, 1000 * index), "topic": f"p0/n/sensor/m/pyro/ir_{index}",
+         "id": f"sensor/pyro/ir_{index}", "value": value}
+        for (index, value) in enumerate(values)
+    ]
+    pandas_filename = str(tmp_path / "pandas.csv")
+    stream_filename = str(tmp_path / "stream.csv")
+    writer = StreamingCsvWriter()
+    for _ in range(2):
+        pandas_append(rows, pandas_filename)
+        writer.write(stream_filename, *rows_to_csv_columns(rows))
+    writer.close()
+    assert open(stream_filename, "rb").read() == open(pandas_filename, "rb").read()
+
+
+def test_columnar_batch_byte_identical_to_pandas(tmp_path):
+    buffer = ColumnarBuffer(capacity = 8)
+    time_ns = 1_717_000_000_123_456_789
+    for (index, value) in enumerate([1.5, "OFF", 2.25, False]):
+        buffer.append(time_ns + index * 10**8, "p0/n/control/m/valve/state", "control/valve/state", value)
+    batch = buffer.dump()
+
+    pandas_filename = str(tmp_path / "pandas.csv")
+    stream_filename = str(tmp_path / "stream.csv")
+    batch.to_frame(time_ns_column = True).to_csv(pandas_filename, index = False)
+    writer = StreamingCsvWriter(fsync_policy = "flush")
+    writer.write(stream_filename, *batch.to_csv_columns(time_ns_column = True))
+    writer.close()
+    assert open(stream_filename, "rb").read() == open(pandas_filename, "rb").read()
+
+
+def test_header_written_once_per_file(tmp_path):
+    rows = [{"time": datetime(2024, 5, 2, 12), "topic": "t", "id": "i", "value": 1.0}]
+    writer = StreamingCsvWriter()
+    first = str(tmp_path / "first.csv")
+    second = str(tmp_path / "second.csv")
+    writer.write(first, *rows_to_csv_columns(rows))
+    writer.write(second, *rows_to_csv_columns(rows))
+    writer.write(second, *rows_to_csv_columns(rows))
+    writer.close()
+    writer.write(first, *rows_to_csv_columns(rows))
+    writer.close()
+    assert open(first).read().count("time,topic,id,value") == 1
+    assert open(second).read().splitlines()[1:] == ["2024-05-02 12:00:00,t,i,1.0"] * 2
+
+
+def test_invalid_fsync_policy():
+    with pytest.raises(ValueError):
+        StreamingCsvWriter(fsync_policy = "sometimes")
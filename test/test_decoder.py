@@ -0,0 +1,57 @@
+import pytest
+from data_extraction.decoder import (PayloadDecoder, NUMERIC, MIXED)
+
+
+@pytest.fixture
+def decoder() -> PayloadDecoder:
+    return PayloadDecoder()
+
+
+@pytest.mark.parametrize("payload, expected", [
+    (b"20.5", 20.5),
+    (b"-3", -3.0),
+    (b" 1e3 ", 1000.0),
+    (b"inf", float("inf")),
+    (b"true", True),
+    (b"false", False),
+    (b"ON", "ON"),
+    (b"", ""),
+    (b'"running"', "running"),
+    (b"[1, 2]", None),
+    (b'{"a": 1}', None),
+    (b"null", None),
+    (b"nan", None),
+    (b"not json {", "not json {"),
+    (None, None),
+])
+def test_decode(decoder, payload, expected):
+    value = decoder.decode("topic", payload)
+    assert value == expected
+    assert type(value) is type(expected)
+
+
+def test_decode_memoryview(decoder):
+    assert decoder.decode("topic", memoryview(b"12.5")) == 12.5
+    assert decoder.decode("other", memoryview(b"OFF")) == "OFF"
+
+
+def test_type_hints(decoder):
+    assert decoder.decode("pressure", b"1.0") == 1.0
+    assert decoder.type_hint("pressure") == NUMERIC
+    assert decoder.decode("pressure", b"nan") is None
+    assert decoder.type_hint("pressure") == NUMERIC
+    assert decoder.decode("pressure", b"OFF") == "OFF"
+    assert decoder.type_hint("pressure") == MIXED
+    assert decoder.decode("pressure", b"2.0") == 2.0
+
+    assert decoder.decode("valve", b"ON") == "ON"
+    assert decoder.type_hint("valve") == MIXED
+
+
+def test_type_hints_are_bounded():
+    decoder = PayloadDecoder(maxsize = 2)
+    for topic in ("a", "b", "a", "c"):
+        decoder.decode(topic, b"1.0")
+    assert [decoder.type_hint(topic) for topic in ("a", "b", "c")] == [NUMERIC, None, NUMERIC]
+    with pytest.raises(ValueError):
+        PayloadDecoder(maxsize = 0)
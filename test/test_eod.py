@@ -0,0 +1,426 @@
+import pytest
+import random
+import numpy as np
+import pandas as pd
+from data_extraction.eod import (
+    resample_long, GapInterpolator, StreamingResampler, LiveAggregator, aggregate_columns, bucket_index, bucket_origin_ns, gap_buckets,
+    last_value, sum_count, AGGREGATIONS
+)
+
+
+def dense_reference(times: list, ids: list, values: list, resample_seconds) -> pd.DataFrame:
+    # What process_data does with one dense row per raw row
+    id_list = list(dict.fromkeys(ids))
+    rows = [
+        {"time": row_time, **{unique_id: (value if unique_id == row_id else None) for unique_id in id_list}}
+        for (row_time, row_id, value) in zip(times, ids, values)
+    ]
+    df = pd.DataFrame(rows)
+    df["time"] = pd.to_datetime(df["time"], format = "ISO8601")
+    df = df.set_index("time")
+    float_columns = []
+    for column in df.columns:
+        try:
+            df[column].astype(float)
+            float_columns.append(column)
+        except ValueError:
+            pass
+    string_columns = [column for column in df.columns if column not in float_columns]
+    float_df = df[float_columns].astype("float64").resample(f"{resample_seconds}s").mean().round(10)
+    string_df = df[string_columns].resample(f"{resample_seconds}s").last()
+    return pd.concat([float_df, string_df], axis = 1).dropna(axis = 0, how = "all")
+
+
+def test_mean_per_bucket():
+    times = ["2024-05-02 12:00:00.25", "2024-05-02 12:00:00.75", "2024-05-02 12:00:01.5", "2024-05-02 12:00:03"]
+    df = resample_long(times, ["a", "a", "a", "a"], [1.0, 2.0, float("nan"), 4.0], 1)
+    assert df.index.tolist() == [pd.Timestamp("2024-05-02 12:00:00"), pd.Timestamp("2024-05-02 12:00:03")]
+    assert df["a"].tolist() == [1.5, 4.0]
+
+
+def test_string_ids_keep_last_value():
+    times = ["2024-05-02 12:00:00.1", "2024-05-02 12:00:00.2", "2024-05-02 12:00:00.3", "2024-05-02 12:00:01"]
+    df = resample_long(times, ["s", "s", "f", "s"], ["ON", 2.0, 5.0, "OFF"], 1)
+    assert list(df.columns) == ["f", "s"]
+    assert df["s"].tolist() == [2.0, "OFF"]
+    assert df["f"].iloc[0] == 5.0
+    assert np.isnan(df["f"].iloc[1])
+
+
+def test_bucket_origin_is_start_of_day():
+    time_ns = np.array(["2024-05-02T12:00:05", "2024-05-02T12:00:13"], dtype = "datetime64[ns]").view(np.int64)
+    origin_ns = bucket_origin_ns(time_ns)
+    assert origin_ns == pd.Timestamp("2024-05-02").value
+    expected = pd.Series([1, 1], index = pd.to_datetime(time_ns)).resample("7s").sum()
+    buckets = origin_ns + bucket_index(time_ns, 7 * 10**9, origin_ns) * 7 * 10**9
+    assert buckets.tolist() == [stamp.value for stamp in expected.index[expected > 0]]
+
+
+def test_group_primitives():
+    keys = np.array([3, 1, 3, 1, 2])
+    (unique_keys, sums, counts) = sum_count(keys, np.array([1.0, 2.0, 3.0, np.nan, 5.0]))
+    assert unique_keys.tolist() == [1, 2, 3]
+    assert sums.tolist() == [2.0, 5.0, 4.0]
+    assert counts.tolist() == [1, 1, 2]
+    (unique_keys, last) = last_value(keys, np.array(["a", "b", "c", None, "e"], dtype = object))
+    assert unique_keys.tolist() == [1, 2, 3]
+    assert last.tolist() == ["b", "e", "c"]
+
+
+def test_empty_chunk():
+    assert resample_long([], [], [], 1).empty
+
+
+@pytest.mark.parametrize("resample_seconds", [1, 0.5, 7])
+def test_matches_dense_resample(resample_seconds):
+    random.seed(resample_seconds)
+    start = pd.Timestamp("2024-05-02 12:00:00").value
+    for _ in range(20):
+        count = random.randint(1, 300)
+        time_ns = sorted(start + random.randrange(20 * 10**9) for _ in range(count))
+        times = [str(pd.Timestamp(row_ns)) for row_ns in time_ns]
+        ids = [f"id_{random.randrange(5)}" for _ in range(count)]
+        values = [
+            random.choice(["ON", "OFF", 1.5]) if row_id == "id_4"
+            else random.choice([round(random.uniform(-10, 10), 3), float("nan")])
+            for row_id in ids
+        ]
+        actual = resample_long(times, ids, values, resample_seconds)
+        expected = dense_reference(times, ids, values, resample_seconds)
+        assert actual.to_csv() == expected.to_csv()
+
+
+def random_day(seed: int, count: int = 2_000) -> tuple[list, list, list]:
+    random.seed(seed)
+    start = pd.Timestamp("2024-05-02 12:00:00").value
+    time_ns = sorted(start + random.randrange(60 * 10**9) for _ in range(count))
+    times = [str(pd.Timestamp(row_ns)) for row_ns in time_ns]
+    ids = [f"id_{random.randrange(8)}" for _ in range(count)]
+    values = [
+        random.choice(["ON", "OFF"]) if row_id == "id_7"
+        else random.choice([random.uniform(-10, 10), float("nan")])
+        for row_id in ids
+    ]
+    return (times, ids, values)
+
+
+@pytest.mark.parametrize("chunk_rows,count", [(1, 200), (7, 2_000), (250, 2_000), (5_000, 2_000)])
+def test_streaming_matches_whole_day(chunk_rows, count):
+    (times, ids, values) = random_day(chunk_rows, count)
+    resampler = StreamingResampler(1)
+    frames = []
+    for start in range(0, len(times), chunk_rows):
+        frames.append(resampler.add(times[start:start + chunk_rows], ids[start:start + chunk_rows], values[start:start + chunk_rows]))
+    frames.append(resampler.finish())
+    columns = list(dict.fromkeys(ids))
+    actual = pd.concat([frame for frame in frames if not frame.empty]).reindex(columns = columns)
+    expected = dense_reference(times, ids, values, 1).reindex(columns = columns)
+    assert actual.to_csv() == expected.to_csv()
+    assert resampler.late_rows == 0
+
+
+def test_streaming_state_is_one_bucket():
+    resampler = StreamingResampler(1)
+    closed = resampler.add(
+        ["2024-05-02 12:00:00.1", "2024-05-02 12:00:00.9", "2024-05-02 12:00:01.2"],
+        ["a", "b", "a"], [1.0, "ON", 3.0]
+    )
+    assert closed.index.tolist() == [pd.Timestamp("2024-05-02 12:00:00")]
+    assert resampler.open_buckets() == 1
+    closed = resampler.add(["2024-05-02 12:00:01.5"], ["a"], [5.0])
+    assert closed.empty
+    assert resampler.finish()["a"].tolist() == [4.0]
+
+
+def test_streaming_late_rows_are_kept():
+    resampler = StreamingResampler(1)
+    resampler.add(["2024-05-02 12:00:00.5", "2024-05-02 12:00:02"], ["a", "a"], [1.0, 2.0])
+    assert resampler.add(["2024-05-02 12:00:00.7"], ["a"], [3.0])["a"].tolist() == [3.0]
+    assert resampler.late_rows == 1
+    assert resampler.finish()["a"].tolist() == [2.0]
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 70, 5_000])
+def test_rollups_match_direct_resample(chunk_rows):
+    (times, ids, values) = random_day(4)
+    resampler = StreamingResampler(0.5)
+    rollups = {seconds: resampler.roll_up(seconds) for seconds in (10, 30)}
+    frames = {seconds: [] for seconds in rollups}
+    for start in range(0, len(times), chunk_rows):
+        resampler.add(times[start:start + chunk_rows], ids[start:start + chunk_rows], values[start:start + chunk_rows])
+        for (seconds, rollup) in rollups.items():
+            frames[seconds].append(rollup.emit_complete())
+    resampler.finish()
+    for (seconds, rollup) in rollups.items():
+        frames[seconds].append(rollup.finish())
+        direct = StreamingResampler(seconds)
+        direct.accumulate(times, ids, values)
+        expected = direct.finish()
+        actual = pd.concat([frame for frame in frames[seconds] if not frame.empty]).reindex(columns = expected.columns)
+        pd.testing.assert_frame_equal(actual, expected)
+        # Every bucket was written once
+        assert actual.index.is_unique
+
+
+def aggregated_day(resampler: StreamingResampler, times: list, ids: list, values: list, chunk_rows: int) -> pd.DataFrame:
+    frames = []
+    for start in range(0, len(times), chunk_rows):
+        frames.append(resampler.add(times[start:start + chunk_rows], ids[start:start + chunk_rows], values[start:start + chunk_rows]))
+    frames.append(resampler.finish())
+    return pd.concat([frame for frame in frames if not frame.empty])
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 70, 5_000])
+def test_aggregations_match_pandas(chunk_rows):
+    (times, ids, values) = random_day(5)
+    aggregations = {"id_[01]": list(AGGREGATIONS), "id_7": ["first", "last", "count"]}
+    actual = aggregated_day(StreamingResampler(2, aggregations = aggregations), times, ids, values, chunk_rows)
+    rows = pd.DataFrame({"time": pd.to_datetime(times), "id": ids, "value": values}).set_index("time")
+    for field_id in ("id_0", "id_1", "id_7"):
+        series = rows.loc[rows["id"] == field_id, "value"]
+        if field_id != "id_7":
+            series = series.astype("float64")
+        for function in aggregations["id_7" if field_id == "id_7" else "id_[01]"]:
+            expected = getattr(series.resample("2s"), function)()
+            column = actual[f"{field_id}_{function}"].reindex(expected.index)
+            if function == "count":
+                assert column.tolist() == expected.tolist()
+            elif field_id == "id_7":
+                assert column.fillna("").tolist() == expected.fillna("").tolist()
+            else:
+                # An empty bucket sums to nothing rather than 0
+                expected = expected.where(series.resample("2s").count() > 0).round(10)
+                np.testing.assert_allclose(column.to_numpy(dtype = float), expected.to_numpy(dtype = float), rtol = 1e-9)
+    # Ids without a pattern keep their plain mean column
+    expected = dense_reference(times, ids, values, 2)
+    pd.testing.assert_series_equal(actual["id_2"].reindex(expected.index), expected["id_2"], check_freq = False)
+    assert "id_0" not in actual.columns
+
+
+def test_aggregate_columns():
+    aggregations = {"*/pressure/*": ["mean", "max"], "*/valve/*": ["last"]}
+    assert aggregate_columns(["a/pressure/p1", "a/valve/v1", "a/temperature/t1"], aggregations) == [
+        "a/pressure/p1_mean", "a/pressure/p1_max", "a/valve/v1_last", "a/temperature/t1"
+    ]
+    assert aggregate_columns(["a"], None) == ["a"]
+    with pytest.raises(ValueError):
+        StreamingResampler(1, aggregations = {"*": ["median"]})
+
+
+def test_aggregations_roll_up_and_merge():
+    (times, ids, values) = random_day(6)
+    aggregations = {"id_*": ["min", "max", "std", "first", "count"]}
+    direct = StreamingResampler(10, aggregations = aggregations)
+    direct.accumulate(times, ids, values)
+    expected = direct.finish()
+
+    resampler = StreamingResampler(1, aggregations = aggregations)
+    rollup = resampler.roll_up(10)
+    frames = []
+    for start in range(0, len(times), 300):
+        resampler.add(times[start:start + 300], ids[start:start + 300], values[start:start + 300])
+        frames.append(rollup.emit_complete())
+    resampler.finish()
+    frames.append(rollup.finish())
+    actual = pd.concat([frame for frame in frames if not frame.empty]).reindex(columns = expected.columns)
+    pd.testing.assert_frame_equal(actual, expected)
+
+    # Halves of the day aggregated apart and merged give the same buckets
+    origin_ns = bucket_origin_ns(np.array([pd.Timestamp(times[0]).value]))
+    (first, second) = (StreamingResampler(10, origin_ns = origin_ns, aggregations = aggregations) for _ in range(2))
+    first.accumulate(times[:1_000], ids[:1_000], values[:1_000])
+    second.accumulate(times[1_000:], ids[1_000:], values[1_000:])
+    merged = StreamingResampler(10, origin_ns = origin_ns, aggregations = aggregations)
+    merged.merge_partial(first.take_partial())
+    merged.merge_partial(second.take_partial())
+    pd.testing.assert_frame_equal(merged.finish().reindex(columns = expected.columns), expected)
+
+
+def test_rollup_needs_a_multiple():
+    resampler = StreamingResampler(2)
+    with pytest.raises(ValueError):
+        resampler.roll_up(3)
+    with pytest.raises(ValueError):
+        resampler.roll_up(2)
+
+
+def test_streaming_retyped_id_is_counted():
+    resampler = StreamingResampler(1)
+    assert resampler.add(["2024-05-02 12:00:00", "2024-05-02 12:00:01"], ["a", "a"], [1.0, 2.0])["a"].tolist() == [1.0]
+    assert resampler.add(["2024-05-02 12:00:02"], ["a"], ["ON"])["a"].tolist() == [2.0]
+    assert resampler.retyped_ids == 1
+    assert resampler.finish()["a"].tolist() == ["ON"]
+
+
+def interpolated_reference(df: pd.DataFrame, limit: int) -> pd.DataFrame:
+    # Whole day pandas interpolation, with the gaps longer than limit emptied again
+    full = df.reindex(pd.date_range(df.index[0], df.index[-1], freq = "1s", name = "time"))
+    for column in full.columns:
+        missing = full[column].isna()
+        gap_length = missing.groupby((~missing).cumsum()).transform("sum")
+        filled = full[column].interpolate(method = "time", limit_area = "inside")
+        full[column] = filled.mask(missing & (gap_length > limit)).round(10)
+    return full.dropna(axis = 0, how = "all")
+
+
+def test_gap_buckets():
+    assert gap_buckets(np.array([3, 5, 9, 10]), 0, 2).tolist() == [1, 2, 4]
+    assert gap_buckets(np.array([3, 5, 9, 10]), 0, 3).tolist() == [1, 2, 4, 6, 7, 8]
+
+
+@pytest.mark.parametrize("limit", [0, 1, 4])
+@pytest.mark.parametrize("chunk_rows", [1, 7, 500])
+def test_gap_interpolation_matches_whole_day(limit, chunk_rows):
+    random.seed(limit)
+    start = stamp_ns("2024-05-02 12:00:00")
+    time_ns = start + np.cumsum([random.choice([2, 5, 10, 30, 80]) * 10**8 for _ in range(500)])
+    ids = [f"id_{random.randrange(4)}" for _ in range(500)]
+    values = [round(random.uniform(-10, 10), 3) for _ in range(500)]
+    whole = StreamingResampler(1)
+    whole.accumulate_ns(time_ns, ids, np.array(values))
+    expected = interpolated_reference(whole.finish(), limit)
+
+    resampler = StreamingResampler(1)
+    interpolator = GapInterpolator(1, limit)
+    frames = []
+    for index in range(0, len(time_ns), chunk_rows):
+        resampler.accumulate_ns(time_ns[index:index + chunk_rows], ids[index:index + chunk_rows], np.array(values[index:index + chunk_rows]))
+        frames.append(interpolator.push(resampler.emit_closed()))
+        # Only the buckets of a gap that may still be filled are held back
+        assert len(interpolator._pending) <= limit
+    frames.append(interpolator.finish(resampler.finish()))
+    actual = pd.concat(frames).reindex(columns = expected.columns)
+    pd.testing.assert_frame_equal(actual, expected, check_freq = False)
+
+
+def test_gap_interpolation_skips_strings_and_edges():
+    interpolator = GapInterpolator(1, 2)
+    index = pd.DatetimeIndex(pd.to_datetime([
+        "2024-05-02 12:00:00", "2024-05-02 12:00:01", "2024-05-02 12:00:03", "2024-05-02 12:00:04"
+    ]), name = "time")
+    df = pd.DataFrame({"a": [np.nan, 1.0, 3.0, np.nan], "b": ["ON", None, None, "OFF"]}, index = index)
+    df["b"] = df["b"].astype(object)
+    actual = interpolator.finish(df)
+    assert actual.index.strftime("%S").tolist() == ["00", "01", "02", "03", "04"]
+    assert actual["a"].fillna(-1).tolist() == [-1, 1.0, 2.0, 3.0, -1]
+    assert actual["b"].fillna("").tolist() == ["ON", "", "", "", "OFF"]
+    assert interpolator.filled == 1
+
+
+class ProcessedFile():
+    # Stands in for the client's write_processed_chunk and widen_processed_file
+    def __init__(self):
+        self.frames = []
+        self.filenames = []
+        self.widened = None
+
+    def write(self, df, id_list, processed_filename, written_columns, resample_seconds = None):
+        if df.empty:
+            return written_columns
+        self.frames.append(df.reindex(columns = id_list))
+        self.filenames.append(processed_filename)
+        return len(id_list) if written_columns is None else written_columns
+
+    def widen(self, processed_filename, id_list):
+        self.widened = id_list
+
+
+def stamp_ns(text: str) -> int:
+    return pd.Timestamp(text).value
+
+
+def test_live_aggregator_waits_for_lag():
+    processed = ProcessedFile()
+    aggregator = LiveAggregator(1, 5, processed.write, processed.widen)
+    aggregator.start_day("raw.csv", "processed.csv")
+    time_ns = np.array([stamp_ns("2024-05-02 12:00:00.5"), stamp_ns("2024-05-02 12:00:03.5")])
+    aggregator.add("raw.csv", time_ns, ["a", "a"], np.array([1.0, 3.0]))
+
+    aggregator.emit(stamp_ns("2024-05-02 12:00:05.5"))
+    assert processed.frames == []
+    aggregator.emit(stamp_ns("2024-05-02 12:00:06"))
+    assert [frame["a"].tolist() for frame in processed.frames] == [[1.0]]
+
+    # Within the lag a row still joins its bucket
+    aggregator.add("raw.csv", np.array([stamp_ns("2024-05-02 12:00:03.9")]), ["a"], np.array([5.0]))
+    assert aggregator.finish("raw.csv")
+    assert [frame["a"].tolist() for frame in processed.frames] == [[1.0], [4.0]]
+    assert aggregator.late_rows == 0
+
+
+def test_live_aggregator_interpolates_gaps():
+    processed = ProcessedFile()
+    aggregator = LiveAggregator(1, 0, processed.write, processed.widen, nan_limit = 2)
+    aggregator.start_day("raw.csv", "processed.csv")
+    aggregator.add("raw.csv", np.array([stamp_ns("2024-05-02 12:00:00"), stamp_ns("2024-05-02 12:00:01")]), ["a", "a"], np.array([1.0, 2.0]))
+    aggregator.emit(stamp_ns("2024-05-02 12:00:02"))
+    assert [frame["a"].tolist() for frame in processed.frames] == [[1.0, 2.0]]
+    # The gap after buckets already written is filled once its end arrives
+    aggregator.add("raw.csv", np.array([stamp_ns("2024-05-02 12:00:04")]), ["a"], np.array([5.0]))
+    aggregator.finish("raw.csv")
+    assert pd.concat(processed.frames)["a"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_live_aggregator_writes_rollups():
+    processed = ProcessedFile()
+    aggregator = LiveAggregator(1, 0, processed.write, processed.widen, rollup_seconds = [10])
+    aggregator.start_day("raw.csv", "20240502-processed.csv")
+    time_ns = stamp_ns("2024-05-02 12:00:00") + np.arange(25) * 10**9
+    aggregator.add("raw.csv", time_ns, ["a"] * 25, np.arange(25, dtype = float))
+    aggregator.emit(stamp_ns("2024-05-02 12:00:15"))
+    assert processed.filenames == ["20240502-processed.csv", "20240502-processed-10s.csv"]
+    assert processed.frames[1]["a"].tolist() == [4.5]
+    aggregator.finish("raw.csv")
+    rollup = pd.concat([frame for (frame, filename) in zip(processed.frames, processed.filenames) if filename.endswith("-10s.csv")])
+    assert rollup["a"].tolist() == [4.5, 14.5, 22.0]
+
+
+def test_live_aggregator_writes_aggregates():
+    processed = ProcessedFile()
+    aggregator = LiveAggregator(1, 0, processed.write, processed.widen, aggregations = {"p*": ["max", "count"]})
+    aggregator.start_day("raw.csv", "processed.csv")
+    time_ns = stamp_ns("2024-05-02 12:00:00") + np.arange(6) * 5 * 10**8
+    aggregator.add("raw.csv", time_ns, ["pressure", "a"] * 3, np.arange(6, dtype = float))
+    aggregator.finish("raw.csv")
+    df = pd.concat(processed.frames)
+    assert list(df.columns) == ["pressure_max", "pressure_count", "a"]
+    assert df["pressure_max"].tolist() == [0.0, 2.0, 4.0]
+    assert df["pressure_count"].tolist() == [1, 1, 1]
+    assert df["a"].tolist() == [1.0, 3.0, 5.0]
+
+
+def test_live_aggregator_widens_new_ids():
+    processed = ProcessedFile()
+    aggregator = LiveAggregator(1, 0, processed.write, processed.widen)
+    aggregator.start_day("raw.csv", "processed.csv")
+    aggregator.add("raw.csv", np.array([stamp_ns("2024-05-02 12:00:00")]), ["a"], [1.0])
+    aggregator.emit(stamp_ns("2024-05-02 12:00:01"))
+    aggregator.add("raw.csv", np.array([stamp_ns("2024-05-02 12:00:01")]), ["b"], ["ON"])
+    aggregator.finish("raw.csv")
+    assert processed.widened == ["a", "b"]
+
+
+def test_live_aggregator_ignores_days_not_started():
+    processed = ProcessedFile()
+    aggregator = LiveAggregator(1, 0, processed.write, processed.widen)
+    aggregator.add("raw.csv", np.array([stamp_ns("2024-05-02 12:00:00")]), ["a"], [1.0])
+    assert aggregator.ignored_rows == 1
+    assert not aggregator.finish("raw.csv")
+
+
+def test_partials_merge_into_one_day():
+    (times, ids, values) = random_day(3)
+    whole = StreamingResampler(1)
+    whole.accumulate(times, ids, values)
+    expected = whole.finish()
+
+    origin_ns = bucket_origin_ns(np.array([stamp_ns(times[0])]))
+    (first, second) = (StreamingResampler(1, origin_ns = origin_ns), StreamingResampler(1, origin_ns = origin_ns))
+    first.accumulate(times[:1_000], ids[:1_000], values[:1_000])
+    second.accumulate(times[1_000:], ids[1_000:], values[1_000:])
+    merged = StreamingResampler(1, origin_ns = origin_ns)
+    merged.merge_partial(first.take_partial())
+    merged.merge_partial(second.take_partial())
+    assert first.open_buckets() == 0
+    actual = merged.finish().reindex(columns = expected.columns)
+    assert actual.to_csv() == expected.to_csv()
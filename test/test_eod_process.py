@@ -0,0 +1,179 @@
+import os
+import subprocess
+import sys
+import time
+import pandas as pd
+import psutil
+from data_extraction.eod_process import (EodJob, EodProcessRunner, process_day, widen_processed_file, MEMORY_EXIT_CODE)
+from data_extraction.type_registry import (TypeRegistry, MIXED)
+
+
+def write_raw(filename: str, rows: int = 50) -> None:
+    with open(filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for second in range(rows):
+            file.write(f"2024-05-02 12:00:{second % 60:02d}.5,t,pyrometer/ir_01,{float(second)}\n")
+            file.write(f"2024-05-02 12:00:{second % 60:02d}.7,t,heater/enable,{'ON' if second % 2 else 'OFF'}\n")
+
+
+def test_progress_per_chunk(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, 10)
+    progress = []
+    rows = process_day(EodJob(raw_filename, str(tmp_path / "processed.csv"), 1, chunk_rows = 8), progress = progress.append)
+    assert rows == 20
+    assert progress == [8, 16, 20]
+
+
+def test_rerun_replaces_processed_file(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, 10)
+    processed_filename = str(tmp_path / "processed.csv")
+    process_day(EodJob(raw_filename, processed_filename, 1))
+    with open(processed_filename) as file:
+        complete = file.read()
+    # Half a day left behind by an interrupted run is replaced, not appended to
+    with open(processed_filename, "w") as file:
+        file.write(complete[:len(complete) // 2])
+    process_day(EodJob(raw_filename, processed_filename, 1, chunk_rows = 3))
+    with open(processed_filename) as file:
+        assert file.read() == complete
+    assert not list(tmp_path.glob("*.eod"))
+
+
+def test_type_registry_resamples_retyped_id_with_last(tmp_path):
+    raw_filename = str(tmp_path / "20240502-raw.csv")
+    with open(raw_filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        file.write("2024-05-02 12:00:00,t,valve/state,1.0\n")
+        file.write("2024-05-02 12:00:01,t,valve/state,2.0\n")
+        file.write("2024-05-02 12:00:02,t,valve/state,ON\n")
+    TypeRegistry().update(raw_filename, {"valve/state": MIXED})
+    processed_filename = str(tmp_path / "processed.csv")
+    process_day(EodJob(raw_filename, processed_filename, 1, chunk_rows = 1))
+    with open(processed_filename) as file:
+        assert file.read().splitlines()[1:] == [
+            "2024-05-02 12:00:00,1.0", "2024-05-02 12:00:01,2.0", "2024-05-02 12:00:02,ON"
+        ]
+
+
+def test_nan_limit_fills_short_gaps(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    with open(raw_filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for (second, value) in [(0, 0.0), (3, 3.0), (10, 10.0)]:
+            file.write(f"2024-05-02 12:00:{second:02d},t,pyrometer/ir_01,{value}\n")
+    processed_filename = str(tmp_path / "processed.csv")
+    process_day(EodJob(raw_filename, processed_filename, 1, chunk_rows = 1, workers = 2, nan_limit = 2))
+    with open(processed_filename) as file:
+        assert [line.split(",")[1] for line in file.read().splitlines()[1:]] == ["0.0", "1.0", "2.0", "3.0", "10.0"]
+
+
+def test_rollups_are_written_in_the_same_pass(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, 30)
+    processed_filename = str(tmp_path / "20240502-processed.csv")
+    process_day(EodJob(raw_filename, processed_filename, 1, chunk_rows = 7, rollup_seconds = (10,)))
+    rollup = pd.read_csv(tmp_path / "20240502-processed-10s.csv", index_col = 0)
+    assert rollup["pyrometer/ir_01"].tolist() == [4.5, 14.5, 24.5]
+    assert rollup["heater/enable"].tolist() == ["ON"] * 3
+    assert len(pd.read_csv(processed_filename)) == 30
+    assert not list(tmp_path.glob("*.eod"))
+
+
+def test_aggregations_are_written_as_columns(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, 30)
+    processed_filename = str(tmp_path / "20240502-processed.csv")
+    aggregations = {"pyrometer/*": ["min", "max", "count"], "heater/*": ["first", "last"]}
+    process_day(EodJob(raw_filename, processed_filename, 1, chunk_rows = 7, rollup_seconds = (10,), aggregations = aggregations))
+    rollup = pd.read_csv(tmp_path / "20240502-processed-10s.csv", index_col = 0)
+    assert list(rollup.columns) == [
+        "pyrometer/ir_01_min", "pyrometer/ir_01_max", "pyrometer/ir_01_count", "heater/enable_first", "heater/enable_last"
+    ]
+    assert rollup["pyrometer/ir_01_max"].tolist() == [9.0, 19.0, 29.0]
+    assert rollup["pyrometer/ir_01_count"].tolist() == [10] * 3
+    assert rollup["heater/enable_first"].tolist() == ["OFF"] * 3
+    assert len(pd.read_csv(processed_filename)) == 30
+
+
+def test_widen_pads_rows(tmp_path):
+    processed_filename = tmp_path / "processed.csv"
+    processed_filename.write_text("time,a\n2024-05-02 12:00:00,1.0\n")
+    widen_processed_file(str(processed_filename), ["a", "b"])
+    assert processed_filename.read_text().splitlines() == ["time,a,b", "2024-05-02 12:00:00,1.0,"]
+
+
+def test_child_matches_in_process(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename)
+    process_day(EodJob(raw_filename, str(tmp_path / "serial.csv"), 1))
+    runner = EodProcessRunner(retries = 0)
+    assert runner.run(EodJob(raw_filename, str(tmp_path / "child.csv"), 1, chunk_rows = 10))
+    assert (tmp_path / "child.csv").read_text() == (tmp_path / "serial.csv").read_text()
+    assert runner.rows_processed == 100
+    assert not list(tmp_path.glob("*.eod"))
+
+
+def test_failed_child_is_retried(tmp_path):
+    runner = EodProcessRunner(retries = 1)
+    assert not runner.run(EodJob(str(tmp_path / "missing.csv"), str(tmp_path / "processed.csv"), 1))
+    assert (runner.attempts, runner.failures) == (2, 2)
+    assert not (tmp_path / "processed.csv").exists()
+
+
+def test_child_over_memory_budget_halves_chunks(tmp_path, monkeypatch):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename)
+    runner = EodProcessRunner(memory_limit_mb = 1, retries = 1)
+    chunk_rows = []
+    attempt = runner._attempt
+
+    def record(job):
+        chunk_rows.append(job.chunk_rows)
+        return attempt(job)
+
+    monkeypatch.setattr(runner, "_attempt", record)
+    assert not runner.run(EodJob(raw_filename, str(tmp_path / "processed.csv"), 1, chunk_rows = 10))
+    assert chunk_rows == [10, 5]
+    assert not (tmp_path / "processed.csv").exists()
+
+
+WORKERS_OVER_BUDGET = """
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import time
+import psutil
+from data_extraction.eod_process import watch_memory
+
+
+def worker_pid():
+    time.sleep(0.5)
+    return os.getpid()
+
+
+if __name__ == "__main__":
+    executor = ProcessPoolExecutor(max_workers = 2, mp_context = multiprocessing.get_context("spawn"))
+    futures = [executor.submit(worker_pid) for _ in range(2)]
+    print(*[future.result() for future in futures], flush = True)
+    # Over budget only once the workers are counted
+    watch_memory(lambda message: None, psutil.Process().memory_info().rss / (1024*1024) + 1)
+"""
+
+
+def test_memory_budget_counts_and_stops_workers(tmp_path):
+    script = tmp_path / "over_budget.py"
+    script.write_text(WORKERS_OVER_BUDGET)
+    child = subprocess.run(
+        [sys.executable, str(script)], cwd = tmp_path, capture_output = True, text = True,
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}, timeout = 60
+    )
+    assert child.returncode == MEMORY_EXIT_CODE, child.stderr
+    workers = [int(pid) for pid in child.stdout.split()]
+    assert len(set(workers)) == 2
+    # Pool workers are not daemons, left running they would hold their memory after the child is gone
+    deadline = time.monotonic() + 10
+    while any(psutil.pid_exists(pid) for pid in workers) and (time.monotonic() < deadline):
+        time.sleep(0.1)
+    assert not any(psutil.pid_exists(pid) for pid in workers)
@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+import pytest
+import pandas as pd
+from data_extraction.block_index import (IndexedBlock, append_block, read_block_index)
+from data_extraction.cli import main
+from data_extraction.compression import compress_member
+from data_extraction.extract import (byte_ranges, extract, iter_csv_range, raw_day_filenames)
+from data_extraction.id_catalog import IdCatalog
+
+
+def write_day(raw_filename: str, flushes: int = 6, compression: str = "none", indexed: bool = True) -> list[tuple]:
+    """Flushes of 10 seconds, ids a and b every second and c only in odd flushes."""
+    catalog = IdCatalog()
+    rows = []
+    with open(raw_filename, "wb") as file:
+        for flush in range(flushes):
+            lines = [] if flush else ["time,topic,id,value"]
+            ids = ["a", "b", "c"] if flush % 2 else ["a", "b"]
+            catalog.update(raw_filename, ids)
+            flush_rows = []
+            for second in range(10):
+                row_time = pd.Timestamp("2024-06-18 09:00:00") + pd.Timedelta(seconds = flush * 10 + second)
+                for field_id in ids:
+                    value = "ON" if field_id == "c" else float(flush * 10 + second)
+                    flush_rows.append((row_time, field_id, value))
+                    lines.append(f"{row_time},t,{field_id},{value}")
+            start = file.tell()
+            file.write(compress_member(("\n".join(lines) + "\n").encode(), compression))
+            if indexed:
+                append_block(raw_filename, IndexedBlock(
+                    start, file.tell(), flush_rows[0][0].value, flush_rows[-1][0].value, catalog.positions(raw_filename, ids)
+                ))
+            rows.extend(flush_rows)
+    return rows
+
+
+def expected(rows: list[tuple], start: str, end: str, ids: list[str] | None = None) -> list[tuple]:
+    return [
+        (row_time, field_id, value) for (row_time, field_id, value) in rows
+        if (pd.Timestamp(start) <= row_time < pd.Timestamp(end)) and ((ids is None) or (field_id in ids))
+    ]
+
+
+def as_rows(df: pd.DataFrame) -> list[tuple]:
+    return list(zip(df["time"], df["id"], df["value"]))
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "xz"])
+def test_extract_matches_rows(tmp_path, compression):
+    raw_filename = str(tmp_path / "20240618-raw.csv") + {"none": "", "gzip": ".gz", "xz": ".xz"}[compression]
+    rows = write_day(raw_filename, compression = compression)
+    df = extract(raw_filename, "2024-06-18 09:00:15", "2024-06-18 09:00:42")
+    assert as_rows(df) == expected(rows, "2024-06-18 09:00:15", "2024-06-18 09:00:42")
+    df = extract(raw_filename, "2024-06-18 09:00:00", "2024-06-18 09:00:05", ids = ["c", "a"])
+    assert as_rows(df) == expected(rows, "2024-06-18 09:00:00", "2024-06-18 09:00:05", ["a"])
+
+
+@pytest.mark.parametrize("compression", ["gzip", "xz"])
+def test_compressed_range_is_streamed_in_chunks(tmp_path, compression):
+    raw_filename = str(tmp_path / "20240618-raw.csv") + {"gzip": ".gz", "xz": ".xz"}[compression]
+    rows = write_day(raw_filename, compression = compression)
+    blocks = read_block_index(raw_filename)
+    chunks = list(iter_csv_range(raw_filename, blocks[1].start, blocks[2].end, chunk_rows = 7))
+    assert [len(time_ns) for (time_ns, _, _) in chunks] == [7] * 7 + [1]
+    # Nothing past the end of the range is decompressed
+    assert [(pd.Timestamp(time_ns), field_id) for (times, ids, _) in chunks for (time_ns, field_id) in zip(times, ids)] == [
+        (row_time, field_id) for (row_time, field_id, _) in expected(rows, "2024-06-18 09:00:10", "2024-06-18 09:00:30")
+    ]
+
+
+def test_index_skips_blocks(tmp_path):
+    raw_filename = str(tmp_path / "20240618-raw.csv")
+    write_day(raw_filename)
+    blocks = read_block_index(raw_filename)
+    start_ns = pd.Timestamp("2024-06-18 09:00:15").value
+    end_ns = pd.Timestamp("2024-06-18 09:00:42").value
+    assert byte_ranges(raw_filename, start_ns, end_ns) == [(blocks[1].start, blocks[4].end)]
+    # Flushes 1 and 3 hold c
+    assert byte_ranges(raw_filename, start_ns, end_ns, ["c"]) == [(blocks[1].start, blocks[1].end), (blocks[3].start, blocks[3].end)]
+
+
+def test_unindexed_file_is_scanned(tmp_path):
+    raw_filename = str(tmp_path / "20240618-raw.csv")
+    rows = write_day(raw_filename, indexed = False)
+    # Rows appended after the last indexed flush are still found
+    with open(raw_filename, "a") as file:
+        file.write("2024-06-18 09:05:00,t,a,1.5\n")
+    assert byte_ranges(raw_filename, 0, 2**62) == [(0, len(open(raw_filename, "rb").read()))]
+    df = extract(raw_filename, "2024-06-18 09:00:55", "2024-06-18 09:06")
+    assert as_rows(df) == expected(rows, "2024-06-18 09:00:55", "2024-06-18 09:06") + [(pd.Timestamp("2024-06-18 09:05"), "a", 1.5)]
+
+
+def test_extract_resampled(tmp_path):
+    raw_filename = str(tmp_path / "20240618-raw.csv.gz")
+    write_day(raw_filename, compression = "gzip")
+    df = extract(raw_filename, "2024-06-18 09:00:10", "2024-06-18 09:00:20", ids = ["a", "c"], resample_seconds = 5)
+    assert list(df.columns) == ["a", "c"]
+    assert df["a"].tolist() == [12.0, 17.0]
+    assert df["c"].tolist() == ["ON", "ON"]
+
+
+def test_raw_day_filenames(tmp_path):
+    write_day(str(tmp_path / "20240618-raw.csv.gz"), compression = "gzip")
+    write_day(str(tmp_path / "20240620-raw.csv"))
+    assert raw_day_filenames(str(tmp_path), "raw", "2024-06-17 23:00", "2024-06-20") == [
+        f"{tmp_path}/20240618-raw.csv.gz", f"{tmp_path}/20240620-raw.csv"
+    ]
+
+
+def test_cli(tmp_path):
+    rows = write_day(str(tmp_path / "20240618-raw.csv"))
+    output = str(tmp_path / "extract.csv")
+    main(["--directory", str(tmp_path), "--name", "raw", "--start", "2024-06-18 09:00:58", "--end", "2024-06-18 09:01:02", "--id", "b", "--output", output])
+    df = pd.read_csv(output, parse_dates = ["time"])
+    assert as_rows(df) == expected(rows, "2024-06-18 09:00:58", "2024-06-18 09:01:02", ["b"])
+
+
+def test_cli_runs_without_client_config(tmp_path):
+    write_day(str(tmp_path / "20240618-raw.csv"))
+    # No ./config here, importing the client would fail to load config.toml
+    script = (
+        "import sys\n"
+        "from data_extraction.cli import main\n"
+        "main(['--directory', '.', '--name', 'raw', '--start', '2024-06-18 09:00:58', '--end', '2024-06-18 09:01:02', '--output', 'extract.csv'])\n"
+        "assert 'data_extraction.client' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd = tmp_path, env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}, check = True)
+    assert len(pd.read_csv(tmp_path / "extract.csv")) > 0
+
+
+def test_extract_parquet(tmp_path):
+    from data_extraction.raw_parquet import (ParquetRawWriter, pa, rows_to_table)
+    if pa is None:
+        pytest.skip("pyarrow is not installed")
+    raw_filename = str(tmp_path / "20240618-raw.parquet")
+    rows = write_day(str(tmp_path / "20240618-raw.csv"))
+    writer = ParquetRawWriter(row_groups_per_file = 2)
+    for start in range(0, len(rows), 25):
+        writer.write(raw_filename, rows_to_table([
+            {"time": row_time.to_pydatetime(), "topic": "t", "id": field_id, "value": value}
+            for (row_time, field_id, value) in rows[start:start + 25]
+        ]))
+    writer.close()
+    df = extract(raw_filename, "2024-06-18 09:00:15", "2024-06-18 09:00:42", ids = ["a", "c"])
+    assert as_rows(df) == expected(rows, "2024-06-18 09:00:15", "2024-06-18 09:00:42", ["a", "c"])
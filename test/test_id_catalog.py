@@ -0,0 +1,34 @@
+import pytest
+from data_extraction.id_catalog import (IdCatalog, catalog_filename, read_id_catalog)
+
+
+@pytest.mark.parametrize("raw_filename", ["raw/20240613-raw.csv", "raw/20240613-raw.csv.gz", "raw/20240613-raw.parquet"])
+def test_catalog_filename(raw_filename):
+    assert catalog_filename(raw_filename) == "raw/20240613-raw.ids"
+
+
+def test_update_appends_new_ids_in_order(tmp_path):
+    raw_filename = str(tmp_path / "20240613-raw.csv")
+    catalog = IdCatalog()
+    assert catalog.update(raw_filename, ["b", "a", "b"]) == ["b", "a"]
+    assert catalog.update(raw_filename, ["a", "c"]) == ["c"]
+    assert catalog.update(raw_filename, ["c"]) == []
+    assert read_id_catalog(raw_filename) == ["b", "a", "c"]
+
+
+def test_resumes_existing_catalog(tmp_path):
+    raw_filename = str(tmp_path / "20240613-raw.csv")
+    IdCatalog().update(raw_filename, ["a", "b"])
+    assert IdCatalog().update(raw_filename, ["b", "c"]) == ["c"]
+    assert read_id_catalog(raw_filename) == ["a", "b", "c"]
+
+
+def test_switches_day(tmp_path):
+    catalog = IdCatalog()
+    catalog.update(str(tmp_path / "20240613-raw.csv"), ["a"])
+    assert catalog.update(str(tmp_path / "20240614-raw.csv"), ["a"]) == ["a"]
+    assert read_id_catalog(str(tmp_path / "20240614-raw.csv")) == ["a"]
+
+
+def test_missing_catalog(tmp_path):
+    assert read_id_catalog(str(tmp_path / "20240613-raw.csv")) is None
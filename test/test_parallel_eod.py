@@ -0,0 +1,140 @@
+import pytest
+import random
+import pandas as pd
+from data_extraction.eod import (StreamingResampler, bucket_date_format)
+from data_extraction.eod_process import write_processed_frame
+from data_extraction.parallel_eod import (csv_byte_ranges, split_row_groups, process_day_parallel, parallel_supported)
+from data_extraction.raw_parquet import pa
+
+
+def write_chunk(df, id_list, processed_filename, written_columns):
+    return write_processed_frame(df, id_list, processed_filename, written_columns, bucket_date_format(1))
+
+
+def raw_rows(count: int = 3_000, seed: int = 0) -> list[tuple]:
+    random.seed(seed)
+    start = pd.Timestamp("2024-05-02 12:00:00").value
+    rows = []
+    for row_ns in sorted(start + random.randrange(120 * 10**6) * 1_000 for _ in range(count)):
+        index = random.randrange(12)
+        if index == 11:
+            value = random.choice(["ON", "OFF"])
+        else:
+            value = random.choice([repr(round(random.uniform(-10, 10), 3)), "nan"])
+        # Later ids only show up later in the day, so partitions discover different columns
+        if row_ns - start < index * 10 * 10**9:
+            index = 0
+        rows.append((str(pd.Timestamp(row_ns)), f"sensor/field_{index}", value))
+    return rows
+
+
+def write_raw(filename: str, rows: list[tuple]) -> None:
+    with open(filename, "w") as file:
+        file.write("time,topic,id,value\n")
+        for (row_time, row_id, value) in rows:
+            file.write(f"{row_time},t,{row_id},{value}\n")
+
+
+def parsed_values(rows: list[tuple]) -> list:
+    values = []
+    for (_, _, value) in rows:
+        try:
+            values.append(float(value))
+        except ValueError:
+            values.append(value)
+    return values
+
+
+def serial_reference(rows: list[tuple], filename: str) -> str:
+    resampler = StreamingResampler(1)
+    resampler.accumulate([row[0] for row in rows], [row[1] for row in rows], parsed_values(rows))
+    write_chunk(resampler.finish(), resampler.ids, filename, None)
+    with open(filename) as file:
+        return file.read()
+
+
+def test_byte_ranges_start_on_lines(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, raw_rows(500))
+    with open(raw_filename, "rb") as file:
+        data = file.read()
+    for partitions in (1, 2, 3, 7, 2_000):
+        ranges = csv_byte_ranges(raw_filename, partitions)
+        assert ranges[0][0] == data.index(b"\n") + 1
+        assert ranges[-1][1] == len(data)
+        for ((_, end), (start, _)) in zip(ranges, ranges[1:]):
+            assert end == start
+            assert data[start - 1:start] == b"\n"
+        assert sum(data[start:end].count(b"\n") for (start, end) in ranges) == 500
+
+
+def test_split_row_groups_keeps_order():
+    row_groups = [("raw.parquet", index) for index in range(5)]
+    assert split_row_groups(row_groups, 2) == [row_groups[:2], row_groups[2:]]
+    assert split_row_groups(row_groups[:1], 4) == [row_groups[:1]]
+
+
+def test_compressed_csv_is_serial():
+    assert parallel_supported("raw.csv")
+    assert not parallel_supported("raw.csv.gz")
+
+
+@pytest.mark.parametrize("workers", [2, 5])
+def test_matches_serial(tmp_path, workers):
+    rows = raw_rows()
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, rows)
+    processed_filename = str(tmp_path / "processed.csv")
+    process_day_parallel(raw_filename, processed_filename, 1, workers, write_chunk, chunk_rows = 250)
+    with open(processed_filename) as file:
+        assert file.read() == serial_reference(rows, str(tmp_path / "serial.csv"))
+    assert not list(tmp_path.glob("*.part*"))
+
+
+def test_matches_serial_with_catalog(tmp_path):
+    rows = raw_rows(seed = 1)
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, rows)
+    id_list = list(dict.fromkeys(row[1] for row in rows))
+    processed_filename = str(tmp_path / "processed.csv")
+    process_day_parallel(raw_filename, processed_filename, 1, 3, write_chunk, id_list = id_list)
+    with open(processed_filename) as file:
+        assert file.read() == serial_reference(rows, str(tmp_path / "serial.csv"))
+
+
+def test_aggregations_match_serial(tmp_path):
+    rows = raw_rows(seed = 3)
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, rows)
+    aggregations = {"sensor/field_[0-4]": ["max", "std", "count"], "sensor/field_11": ["first", "last"]}
+    processed_filename = str(tmp_path / "processed.csv")
+    process_day_parallel(raw_filename, processed_filename, 1, 3, write_chunk, chunk_rows = 200, aggregations = aggregations)
+    resampler = StreamingResampler(1, aggregations = aggregations)
+    resampler.accumulate([row[0] for row in rows], [row[1] for row in rows], parsed_values(rows))
+    write_chunk(resampler.finish(), resampler.output_columns(resampler.ids), str(tmp_path / "serial.csv"), None)
+    (actual, expected) = (pd.read_csv(processed_filename, index_col = 0), pd.read_csv(tmp_path / "serial.csv", index_col = 0))
+    assert list(actual.columns) == list(expected.columns)
+    # Partitions that had not seen an id yet leave its count empty rather than 0
+    counts = [column for column in actual.columns if column.endswith("_count")]
+    (actual[counts], expected[counts]) = (actual[counts].fillna(0), expected[counts].fillna(0))
+    # Standard deviations merged across partitions may differ in the last digit
+    pd.testing.assert_frame_equal(actual, expected, check_exact = False, rtol = 1e-9, check_dtype = False)
+
+
+@pytest.mark.skipif(pa is None, reason = "pyarrow is not installed")
+def test_parquet_matches_serial(tmp_path):
+    from data_extraction.raw_parquet import (ParquetRawWriter, rows_to_table)
+    rows = raw_rows(seed = 2)
+    values = parsed_values(rows)
+    raw_filename = str(tmp_path / "raw.parquet")
+    writer = ParquetRawWriter(row_groups_per_file = 4)
+    for start in range(0, len(rows), 300):
+        writer.write(raw_filename, rows_to_table([
+            {"time": pd.Timestamp(row_time).to_pydatetime(), "topic": "t", "id": row_id, "value": value}
+            for ((row_time, row_id, _), value) in zip(rows[start:start + 300], values[start:start + 300])
+        ]))
+    writer.close()
+    processed_filename = str(tmp_path / "processed.csv")
+    process_day_parallel(raw_filename, processed_filename, 1, 3, write_chunk)
+    with open(processed_filename) as file:
+        assert file.read() == serial_reference(rows, str(tmp_path / "serial.csv"))
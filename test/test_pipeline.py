@@ -0,0 +1,37 @@
+import pytest
+from threading import Thread
+from data_extraction.pipeline import (MessageQueue, BLOCK, DROP_NEWEST, DROP_OLDEST)
+
+
+def test_get_batch():
+    queue = MessageQueue(maxsize = 10)
+    for index in range(5):
+        queue.put(index)
+    assert queue.get_batch(3) == [0, 1, 2]
+    assert queue.get_batch(3) == [3, 4]
+    assert queue.get_batch(3, timeout = 0.01) == []
+
+
+@pytest.mark.parametrize("policy, expected", [
+    (DROP_NEWEST, [0, 1]),
+    (DROP_OLDEST, [2, 3]),
+])
+def test_drop_policies(policy, expected):
+    queue = MessageQueue(maxsize = 2, overflow_policy = policy)
+    for index in range(4):
+        queue.put(index)
+    assert queue.dropped == 2
+    assert queue.get_batch(10) == expected
+
+
+def test_block_policy():
+    queue = MessageQueue(maxsize = 1, overflow_policy = BLOCK)
+    queue.put(0)
+    assert queue.put(1, timeout = 0.01) is False
+    assert queue.dropped == 1
+
+    producer = Thread(target = queue.put, args = (2,))
+    producer.start()
+    assert queue.get_batch(1) == [0]
+    producer.join(timeout = 1)
+    assert queue.get_batch(1, timeout = 1) == [2]
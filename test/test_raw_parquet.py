@@ -0,0 +1,108 @@
+import pytest
+import numpy as np
+from datetime import datetime
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from data_extraction.column_buffer import ColumnarBuffer
+from data_extraction.raw_parquet import (ParquetRawWriter, batch_to_table, rows_to_table, raw_parquet_files, iter_raw_batches)
+
+
+@pytest.fixture
+def filled_buffer():
+    buffer = ColumnarBuffer(capacity = 10)
+    buffer.extend([
+        (1_000_000_000, "p0/n/sensor/m/pyro/ir_1", "sensor/pyro/ir_1", 20.5),
+        (2_000_000_000, "p0/n/sensor/m/pyro/ir_2", "sensor/pyro/ir_2", "ON"),
+        (3_000_000_000, "p0/n/sensor/m/pyro/ir_1", "sensor/pyro/ir_1", float("nan")),
+    ])
+    return buffer
+
+
+def read_all(filename: str):
+    return pa.Table.from_batches(list(iter_raw_batches(filename))).to_pydict()
+
+
+def test_batch_to_table(filled_buffer):
+    table = batch_to_table(filled_buffer.dump()).to_pydict()
+    assert table["time_ns"] == [1_000_000_000, 2_000_000_000, 3_000_000_000]
+    assert table["id"] == ["sensor/pyro/ir_1", "sensor/pyro/ir_2", "sensor/pyro/ir_1"]
+    assert table["value"][0] == 20.5
+    assert table["value"][1] is None
+    assert np.isnan(table["value"][2])
+    assert table["value_str"] == [None, "ON", None]
+
+
+def test_rows_to_table():
+    rows = [
+        {"time": 5, "topic": "a/b", "id": "b", "value": 1.5},
+        {"time": 6, "topic": "a/c", "id": "c", "value": True},
+    ]
+    table = rows_to_table(rows).to_pydict()
+    assert table["time_ns"] == [5, 6]
+    assert table["value"] == [1.5, None]
+    assert table["value_str"] == [None, "True"]
+
+
+def test_rows_to_table_datetime():
+    time = datetime(2024, 5, 2, 12, 0, 0, 250123)
+    table = rows_to_table([{"time": time, "topic": "a/b", "id": "b", "value": 1.0}])
+    assert table.column("time_ns")[0].as_py() == round(time.timestamp() * 1e6) * 1_000
+
+
+def test_one_row_group_per_write(tmp_path, filled_buffer):
+    filename = str(tmp_path / "raw.parquet")
+    writer = ParquetRawWriter()
+    table = batch_to_table(filled_buffer.dump())
+    writer.write(filename, table)
+    writer.write(filename, table)
+    writer.close()
+    assert pq.ParquetFile(filename).num_row_groups == 2
+    assert len(read_all(filename)["time_ns"]) == 6
+
+
+def test_rotates_parts(tmp_path, filled_buffer):
+    filename = str(tmp_path / "raw.parquet")
+    writer = ParquetRawWriter(row_groups_per_file = 2)
+    table = batch_to_table(filled_buffer.dump())
+    for _ in range(5):
+        writer.write(filename, table)
+    writer.close()
+    assert raw_parquet_files(filename) == [
+        filename, str(tmp_path / "raw.part1.parquet"), str(tmp_path / "raw.part2.parquet")
+    ]
+    assert len(read_all(filename)["time_ns"]) == 15
+
+
+def test_reopen_does_not_overwrite(tmp_path, filled_buffer):
+    filename = str(tmp_path / "raw.parquet")
+    table = batch_to_table(filled_buffer.dump())
+    for _ in range(2):
+        writer = ParquetRawWriter()
+        writer.write(filename, table)
+        writer.close()
+    assert len(raw_parquet_files(filename)) == 2
+    assert len(read_all(filename)["time_ns"]) == 6
+
+
+def test_unreadable_part_is_skipped(tmp_path, filled_buffer):
+    filename = str(tmp_path / "raw.parquet")
+    writer = ParquetRawWriter()
+    writer.write(filename, batch_to_table(filled_buffer.dump()))
+    writer.close()
+    (tmp_path / "raw.part1.parquet").write_bytes(b"PAR1 truncated")
+    assert len(read_all(filename)["time_ns"]) == 3
+
+
+def test_filter_pushdown(tmp_path, filled_buffer):
+    filename = str(tmp_path / "raw.parquet")
+    writer = ParquetRawWriter()
+    writer.write(filename, batch_to_table(filled_buffer.dump()))
+    writer.close()
+    batches = iter_raw_batches(filename, columns = ["time_ns"], start_ns = 1_500_000_000, ids = ["sensor/pyro/ir_1"])
+    assert pa.Table.from_batches(list(batches)).to_pydict() == {"time_ns": [3_000_000_000]}
+
+
+def test_missing_file(tmp_path):
+    assert list(iter_raw_batches(str(tmp_path / "missing.parquet"))) == []
@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+import pandas as pd
+from data_extraction import raw_scanner
+from data_extraction.eod_process import iter_csv_rows
+from data_extraction.raw_scanner import (RawCsvScanner, can_scan, newline_blocks, parse_values)
+
+
+def write_raw(filename: str, lines: list[str], header: str = "time,topic,id,value") -> None:
+    with open(filename, "w") as file:
+        file.write(header + "\n")
+        for line in lines:
+            file.write(line + "\n")
+
+
+def test_blocks_hold_whole_lines():
+    data = np.frombuffer(b"a\nbb\nccc\ndddd\ne", dtype = np.uint8)
+    assert list(newline_blocks(data, 0, len(data), 2)) == [(0, 5), (5, 14), (14, 15)]
+    assert list(newline_blocks(data, 2, 9, 5)) == [(2, 9)]
+
+
+def test_values_parse_like_float():
+    values = parse_values(np.array(["1.5", "nan", "ON", "1_000", "OFF ", ""], dtype = object))
+    assert values[0] == 1.5 and np.isnan(values[1])
+    assert values[2:].tolist() == ["ON", 1000.0, "OFF", ""]
+    assert parse_values(np.array(["1", "2.25"], dtype = object)).dtype == np.float64
+
+
+@pytest.mark.parametrize("arrow", [True, False])
+def test_matches_row_reader(tmp_path, monkeypatch, arrow):
+    if not arrow:
+        monkeypatch.setattr(raw_scanner, "pa_csv", None)
+    elif raw_scanner.pa_csv is None:
+        pytest.skip("pyarrow is not installed")
+    raw_filename = str(tmp_path / "raw.csv")
+    lines = [
+        f"2024-05-02 12:00:0{second}.{second}5,t,sensor/field_{second % 3},{value}"
+        for (second, value) in enumerate(["1.5", "ON", "-2e-3", "nan", "OFF", "0.1", "7"])
+    ]
+    write_raw(raw_filename, lines)
+    scanner = RawCsvScanner(raw_filename, block_rows = 3)
+    blocks = list(scanner)
+    assert [len(block) for block in blocks] == [3, 3, 1]
+    rows = list(iter_csv_rows(raw_filename))
+    assert [scanner.ids[code] for block in blocks for code in block.id_codes] == [row[1] for row in rows]
+    values = [value for block in blocks for value in block.values]
+    assert [value for value in values if isinstance(value, str)] == ["ON", "OFF"]
+    time_ns = np.concatenate([block.time_ns for block in blocks])
+    assert time_ns.tolist() == [pd.Timestamp(row[0]).value for row in rows]
+
+
+def test_byte_range_and_epoch_column(tmp_path):
+    raw_filename = str(tmp_path / "raw.csv")
+    write_raw(raw_filename, ["x,t,a,1.0,1714651200000000000", "x,t,b,2.0,1714651201000000000"], "time,topic,id,value,time_ns")
+    with open(raw_filename, "rb") as file:
+        second_line = file.read().index(b"x,t,b")
+    scanner = RawCsvScanner(raw_filename, start = second_line)
+    (block,) = list(scanner)
+    assert scanner.ids == ["b"]
+    assert block.values.tolist() == [2.0]
+
+
+def test_only_plain_csv_is_scanned():
+    assert can_scan("raw.csv")
+    assert not can_scan("raw.csv.gz")
+    assert not can_scan("raw.parquet")
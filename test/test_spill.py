@@ -0,0 +1,58 @@
+import pytest
+import os
+from data_extraction.spill import SpillQueue
+from data_extraction.wal import (encode_record, read_segment)
+
+
+def rows(start: int, count: int = 10) -> list[tuple[int, str, str, object]]:
+    return [(10**18 + second * 10**9, "t", "pyrometer/ir_01", float(second)) for second in range(start, start + count)]
+
+
+RECORD_BYTES = len(encode_record(rows(0)))
+
+
+def test_segments_are_popped_in_order(tmp_path):
+    spill = SpillQueue(str(tmp_path), "raw", budget_bytes = 10**6, segment_bytes = 2 * RECORD_BYTES)
+    for start in range(0, 50, 10):
+        assert spill.append(rows(start)) == 0
+    assert spill.segment_count() == 3
+    assert spill.pending_bytes == 5 * RECORD_BYTES
+    assert spill.lag_seconds(10**18 + 60 * 10**9) == 60.0
+
+    segments = []
+    while (segment := spill.pop()) is not None:
+        segments.append(segment)
+    assert spill.not_empty() is False
+    assert [row for segment in segments for row in read_segment(segment.filename)] == rows(0, 50)
+    assert [segment.rows for segment in segments] == [20, 20, 10]
+
+    spill.release(segments[0])
+    assert not os.path.exists(segments[0].filename)
+    assert spill.pending_bytes == 3 * RECORD_BYTES
+    assert spill.lag_seconds(10**18 + 60 * 10**9) == 40.0
+    assert spill.pending_segments() == [segment.filename for segment in segments[1:]]
+
+
+def test_drop_newest_over_budget(tmp_path, caplog):
+    spill = SpillQueue(str(tmp_path), "raw", budget_bytes = 2 * RECORD_BYTES, segment_bytes = RECORD_BYTES)
+    assert spill.append(rows(0)) == 0
+    assert spill.append(rows(10)) == 0
+    assert spill.append(rows(20)) == 10
+    assert spill.append(rows(30)) == 10
+    assert spill.rows_dropped == 20
+    assert len([record for record in caplog.records if "budget" in record.getMessage()]) == 1
+    assert [row for segment in (spill.pop(), spill.pop()) for row in read_segment(segment.filename)] == rows(0, 20)
+
+
+def test_drop_oldest_over_budget(tmp_path):
+    spill = SpillQueue(str(tmp_path), "raw", budget_bytes = 2 * RECORD_BYTES, drop_policy = "drop_oldest", segment_bytes = RECORD_BYTES)
+    for start in range(0, 40, 10):
+        assert spill.append(rows(start)) == 0
+    assert spill.rows_dropped == 20
+    assert spill.pending_bytes == 2 * RECORD_BYTES
+    assert [row for segment in (spill.pop(), spill.pop()) for row in read_segment(segment.filename)] == rows(20, 20)
+
+
+def test_drop_policy_fails(tmp_path):
+    with pytest.raises(ValueError):
+        SpillQueue(str(tmp_path), "raw", budget_bytes = 1, drop_policy = "block")
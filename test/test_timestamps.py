@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from data_extraction.timestamps import (epoch_ns_to_local, parse_time_column)
+
+
+def test_epoch_ns_to_local_matches_datetime():
+    time_ns = np.array([1_717_000_000_123_456_789, 1_730_000_000_000_001_999], dtype = np.int64)
+    expected = [datetime.fromtimestamp(int(ns // 1_000) / 1e6) for ns in time_ns]
+    assert list(epoch_ns_to_local(time_ns).to_pydatetime()) == expected
+
+
+def test_epoch_ns_to_local_csv_format():
+    time_ns = np.array([1_717_000_000_123_456_789], dtype = np.int64)
+    df = pd.DataFrame({"time": epoch_ns_to_local(time_ns)})
+    assert df.to_csv(index = False).splitlines()[1].endswith(".123456")
+
+
+def test_parse_time_column():
+    strings = pd.Series(["2024-05-02 12:00:00.250000"])
+    assert parse_time_column(strings)[0] == datetime(2024, 5, 2, 12, 0, 0, 250000)
+    epoch = pd.Series([1_717_000_000_123_456_789])
+    assert parse_time_column(epoch)[0] == pd.Timestamp(datetime.fromtimestamp(1_717_000_000)) + pd.Timedelta(123_456_789, "ns")
+
+
+def test_parse_time_column_mixed_precision():
+    # Flushes format their time column independently, so a chunk can mix precisions
+    strings = pd.Series(["2024-05-02 12:00:00", "2024-05-02 12:00:00.250000", "2024-05-02"])
+    assert list(parse_time_column(strings)) == [
+        datetime(2024, 5, 2, 12), datetime(2024, 5, 2, 12, 0, 0, 250000), datetime(2024, 5, 2)
+    ]
@@ -0,0 +1,52 @@
+import pytest
+from data_extraction.topic_mapper import TopicMapper
+
+
+TOPIC_STRUCTURE = "machine/permission/category/module/measurement/field*"
+ID_STRUCTURE = "category/measurement/field*"
+
+
+@pytest.fixture
+def mapper() -> TopicMapper:
+    return TopicMapper(TOPIC_STRUCTURE, ID_STRUCTURE, maxsize = 2)
+
+
+def test_resolve(mapper):
+    topic = "p0/normal/sensor/enclosure/pyrometer/temperature"
+    assert mapper.resolve(topic) == "sensor/pyrometer/temperature"
+    assert mapper.resolve(topic) == "sensor/pyrometer/temperature"
+    assert mapper.resolve(topic) is mapper.resolve(topic)
+    info = mapper.cache_info()
+    assert info.misses == 1
+    assert info.hits == 3
+    assert info.size == 1
+
+
+def test_lru_eviction(mapper):
+    mapper.resolve("p0/normal/sensor/a/pyrometer/ir_01")
+    mapper.resolve("p0/normal/sensor/a/pyrometer/ir_02")
+    mapper.resolve("p0/normal/sensor/a/pyrometer/ir_01")  # ir_02 is now least recently used
+    mapper.resolve("p0/normal/sensor/a/pyrometer/ir_03")
+    assert mapper.cache_info().evictions == 1
+    mapper.resolve("p0/normal/sensor/a/pyrometer/ir_01")
+    assert mapper.cache_info().hits == 2
+    mapper.resolve("p0/normal/sensor/a/pyrometer/ir_02")
+    assert mapper.cache_info().misses == 4
+
+
+def test_short_topic_ignored(mapper):
+    assert mapper.resolve("p0/normal/sensor") is None
+    assert mapper.cache_info().size == 0
+
+
+def test_rebuild_on_structure_change(mapper):
+    topic = "p0/normal/sensor/enclosure/pyrometer/temperature"
+    assert mapper.resolve(topic) == "sensor/pyrometer/temperature"
+    mapper.ensure_structure(TOPIC_STRUCTURE, "module/field*")
+    assert mapper.cache_info().size == 0
+    assert mapper.resolve(topic) == "enclosure/temperature"
+
+
+def test_invalid_id_structure():
+    with pytest.raises(ValueError):
+        TopicMapper(TOPIC_STRUCTURE, "category/unknown")
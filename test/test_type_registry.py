@@ -0,0 +1,45 @@
+import pytest
+from data_extraction.type_registry import (
+    TypeRegistry, batch_types, read_type_registry, string_ids, types_filename, value_type, MIXED, NUMERIC, STRING
+)
+
+
+@pytest.mark.parametrize("raw_filename", ["raw/20240613-raw.csv", "raw/20240613-raw.csv.xz", "raw/20240613-raw.parquet"])
+def test_types_filename(raw_filename):
+    assert types_filename(raw_filename) == "raw/20240613-raw.types"
+
+
+@pytest.mark.parametrize("value, expected", [(1.5, NUMERIC), ("2.5", NUMERIC), ("ON", STRING), (True, STRING), ("", STRING)])
+def test_value_type_matches_raw_file(value, expected):
+    assert value_type(value) == expected
+
+
+def test_batch_types():
+    assert batch_types(["a", "b", "a", "c"], [NUMERIC, STRING, NUMERIC, STRING]) == {"a": NUMERIC, "b": STRING, "c": STRING}
+    assert batch_types(["a", "a"], [NUMERIC, STRING]) == {"a": MIXED}
+
+
+def test_type_change_is_persisted_and_counted(tmp_path):
+    raw_filename = str(tmp_path / "20240613-raw.csv")
+    registry = TypeRegistry()
+    assert registry.update(raw_filename, {"a": NUMERIC, "b": STRING}) == []
+    assert registry.update(raw_filename, {"a": STRING, "b": STRING}) == ["a"]
+    assert registry.update(raw_filename, {"a": NUMERIC}) == []
+    assert registry.type_changes == 1
+    assert read_type_registry(raw_filename) == {"a": MIXED, "b": STRING}
+    assert string_ids(read_type_registry(raw_filename)) == ["a", "b"]
+
+
+def test_resumes_existing_registry(tmp_path):
+    raw_filename = str(tmp_path / "20240613-raw.csv")
+    TypeRegistry().update(raw_filename, {"a": NUMERIC})
+    assert TypeRegistry().update(raw_filename, {"a": STRING}) == ["a"]
+    assert read_type_registry(raw_filename) == {"a": MIXED}
+
+
+def test_missing_or_broken_registry(tmp_path):
+    raw_filename = str(tmp_path / "20240613-raw.csv")
+    assert read_type_registry(raw_filename) is None
+    (tmp_path / "20240613-raw.types").write_text("{")
+    assert read_type_registry(raw_filename) is None
+    assert string_ids(None) == []
@@ -0,0 +1,60 @@
+import os
+from data_extraction.wal import (WriteAheadLog, decode_rows, encode_record, encode_rows, iter_records, read_segment)
+
+
+ROWS = [
+    (1_718_000_000_123_456_789, "machine/a/sensor/pyrometer/ir_01", "sensor/pyrometer/ir_01", 1.5),
+    (1_718_000_000_223_456_789, "machine/a/heater/enable", "heater/enable", "ON"),
+    (1_718_000_000_323_456_789, "machine/a/heater/enable", "heater/enable", True),
+    (1_718_000_000_423_456_789, "machine/a/heater/count", "heater/count", 42),
+    (1_718_000_000_523_456_789, "machine/a/heater/count", "heater/count", 2**70),
+    (1_718_000_000_623_456_789, "machine/a/heater/état", "heater/état", ""),
+]
+
+
+def test_rows_round_trip():
+    rows = decode_rows(encode_rows(ROWS))
+    assert rows == ROWS
+    assert [type(row[3]) for row in rows] == [float, str, bool, int, int, str]
+
+
+def test_torn_record_is_dropped():
+    data = encode_record(ROWS[:2]) + encode_record(ROWS[2:])
+    assert [rows for rows in iter_records(data)] == [ROWS[:2], ROWS[2:]]
+    assert [rows for rows in iter_records(data[:-1])] == [ROWS[:2]]
+    corrupted = bytearray(data)
+    corrupted[-1] ^= 0xFF
+    assert [rows for rows in iter_records(bytes(corrupted))] == [ROWS[:2]]
+    assert [rows for rows in iter_records(data + bytes(64))] == [ROWS[:2], ROWS[2:]]
+
+
+def test_rotate_and_release(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), "raw", segment_bytes = 256, sync_interval = 0)
+    wal.append(ROWS[:3])
+    wal.append(ROWS[3:])
+    wal.append(ROWS)
+    segments = wal.rotate()
+    assert len(segments) > 1
+    assert [row for filename in segments for row in read_segment(filename)] == ROWS[:3] + ROWS[3:] + ROWS
+    assert wal.syncs == 3
+    assert wal.rotate() == []
+
+    wal.append(ROWS[:1])
+    assert wal.pending_bytes() == sum(os.path.getsize(filename) for filename in segments) + len(encode_record(ROWS[:1]))
+    wal.release(segments)
+    wal.close()
+    assert [read_segment(filename) for filename in wal.pending_segments()] == [ROWS[:1]]
+
+
+def test_sequence_continues_after_restart(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), "raw")
+    wal.append(ROWS)
+    wal.close()
+    restarted = WriteAheadLog(str(tmp_path), "raw")
+    restarted.append(ROWS[:1])
+    restarted.close()
+    pending = restarted.pending_segments()
+    assert [read_segment(filename) for filename in pending] == [ROWS, ROWS[:1]]
+    # A segment closed by close() is given back its unused preallocation
+    assert os.path.getsize(pending[0]) == len(encode_record(ROWS))
+    assert WriteAheadLog(str(tmp_path), "other").pending_segments() == []
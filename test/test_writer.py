@@ -0,0 +1,76 @@
+import pytest
+import os
+import time
+from data_extraction.writer import AsyncRawWriter
+
+
+def write_lines(batch: list[str], filename: str) -> None:
+    time.sleep(0.05)
+    with open(filename, "a") as file:
+        file.writelines(batch)
+
+
+@pytest.fixture
+def writer() -> AsyncRawWriter:
+    writer = AsyncRawWriter(write_lines)
+    writer.start()
+    yield writer
+    writer.stop()
+
+
+def test_async_write(writer, tmp_path):
+    filename = str(tmp_path / "raw.csv")
+    assert writer.submit(["a\n", "b\n"], filename) is True
+    assert writer.is_idle() is False
+    assert writer.wait_idle(timeout = 1) is True
+    assert open(filename).read() == "a\nb\n"
+    assert writer.bytes_written == 4
+    assert writer.batches_written == 1
+    assert writer.last_write_latency >= 0.05
+
+
+def test_backpressure(writer, tmp_path):
+    filename = str(tmp_path / "raw.csv")
+    writer.submit(["a\n"], filename)
+    assert writer.submit(["b\n"], filename, timeout = 0.001) is False
+    assert writer.submit(["b\n"], filename, timeout = 1) is True
+    writer.stop()
+    assert open(filename).read() == "a\nb\n"
+
+
+def test_failed_write_is_counted(writer, tmp_path):
+    writer.submit(None, str(tmp_path / "raw.csv"))
+    writer.wait_idle(timeout = 1)
+    assert writer.failed_writes == 1
+    assert writer.is_idle() is True
+
+
+def test_on_written_only_after_success(writer, tmp_path):
+    written = []
+    writer.submit(["a\n"], str(tmp_path / "raw.csv"), on_written = lambda: written.append("a"))
+    writer.submit(None, str(tmp_path / "raw.csv"), on_written = lambda: written.append("b"))
+    writer.wait_idle(timeout = 1)
+    assert written == ["a"]
+
+
+def test_failing_callback_keeps_writer_running(writer, tmp_path):
+    def fail():
+        raise ValueError("release failed")
+    filename = str(tmp_path / "raw.csv")
+    writer.submit(["a\n"], filename, on_written = fail)
+    assert writer.wait_idle(timeout = 1) is True
+    assert writer.submit(["b\n"], filename, timeout = 1) is True
+    assert writer.wait_idle(timeout = 1) is True
+    assert open(filename).read() == "a\nb\n"
+
+
+def test_bytes_written_across_parts(tmp_path):
+    # Like the parquet writer, every write goes to a new part next to the day file
+    def write_part(batch: list[str], filename: str) -> None:
+        with open(f"{filename}.part{len(list(tmp_path.iterdir()))}", "w") as file:
+            file.writelines(batch)
+    writer = AsyncRawWriter(write_part, size_function = lambda filename: sum(os.path.getsize(part) for part in tmp_path.iterdir()))
+    filename = str(tmp_path / "raw.parquet")
+    writer.submit(["ab\n"], filename)
+    writer.submit(["cde\n"], filename)
+    assert writer.bytes_written == 7